@@ -0,0 +1,120 @@
+"""
+Benchmark the persistent retry queue (HNNP_QUEUE_PATH) at a given size.
+
+Measures, for N queued reports:
+  - append: RetryQueue.push() with the SQLite journal, committed every --batch writes
+  - recovery: reopen the file, compact expired entries, rebuild the RetryQueue
+  - ack: discard every report (sent) and commit the deletes
+
+Usage:
+  python receiver/scripts/bench_queue_store.py --reports 100000 --path /tmp/hnnp-queue.db
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.presence_report import PresenceReport, ReportColumns  # noqa: E402
+from src.queue_store import SqliteQueueStore  # noqa: E402
+from src.retry_queue import QueuedReport, RetryQueue  # noqa: E402
+from src.sender import _recover_queue  # noqa: E402
+
+
+ORG_ID = "org_bench"
+RECEIVER_ID = "receiver_bench"
+MAX_SKEW_SECONDS = 120
+
+
+def _remove(path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _report(i: int, timestamp: int) -> PresenceReport:
+    return PresenceReport(
+        org_id=ORG_ID,
+        receiver_id=RECEIVER_ID,
+        timestamp=timestamp,
+        time_slot=timestamp // 15,
+        version=2,
+        flags=0,
+        token_prefix=i.to_bytes(16, "big"),
+        mac=bytes(8),
+        signature=bytes(32),
+    )
+
+
+def run(reports: int, batch: int, path: str, sync: str, expired_fraction: float) -> dict:
+    _remove(path)
+    now = int(time.time())
+    expired = int(reports * expired_fraction)
+    prebuilt = [
+        _report(i, now - 2 * MAX_SKEW_SECONDS if i < expired else now) for i in range(reports)
+    ]
+
+    journal = SqliteQueueStore(path, sync=sync)
+    store = ReportColumns(ORG_ID, RECEIVER_ID)
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW_SECONDS, journal=journal)
+    started = time.perf_counter()
+    for i, report in enumerate(prebuilt, 1):
+        queue.push(QueuedReport(store, store.append(report), now, 1, now + 1))
+        if i % batch == 0:
+            journal.flush()
+    journal.flush()
+    append_s = time.perf_counter() - started
+    size_bytes = journal.size_bytes()
+    journal.close()
+
+    started = time.perf_counter()
+    journal = SqliteQueueStore(path, sync=sync)
+    store = ReportColumns(ORG_ID, RECEIVER_ID)
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW_SECONDS, journal=journal)
+    _recover_queue(queue, journal, store, now)
+    recovery_s = time.perf_counter() - started
+    recovered = len(queue)
+
+    started = time.perf_counter()
+    for i, item in enumerate(queue.pop_due(float("inf")), 1):
+        queue.discard(item)
+        if i % batch == 0:
+            journal.flush()
+    journal.flush()
+    ack_s = time.perf_counter() - started
+    journal.close()
+    _remove(path)
+
+    return {
+        "reports": reports,
+        "commit_batch": batch,
+        "sync": sync,
+        "append_per_s": round(reports / append_s),
+        "file_bytes": size_bytes,
+        "recovery_ms": round(recovery_s * 1000.0, 1),
+        "recovered": recovered,
+        "expired_on_recovery": reports - recovered,
+        "ack_per_s": round(recovered / ack_s) if recovered else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1000, help="writes per commit")
+    parser.add_argument("--path", default="/tmp/hnnp-queue-bench.db")
+    parser.add_argument("--sync", choices=("full", "normal"), default="full")
+    parser.add_argument(
+        "--expired", type=float, default=0.1, help="fraction of reports already expired at recovery"
+    )
+    args = parser.parse_args()
+    print(json.dumps(run(args.reports, args.batch, args.path, args.sync, args.expired), indent=2))
+
+
+if __name__ == "__main__":
+    main()
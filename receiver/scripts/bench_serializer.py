@@ -0,0 +1,111 @@
+"""
+Benchmark request body encoding: CPU per report for each serializer path.
+
+Compares the previous path (report.to_json() dict, then json.dumps and encode,
+as aiohttp's json= does) with ReportSerializer encoders ("template", "json",
+and "orjson" if installed), for single reports and for batches with and
+without gzip/deflate.
+
+Usage:
+  python receiver/scripts/bench_serializer.py --reports 20000 --batch 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.presence_report import PresenceReport  # noqa: E402
+from src.serializer import (  # noqa: E402
+    COMPRESSION_DEFLATE,
+    COMPRESSION_GZIP,
+    COMPRESSION_OFF,
+    ENCODER_JSON,
+    ENCODER_ORJSON,
+    ENCODER_TEMPLATE,
+    ReportSerializer,
+    orjson,
+)
+
+
+ORG_ID = "org_bench"
+RECEIVER_ID = "receiver_bench"
+
+
+def _reports(count: int) -> List[PresenceReport]:
+    now = int(time.time())
+    return [
+        PresenceReport(
+            org_id=ORG_ID,
+            receiver_id=RECEIVER_ID,
+            timestamp=now,
+            time_slot=now // 15,
+            version=2,
+            flags=0,
+            token_prefix=os.urandom(16),
+            mac=os.urandom(8),
+            signature=os.urandom(32),
+        )
+        for _ in range(count)
+    ]
+
+
+def _us_per_report(fn: Callable[[], object], reports: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        best = min(best, time.process_time() - started)
+    return round(best / reports * 1e6, 3)
+
+
+def run(count: int, batch: int) -> dict:
+    reports = _reports(count)
+    batches = [reports[i : i + batch] for i in range(0, count, batch)]
+    results: dict = {"reports": count, "batch_size": batch, "single": {}, "batch": {}}
+
+    results["single"]["previous (to_json + json.dumps)"] = _us_per_report(
+        lambda: [json.dumps(report.to_json()).encode() for report in reports], count
+    )
+    encoders = [ENCODER_TEMPLATE, ENCODER_JSON] + ([ENCODER_ORJSON] if orjson is not None else [])
+    for encoder in encoders:
+        serializer = ReportSerializer(encoder=encoder)
+        results["single"][encoder] = _us_per_report(
+            lambda: [serializer.report(report) for report in reports], count
+        )
+
+    results["batch"]["previous (to_json + json.dumps)"] = {
+        "us_per_report": _us_per_report(
+            lambda: [
+                json.dumps({"reports": [report.to_json() for report in chunk]}).encode()
+                for chunk in batches
+            ],
+            count,
+        )
+    }
+    for encoder in encoders:
+        for compression in (COMPRESSION_OFF, COMPRESSION_GZIP, COMPRESSION_DEFLATE):
+            serializer = ReportSerializer(encoder=encoder, compression=compression)
+            cost = _us_per_report(lambda: [serializer.batch(chunk) for chunk in batches], count)
+            sent = sum(len(serializer.batch(chunk)[0]) for chunk in batches)
+            results["batch"][f"{encoder}+{compression}"] = {
+                "us_per_report": cost,
+                "bytes_per_report": round(sent / count, 1),
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=100, help="reports per batch body")
+    args = parser.parse_args()
+    print(json.dumps(run(args.reports, args.batch), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Micro-benchmarks for the receiver's hot paths, with baseline comparison.
+
+Benchmarks (ns per operation, best of --repeat runs):
+  - parse.*:   _parse_hnnp_payload() on valid and rejected payloads, and the
+               batch decoder _parse_hnnp_payloads() per payload
+  - dedup.*:   dedup_key() and DedupCache.check_and_add() hits/misses with the
+               cache holding N entries
+  - sign.*:    build_presence_report() (cached signer per call), sign_presence_report()
+               with a pre-keyed ReportSigner, and sign_presence_reports() per report
+  - encode.*:  PresenceReport.to_json(), to_json() + json.dumps, ReportSerializer
+  - retry.*:   RetryQueue push, pop_due + reschedule and pop_due + discard with N
+               reports already queued
+
+Results are printed as JSON. --save writes them to a file; --baseline compares
+against a saved run and exits with status 1 if any benchmark is still more
+than --threshold slower after being timed a second time. Comparisons divide every result by a fixed pure-Python
+calibration loop measured in the same run, so a baseline recorded on a laptop
+still flags regressions when the suite runs on a Raspberry Pi.
+
+Usage:
+  python scripts/bench_suite.py --save scripts/bench_baseline.json
+  python scripts/bench_suite.py --baseline scripts/bench_baseline.json
+  python scripts/bench_suite.py --filter retry --sizes 1000,100000
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.ble_scanner import (  # noqa: E402
+    SlotWindow,
+    _parse_hnnp_payload,
+    _parse_hnnp_payloads,
+)
+from src.dedup_cache import DedupCache, dedup_key  # noqa: E402
+from src.presence_report import (  # noqa: E402
+    PresenceReport,
+    ReportColumns,
+    build_presence_report,
+    sign_presence_report,
+    sign_presence_reports,
+)
+from src.retry_queue import QueuedReport, RetryQueue  # noqa: E402
+from src.serializer import ReportSerializer  # noqa: E402
+from src.signer import ReportSigner  # noqa: E402
+
+
+ORG_ID = "org_bench"
+RECEIVER_ID = "receiver_bench"
+SECRET = "receiver-secret-for-benchmarks"
+NOW = 1_763_500_005
+OPS = 1000
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_THRESHOLD = 0.20
+CALIBRATION = "calibration"
+
+# A benchmark is a setup function: it builds fresh state and returns a callable
+# that performs OPS operations. Setup is not timed and runs once per repeat.
+Setup = Callable[[], Callable[[], object]]
+
+
+def _payload(i: int, time_slot: int, version: int = 2) -> bytes:
+    return bytes([version, 0]) + time_slot.to_bytes(4, "big") + (i + 1).to_bytes(16, "big") + bytes(8)
+
+
+def _report(i: int) -> PresenceReport:
+    return PresenceReport(
+        org_id=ORG_ID,
+        receiver_id=RECEIVER_ID,
+        timestamp=NOW,
+        time_slot=NOW // 15,
+        version=2,
+        flags=0,
+        token_prefix=(i + 1).to_bytes(16, "big"),
+        mac=bytes(8),
+        signature=bytes(32),
+    )
+
+
+def _calibration() -> Callable[[], object]:
+    # Plain interpreter work (arithmetic, dict and bytes ops) that the receiver
+    # code does not affect: a yardstick for how fast this machine runs Python.
+    def run() -> int:
+        total = 0
+        table: Dict[int, bytes] = {}
+        for i in range(OPS):
+            for j in range(16):
+                table[j] = (i * j).to_bytes(4, "big")
+                total += table[j][3] % 7
+        return total
+
+    return run
+
+
+def _parse_benchmarks() -> Dict[str, Setup]:
+    window = SlotWindow.at(NOW, 1)
+    valid = [_payload(i, window.current_slot) for i in range(OPS)]
+    rejected = [_payload(i, window.current_slot, version=1) for i in range(OPS)]
+    batches = [valid[i : i + 64] for i in range(0, OPS, 64)]
+
+    def single(payloads: List[bytes]) -> Setup:
+        return lambda: lambda: [_parse_hnnp_payload(payload, window) for payload in payloads]
+
+    return {
+        "parse.payload": single(valid),
+        "parse.payload_rejected": single(rejected),
+        "parse.batch_per_payload": lambda: lambda: [
+            _parse_hnnp_payloads(batch, window) for batch in batches
+        ],
+    }
+
+
+def _dedup_benchmarks(sizes: Tuple[int, ...]) -> Dict[str, Setup]:
+    slot = NOW // 15
+    prefixes = [(i + 1).to_bytes(16, "big") for i in range(max(sizes) + OPS)]
+    benchmarks: Dict[str, Setup] = {
+        "dedup.key": lambda: lambda: [dedup_key(prefix, slot) for prefix in prefixes[:OPS]],
+    }
+
+    def filled(size: int) -> DedupCache:
+        cache = DedupCache(window_seconds=5.0, max_entries=size + OPS)
+        for prefix in prefixes[:size]:
+            cache.check_and_add(dedup_key(prefix, slot), NOW)
+        return cache
+
+    for size in sizes:
+        def miss(size: int = size) -> Callable[[], object]:
+            cache = filled(size)
+            keys = [dedup_key(prefix, slot) for prefix in prefixes[size : size + OPS]]
+            return lambda: [cache.check_and_add(key, NOW + 1.0) for key in keys]
+
+        def hit(size: int = size) -> Callable[[], object]:
+            cache = filled(size)
+            step = max(size // OPS, 1)
+            keys = [dedup_key(prefixes[i % size], slot) for i in range(0, OPS * step, step)]
+            return lambda: [cache.check_and_add(key, NOW + 1.0) for key in keys]
+
+        benchmarks[f"dedup.miss@{size}"] = miss
+        benchmarks[f"dedup.hit@{size}"] = hit
+    return benchmarks
+
+
+def _sign_benchmarks() -> Dict[str, Setup]:
+    window = SlotWindow.at(NOW, 1)
+    packets = [_parse_hnnp_payload(_payload(i, window.current_slot), window) for i in range(OPS)]
+    signer = ReportSigner(ORG_ID, RECEIVER_ID, SECRET)
+    pairs = [(packet, NOW) for packet in packets]
+    return {
+        "sign.build_presence_report": lambda: lambda: [
+            build_presence_report(packet, ORG_ID, RECEIVER_ID, SECRET, NOW) for packet in packets
+        ],
+        "sign.sign_presence_report": lambda: lambda: [
+            sign_presence_report(packet, signer, NOW) for packet in packets
+        ],
+        "sign.batch_per_report": lambda: lambda: sign_presence_reports(pairs, signer),
+    }
+
+
+def _encode_benchmarks() -> Dict[str, Setup]:
+    reports = [_report(i) for i in range(OPS)]
+    serializer = ReportSerializer()
+    return {
+        "encode.to_json": lambda: lambda: [report.to_json() for report in reports],
+        "encode.to_json_dumps": lambda: lambda: [
+            json.dumps(report.to_json()).encode() for report in reports
+        ],
+        "encode.serializer_report": lambda: lambda: [serializer.report(report) for report in reports],
+    }
+
+
+def _retry_benchmarks(sizes: Tuple[int, ...]) -> Dict[str, Setup]:
+    benchmarks: Dict[str, Setup] = {}
+
+    def retry_at(i: int, size: int) -> float:
+        # Distinct times spread over a minute, pushed in shuffled order.
+        return NOW + 10 + (i * 7919 % size) * 60.0 / size
+
+    def filled(size: int) -> Tuple[RetryQueue, ReportColumns, float]:
+        """
+        Return a queue holding `size` reports and the time at which OPS of them are due.
+        """
+        store = ReportColumns(ORG_ID, RECEIVER_ID)
+        queue = RetryQueue(max_skew_seconds=120)
+        for i in range(size):
+            queue.push(QueuedReport(store, store.append(_report(i)), NOW, 1, retry_at(i, size)))
+        return queue, store, NOW + 10 + (OPS - 1) * 60.0 / size
+
+    for size in sizes:
+        size = max(size, OPS)
+
+        def push(size: int = size) -> Callable[[], object]:
+            queue, store, _due = filled(size)
+            rows = [store.append(_report(size + i)) for i in range(OPS)]
+            return lambda: [
+                queue.push(QueuedReport(store, row, NOW, 1, retry_at(i, size)))
+                for i, row in enumerate(rows)
+            ]
+
+        def reschedule(size: int = size) -> Callable[[], object]:
+            queue, _store, due = filled(size)
+
+            def run() -> None:
+                for item in queue.pop_due(due):
+                    item.next_retry_at += 120
+                    queue.reschedule(item)
+
+            return run
+
+        def discard(size: int = size) -> Callable[[], object]:
+            queue, _store, due = filled(size)
+
+            def run() -> None:
+                for item in queue.pop_due(due):
+                    queue.discard(item)
+
+            return run
+
+        benchmarks[f"retry.push@{size}"] = push
+        benchmarks[f"retry.pop_reschedule@{size}"] = reschedule
+        benchmarks[f"retry.pop_discard@{size}"] = discard
+    return benchmarks
+
+
+def _time(setup: Setup, repeat: int) -> Tuple[float, float]:
+    """
+    Return (best, median) ns per operation over `repeat` runs of OPS operations.
+    """
+    samples = []
+    for _ in range(repeat):
+        run = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter_ns()
+            run()
+            samples.append((time.perf_counter_ns() - started) / OPS)
+        finally:
+            gc.enable()
+    samples.sort()
+    return samples[0], samples[len(samples) // 2]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _benchmarks(sizes: Tuple[int, ...]) -> Dict[str, Setup]:
+    benchmarks = _parse_benchmarks()
+    benchmarks.update(_dedup_benchmarks(sizes))
+    benchmarks.update(_sign_benchmarks())
+    benchmarks.update(_encode_benchmarks())
+    benchmarks.update(_retry_benchmarks(sizes))
+    return benchmarks
+
+
+def run(sizes: Tuple[int, ...], repeat: int, name_filter: str = "") -> dict:
+    benchmarks = _benchmarks(sizes)
+
+    # Calibration runs once before every benchmark as well as on its own, so a
+    # CPU that changes speed part-way through (thermal throttling, a noisy
+    # neighbour) still yields the machine's best calibration time.
+    calibration = [_time(_calibration, repeat)]
+    results = {}
+    for name, setup in benchmarks.items():
+        if name_filter not in name:
+            continue
+        calibration.append(_time(_calibration, 1))
+        best, median = _time(setup, repeat)
+        results[name] = {"ns_per_op": round(best, 1), "median_ns_per_op": round(median, 1)}
+    results[CALIBRATION] = {
+        "ns_per_op": round(min(best for best, _median in calibration), 1),
+        "median_ns_per_op": round(calibration[0][1], 1),
+    }
+    return {
+        "meta": {
+            "created_at": int(time.time()),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(terse=True),
+            "ops": OPS,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def recheck(results: dict, names: List[str], sizes: Tuple[int, ...], repeat: int) -> None:
+    """
+    Time `names` again and keep each benchmark's faster run in `results`.
+    """
+    benchmarks = _benchmarks(sizes)
+    for name in names:
+        best, median = _time(benchmarks[name], repeat)
+        if best < results["results"][name]["ns_per_op"]:
+            results["results"][name] = {"ns_per_op": round(best, 1), "median_ns_per_op": round(median, 1)}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> dict:
+    """
+    Compare calibration-normalized results; ratio > 1 + threshold is a regression.
+    """
+    now_cal = current["results"][CALIBRATION]["ns_per_op"]
+    base_cal = baseline["results"][CALIBRATION]["ns_per_op"]
+    rows = {}
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if name == CALIBRATION or base is None:
+            continue
+        ratio = (result["ns_per_op"] / now_cal) / (base["ns_per_op"] / base_cal)
+        rows[name] = {"baseline_ns_per_op": base["ns_per_op"], "ratio": round(ratio, 3)}
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+    return {
+        "baseline_commit": baseline.get("meta", {}).get("commit"),
+        "threshold": threshold,
+        "regressions": regressions,
+        "benchmarks": rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma-separated cache/queue sizes",
+    )
+    parser.add_argument("--repeat", type=int, default=7, help="runs per benchmark (best is reported)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--save", help="write results to this JSON file (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed slowdown before a benchmark counts as a regression (0.2 = 20%%)",
+    )
+    args = parser.parse_args()
+
+    sizes = tuple(int(size) for size in args.sizes.split(",") if size.strip())
+    results = run(sizes, max(args.repeat, 1), args.filter)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["comparison"] = compare(results, baseline, args.threshold)
+        if results["comparison"]["regressions"]:
+            # A single slow run on a busy machine is not a regression: time the
+            # flagged benchmarks again and keep the faster result.
+            recheck(results, results["comparison"]["regressions"], sizes, max(args.repeat, 1))
+            results["comparison"] = compare(results, baseline, args.threshold)
+    print(json.dumps(results, indent=2))
+
+    comparison = results.get("comparison")
+    if comparison is not None:
+        for name, row in comparison["benchmarks"].items():
+            flag = "  REGRESSION" if name in comparison["regressions"] else ""
+            print(f"{name:32s} {row['ratio']:6.2f}x{flag}", file=sys.stderr)
+        if comparison["regressions"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
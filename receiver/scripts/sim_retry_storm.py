@@ -0,0 +1,153 @@
+"""
+Simulate a fleet of receivers retrying through a Cloud outage, in virtual time.
+
+Compares the Cloud-side request load of the previous retry policy (fixed
+2 ** attempts backoff, retry loop ticking once a second, no breaker) with the
+current one (decorrelated jitter + circuit breaker, using the receiver's own
+decorrelated_jitter() and CircuitBreaker). Requests complete instantly, so the
+adaptive concurrency limit is not modelled; run stub_cloud.py --outage-at/--outage-for
+against real receivers to see it.
+
+Usage:
+  python receiver/scripts/sim_retry_storm.py --receivers 200 --outage 90
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.flow_control import BREAKER_HALF_OPEN, CircuitBreaker, decorrelated_jitter  # noqa: E402
+
+
+TICK = 0.1
+MAX_SKEW_SECONDS = 120
+MAX_RETRY_ATTEMPTS = 10
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _simulate(policy: str, args: argparse.Namespace, seed: int) -> Dict[str, object]:
+    rng = random.Random(seed)
+    clock = _Clock()
+    outage_end = args.outage_at + args.outage
+    duration = outage_end + args.after
+    load: List[int] = [0] * (int(duration) + 1)
+    delivered = dropped = 0
+
+    # Per receiver: heap of (next_retry_at, seq, report_ts, attempts, backoff).
+    queues: List[list] = [[] for _ in range(args.receivers)]
+    breakers = [
+        CircuitBreaker(rng=random.Random(rng.random()), clock=clock) for _ in range(args.receivers)
+    ]
+    phases = [rng.random() for _ in range(args.receivers)]
+    next_report = [rng.random() / args.rate for _ in range(args.receivers)]
+    seq = 0
+
+    def send(now: float) -> bool:
+        load[int(now)] += 1
+        return not (args.outage_at <= now < outage_end)
+
+    steps = int(duration / TICK)
+    for step in range(steps):
+        now = clock.now = step * TICK
+        for r in range(args.receivers):
+            queue = queues[r]
+            breaker = breakers[r]
+            outcomes = []
+
+            # Live reports from scanning.
+            while next_report[r] <= now:
+                report_ts = next_report[r]
+                next_report[r] += 1.0 / args.rate
+                if policy == "jitter_breaker" and not breaker.allow():
+                    seq += 1
+                    heapq.heappush(queue, (now + max(breaker.defer_seconds(), 1.0), seq, report_ts, 1, 0.0))
+                    continue
+                ok = send(now)
+                if policy == "jitter_breaker":
+                    # Sends are instantaneous here: half-open now means this was the probe.
+                    probe = breaker.state == BREAKER_HALF_OPEN
+                    breaker.record_success(probe) if ok else breaker.record_failure(probe)
+                if ok:
+                    delivered += 1
+                else:
+                    backoff = decorrelated_jitter(1.0, rng=rng) if policy == "jitter_breaker" else 1.0
+                    seq += 1
+                    heapq.heappush(queue, (now + backoff, seq, report_ts, 1, backoff))
+
+            # Retry loop: legacy ticks once a second at the receiver's phase.
+            if policy == "legacy" and int((now - phases[r]) / TICK) % int(1 / TICK) != 0:
+                continue
+            while queue and queue[0][0] <= now:
+                outcomes.append(heapq.heappop(queue))
+            for _due, item_seq, report_ts, attempts, backoff in outcomes:
+                if now - report_ts > MAX_SKEW_SECONDS:
+                    dropped += 1
+                    continue
+                if policy == "jitter_breaker" and not breaker.allow():
+                    heapq.heappush(
+                        queue,
+                        (now + max(breaker.defer_seconds(), 1.0), item_seq, report_ts, attempts, backoff),
+                    )
+                    continue
+                ok = send(now)
+                if policy == "jitter_breaker":
+                    # Sends are instantaneous here: half-open now means this was the probe.
+                    probe = breaker.state == BREAKER_HALF_OPEN
+                    breaker.record_success(probe) if ok else breaker.record_failure(probe)
+                if ok:
+                    delivered += 1
+                    continue
+                attempts += 1
+                if attempts > MAX_RETRY_ATTEMPTS:
+                    dropped += 1
+                    continue
+                if policy == "legacy":
+                    backoff = min(60, 2 ** min(attempts, 6))
+                else:
+                    backoff = decorrelated_jitter(backoff, rng=rng)
+                heapq.heappush(queue, (now + backoff, item_seq, report_ts, attempts, backoff))
+
+    recovery = load[int(outage_end) : int(outage_end) + args.after]
+    outage = load[int(args.outage_at) : int(outage_end)]
+    baseline = args.receivers * args.rate
+    return {
+        "policy": policy,
+        "requests_during_outage": sum(outage),
+        "recovery_peak_per_s": max(recovery),
+        "recovery_peak_vs_baseline": round(max(recovery) / baseline, 1),
+        "recovery_p95_per_s": sorted(recovery)[int(len(recovery) * 0.95)],
+        "seconds_above_2x_baseline": sum(1 for n in recovery if n > 2 * baseline),
+        "delivered": delivered,
+        "dropped": dropped,
+        "load_per_5s": [sum(load[i : i + 5]) // 5 for i in range(0, len(load) - 1, 5)],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--receivers", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=0.5, help="reports/s per receiver")
+    parser.add_argument("--outage-at", type=float, default=20.0)
+    parser.add_argument("--outage", type=float, default=90.0, help="outage length (s)")
+    parser.add_argument("--after", type=int, default=120, help="seconds simulated after recovery")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for policy in ("legacy", "jitter_breaker"):
+        print(json.dumps(_simulate(policy, args, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
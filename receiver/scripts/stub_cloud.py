@@ -0,0 +1,152 @@
+"""
+Local stand-in for Cloud's presence endpoints, for measuring receiver upload cost.
+
+Accepts POST /v2/presence and POST /v2/presence/batch (unless --no-batch, which
+answers 404 like a Cloud without the batch endpoint). Faults can be injected:
+--outage-at/--outage-for answer 503 during a window (seconds after start), and
+--error-rate answers 503 to a random fraction of requests. Prints, every
+--interval seconds, requests/sec, reports/sec and request bytes/sec. Bytes are
+counted as they appear on the wire for plain HTTP: request line, headers and body
+(compressed size for HNNP_UPLOAD_COMPRESSION bodies).
+
+Usage:
+  python receiver/scripts/stub_cloud.py --port 8080
+  API_BASE_URL=http://127.0.0.1:8080 HNNP_UPLOAD_MODE=batch \\
+    HNNP_PACKET_SOURCE=synthetic python -m src.main   # from receiver/
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+class _Counters:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.reports = 0
+        self.bytes = 0
+        self.failed = 0
+
+    def snapshot(self) -> tuple:
+        return self.requests, self.reports, self.bytes, self.failed
+
+
+class _Faults:
+    def __init__(self, outage_at: float, outage_for: float, error_rate: float) -> None:
+        self.started = time.monotonic()
+        self.outage_at = outage_at
+        self.outage_for = outage_for
+        self.error_rate = error_rate
+
+    def failing(self) -> bool:
+        elapsed = time.monotonic() - self.started
+        if self.outage_for and self.outage_at <= elapsed < self.outage_at + self.outage_for:
+            return True
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def _request_bytes(request: web.Request, body: bytes) -> int:
+    request_line = f"{request.method} {request.path_qs} HTTP/{request.version.major}.{request.version.minor}\r\n"
+    headers = sum(len(name) + len(value) + 4 for name, value in request.raw_headers)
+    # aiohttp inflates gzip/deflate request bodies; Content-Length is the wire size.
+    return len(request_line) + headers + 2 + (request.content_length or len(body))
+
+
+def build_app(
+    counters: _Counters, batch: bool, latency: float, faults: _Faults
+) -> web.Application:
+    async def presence(request: web.Request) -> web.Response:
+        body = await request.read()
+        counters.requests += 1
+        counters.bytes += _request_bytes(request, body)
+        if faults.failing():
+            counters.failed += 1
+            return web.json_response({"error": "unavailable"}, status=503)
+        counters.reports += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return web.json_response({"status": "ok"})
+
+    async def presence_batch(request: web.Request) -> web.Response:
+        body = await request.read()
+        counters.requests += 1
+        counters.bytes += _request_bytes(request, body)
+        if not batch:
+            return web.json_response({"error": "not_found"}, status=404)
+        if faults.failing():
+            counters.failed += 1
+            return web.json_response({"error": "unavailable"}, status=503)
+        counters.reports += len(json.loads(body)["reports"])
+        if latency:
+            await asyncio.sleep(latency)
+        return web.json_response({"status": "ok"})
+
+    async def health(_request: web.Request) -> web.Response:
+        # Receivers pre-warm and keep connections alive with GET /health.
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_get("/health", health)
+    app.router.add_post("/v2/presence", presence)
+    app.router.add_post("/v2/presence/batch", presence_batch)
+    return app
+
+
+async def _run(args: argparse.Namespace) -> None:
+    counters = _Counters()
+    faults = _Faults(args.outage_at, args.outage_for, args.error_rate)
+    runner = web.AppRunner(
+        build_app(counters, not args.no_batch, args.latency_ms / 1000.0, faults)
+    )
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"stub cloud listening on http://{args.host}:{args.port} (batch={'off' if args.no_batch else 'on'})")
+
+    started = time.monotonic()
+    last_at, last = started, counters.snapshot()
+    try:
+        while True:
+            await asyncio.sleep(args.interval)
+            now, current = time.monotonic(), counters.snapshot()
+            elapsed = now - last_at
+            requests, reports, nbytes, failed = (c - p for c, p in zip(current, last))
+            print(
+                json.dumps(
+                    {
+                        "elapsed_s": round(now - started, 1),
+                        "requests_per_s": round(requests / elapsed, 1),
+                        "reports_per_s": round(reports / elapsed, 1),
+                        "failed_per_s": round(failed / elapsed, 1),
+                        "bytes_per_s": round(nbytes / elapsed),
+                        "bytes_per_report": round(nbytes / reports, 1) if reports else None,
+                    }
+                ),
+                flush=True,
+            )
+            last_at, last = now, current
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--no-batch", action="store_true", help="answer 404 on /v2/presence/batch")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="artificial response delay")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between stat lines")
+    parser.add_argument("--outage-at", type=float, default=0.0, help="start of a 503 outage (s)")
+    parser.add_argument("--outage-for", type=float, default=0.0, help="outage length (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="random 503 fraction")
+    try:
+        asyncio.run(_run(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
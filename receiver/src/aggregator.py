@@ -0,0 +1,335 @@
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .ble_scanner import BlePacketV2, Sighting
+from .dedup_cache import dedup_key
+
+
+EMIT_OFF = "off"
+EMIT_ON_FIRST = "first"
+EMIT_ON_CLOSE = "close"
+SLOT_SECONDS = 15
+DEFAULT_CLOSE_GRACE_SECONDS = 15.0
+
+
+@dataclass(slots=True)
+class SlotObservation:
+    """
+    All sightings of one (token_prefix, time_slot), collapsed into a single record.
+
+    packet is the first sighting's packet; RSSI statistics skip sightings without RSSI.
+    """
+
+    packet: BlePacketV2
+    first_seen: float
+    last_seen: float
+    # time.monotonic() stamps of the first sighting (see tracing.ReportTrace).
+    received_at: float = 0.0
+    parsed_at: float = 0.0
+    count: int = 0
+    rssi_count: int = 0
+    rssi_sum: int = 0
+    rssi_min: Optional[int] = None
+    rssi_max: Optional[int] = None
+
+    @property
+    def rssi_mean(self) -> Optional[float]:
+        if self.rssi_count == 0:
+            return None
+        return self.rssi_sum / self.rssi_count
+
+    def add(self, rssi: Optional[int], seen_at: float) -> None:
+        self.count += 1
+        if seen_at > self.last_seen:
+            self.last_seen = seen_at
+        if rssi is None:
+            return
+        self.rssi_count += 1
+        self.rssi_sum += rssi
+        if self.rssi_min is None or rssi < self.rssi_min:
+            self.rssi_min = rssi
+        if self.rssi_max is None or rssi > self.rssi_max:
+            self.rssi_max = rssi
+
+
+class SlotAggregator:
+    """
+    Collapse sightings into one SlotObservation per (token_prefix, time_slot).
+
+    emit selects when the observation is released:
+      - "first": as soon as the first sighting arrives (lowest latency; later
+        sightings only update statistics).
+      - "close": once the slot has closed, i.e. at (time_slot + 1) * 15 seconds plus
+        close_grace_seconds, with complete first/last/count/RSSI statistics.
+
+    Open observations are grouped by time_slot, so closing a slot drops its whole
+    group at once. In both modes, each observation's final statistics are folded
+    into the "closed" summary of stats() when its slot closes.
+
+    Slots close in order, so a sighting for a slot at or below the highest closed
+    one arrived after its grace period. It is counted in late_sightings and
+    dropped instead of opening a second observation for the same key.
+    """
+
+    def __init__(
+        self,
+        emit: str = EMIT_ON_CLOSE,
+        close_grace_seconds: float = DEFAULT_CLOSE_GRACE_SECONDS,
+    ) -> None:
+        if emit not in (EMIT_ON_FIRST, EMIT_ON_CLOSE):
+            raise ValueError(f"SlotAggregator: unsupported emit mode: {emit!r}")
+        self.emit = emit
+        self.close_grace_seconds = close_grace_seconds
+        self._slots: Dict[int, Dict[bytes, SlotObservation]] = {}
+        self._closed_through: Optional[int] = None
+
+        self.sightings = 0
+        self.late_sightings = 0
+        self.observations = 0
+
+        # Summary of closed observations (complete statistics in both modes).
+        self.closed = 0
+        self._closed_sightings = 0
+        self._dwell_sum = 0.0
+        self._rssi_sum = 0
+        self._rssi_count = 0
+        self._rssi_min: Optional[int] = None
+        self._rssi_max: Optional[int] = None
+        self._spread_sum = 0
+        self._spread_count = 0
+
+    def add(self, sighting: Sighting) -> Optional[SlotObservation]:
+        """
+        Record a sighting; return an observation if it should be emitted right now.
+        """
+        self.sightings += 1
+        packet = sighting.packet
+        if self._closed_through is not None and packet.time_slot <= self._closed_through:
+            self.late_sightings += 1
+            return None
+        group = self._slots.get(packet.time_slot)
+        if group is None:
+            group = self._slots[packet.time_slot] = {}
+
+        key = dedup_key(packet.token_prefix, packet.time_slot)
+        observation = group.get(key)
+        if observation is not None:
+            observation.add(sighting.rssi, sighting.seen_at)
+            return None
+
+        observation = SlotObservation(
+            packet=packet,
+            first_seen=sighting.seen_at,
+            last_seen=sighting.seen_at,
+            received_at=sighting.received_at,
+            parsed_at=sighting.parsed_at,
+        )
+        observation.add(sighting.rssi, sighting.seen_at)
+        group[key] = observation
+        if self.emit == EMIT_ON_FIRST:
+            self.observations += 1
+            return observation
+        return None
+
+    def close_due(self, now: float) -> List[SlotObservation]:
+        """
+        Close every slot whose close time has passed.
+
+        Returns the observations to emit (always empty in "first" mode, where they
+        were already emitted on their first sighting).
+        """
+        emitted: List[SlotObservation] = []
+        for time_slot in sorted(self._slots):
+            if self._close_at(time_slot) > now:
+                break
+            group = self._slots.pop(time_slot)
+            self._closed_through = time_slot
+            for observation in group.values():
+                self._fold(observation)
+            if self.emit == EMIT_ON_CLOSE:
+                emitted.extend(group.values())
+        self.observations += len(emitted)
+        return emitted
+
+    def next_close_at(self) -> Optional[float]:
+        if not self._slots:
+            return None
+        return self._close_at(min(self._slots))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters for health reporting; reduction_factor = sightings per emitted observation.
+        """
+        return {
+            "emit": self.emit,
+            "sightings": self.sightings,
+            "late_sightings": self.late_sightings,
+            "observations": self.observations,
+            "open_observations": sum(len(group) for group in self._slots.values()),
+            "reduction_factor": (
+                round(self.sightings / self.observations, 2) if self.observations else None
+            ),
+            "closed": self._closed_stats(),
+        }
+
+    def _fold(self, observation: SlotObservation) -> None:
+        self.closed += 1
+        self._closed_sightings += observation.count
+        self._dwell_sum += observation.last_seen - observation.first_seen
+        if observation.rssi_count == 0:
+            return
+        self._rssi_sum += observation.rssi_sum
+        self._rssi_count += observation.rssi_count
+        assert observation.rssi_min is not None and observation.rssi_max is not None
+        if self._rssi_min is None or observation.rssi_min < self._rssi_min:
+            self._rssi_min = observation.rssi_min
+        if self._rssi_max is None or observation.rssi_max > self._rssi_max:
+            self._rssi_max = observation.rssi_max
+        self._spread_sum += observation.rssi_max - observation.rssi_min
+        self._spread_count += 1
+
+    def _closed_stats(self) -> Dict[str, Any]:
+        """
+        Per-observation statistics over every closed observation:
+        sightings and dwell (last_seen - first_seen) per observation, RSSI mean
+        over all their sightings, weakest/strongest RSSI seen, and the mean
+        max-min RSSI spread within one observation.
+        """
+        closed = self.closed
+        return {
+            "observations": closed,
+            "sightings_per_observation": round(self._closed_sightings / closed, 2) if closed else None,
+            "mean_dwell_s": round(self._dwell_sum / closed, 3) if closed else None,
+            "rssi_mean_dbm": (
+                round(self._rssi_sum / self._rssi_count, 1) if self._rssi_count else None
+            ),
+            "rssi_min_dbm": self._rssi_min,
+            "rssi_max_dbm": self._rssi_max,
+            "rssi_mean_spread_db": (
+                round(self._spread_sum / self._spread_count, 1) if self._spread_count else None
+            ),
+        }
+
+    def _close_at(self, time_slot: int) -> float:
+        return (time_slot + 1) * SLOT_SECONDS + self.close_grace_seconds
+
+
+_AGGREGATOR: Optional[SlotAggregator] = None
+
+
+def get_aggregate_mode() -> str:
+    """
+    Return HNNP_AGGREGATE_MODE ("off", "first" or "close"); unknown values mean "off".
+    """
+    mode = os.environ.get("HNNP_AGGREGATE_MODE", EMIT_OFF).strip().lower()
+    if mode in (EMIT_ON_FIRST, EMIT_ON_CLOSE):
+        return mode
+    return EMIT_OFF
+
+
+def _get_close_grace_seconds() -> float:
+    raw = os.environ.get("HNNP_AGGREGATE_GRACE_SECONDS", str(DEFAULT_CLOSE_GRACE_SECONDS))
+    try:
+        value = float(raw)
+    except ValueError:
+        value = DEFAULT_CLOSE_GRACE_SECONDS
+    return max(value, 0.0)
+
+
+def get_aggregation_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return aggregation counters, or None if aggregation is not running.
+    """
+    return _AGGREGATOR.stats() if _AGGREGATOR is not None else None
+
+
+async def aggregate_sightings(
+    sightings: AsyncIterator[Sighting],
+    emit: str = EMIT_ON_CLOSE,
+) -> AsyncIterator[SlotObservation]:
+    """
+    Run a SlotAggregator over a sighting stream, yielding observations one at a
+    time (see aggregate_sighting_batches()).
+    """
+    async with aclosing(aggregate_sighting_batches(sightings, emit)) as batches:
+        async for observations in batches:
+            for observation in observations:
+                yield observation
+
+
+async def aggregate_sighting_batches(
+    sightings: AsyncIterator[Sighting],
+    emit: str = EMIT_ON_CLOSE,
+) -> AsyncIterator[List[SlotObservation]]:
+    """
+    Run a SlotAggregator over a sighting stream.
+
+    Yields the observations emitted together: every observation of a closed slot
+    at once, or a single observation on its first sighting in "first" mode.
+
+    Sightings are pumped into a queue by a background task so that slot-close
+    emission is driven by a timer and does not wait for the next advertisement.
+    """
+    global _AGGREGATOR
+    aggregator = SlotAggregator(emit=emit, close_grace_seconds=_get_close_grace_seconds())
+    _AGGREGATOR = aggregator
+
+    queue: "asyncio.Queue[Optional[Sighting]]" = asyncio.Queue(maxsize=1024)
+
+    async def _pump() -> None:
+        cancelled = False
+        try:
+            async for sighting in sightings:
+                await queue.put(sighting)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # Wake the consumer when the source ends or fails; after cancellation
+            # nobody is reading, and a full queue would block this put forever.
+            if not cancelled:
+                await queue.put(None)
+
+    pump = asyncio.ensure_future(_pump())
+    source_ended = False
+    try:
+        while True:
+            next_close_at = aggregator.next_close_at()
+            try:
+                if next_close_at is None:
+                    sighting = await queue.get()
+                else:
+                    sighting = await asyncio.wait_for(
+                        queue.get(), timeout=max(next_close_at - time.time(), 0.0)
+                    )
+            except asyncio.TimeoutError:
+                sighting = None
+            else:
+                if sighting is None:
+                    # Source exhausted; flush whatever is still open.
+                    source_ended = True
+                    closed = aggregator.close_due(float("inf"))
+                    if closed:
+                        yield closed
+                    return
+
+            if sighting is not None:
+                observation = aggregator.add(sighting)
+                if observation is not None:
+                    yield [observation]
+
+            closed = aggregator.close_due(time.time())
+            if closed:
+                yield closed
+    finally:
+        if source_ended:
+            # The pump is finishing on its own: surface scanner errors (e.g. bleak
+            # missing) instead of swallowing them.
+            await pump
+        else:
+            pump.cancel()
+            await asyncio.gather(pump, return_exceptions=True)
@@ -1,138 +1,713 @@
 import asyncio
 import os
+import struct
 import time
+from contextlib import aclosing
 from dataclasses import dataclass
-from typing import AsyncIterator, Optional
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence
 
 try:
     from bleak import BleakScanner  # type: ignore
 except ImportError:  # pragma: no cover - bleak not installed in all environments
     BleakScanner = None  # type: ignore
 
+from .dedup_cache import DEFAULT_DEDUP_MAX_ENTRIES, DedupCache, dedup_key
+from .hci import (
+    HCI_EVENT_PKT,
+    adapter_index,
+    decode_le_advertising_reports,
+    extract_hnnp_service_data,
+    le_set_scan_enable,
+    le_set_scan_parameters,
+    open_hci_socket,
+    read_hci_dev_stats,
+)
+from .liveness import LOOP_SCAN, heartbeat
 
 HNNP_SERVICE_UUID = "0000f0e0-0000-1000-8000-00805f9b34fb"
 PAYLOAD_LENGTH_BYTES = 30
 TEN_YEARS_SECONDS = 10 * 365 * 24 * 60 * 60
 DEFAULT_DUPLICATE_WINDOW_SECONDS = 5
-
-
-@dataclass
+DEFAULT_SCAN_QUEUE_SIZE = 1024
+
+_SCAN_STATS: Dict[str, float] = {
+    "adverts_delivered": 0,
+    "devices_polled": 0,
+    "adverts_non_hnnp": 0,
+    "adverts_received": 0,
+    "queue_overflows": 0,
+    "queue_depth": 0,
+    "max_queue_delay_ms": 0.0,
+    "hci_frames_malformed": 0,
+}
+# Why candidate HNNP payloads were rejected by _parse_hnnp_payload(); only
+# rejected payloads are classified, so accepted packets pay nothing for this.
+DROP_LENGTH = "length"
+DROP_VERSION = "version"
+DROP_TIME_SLOT = "time_slot"
+DROP_ZERO_TOKEN = "zero_token"
+_PARSE_DROPS: Dict[str, int] = {
+    DROP_LENGTH: 0,
+    DROP_VERSION: 0,
+    DROP_TIME_SLOT: 0,
+    DROP_ZERO_TOKEN: 0,
+}
+_DEDUP_CACHE: Optional[DedupCache] = None
+# Per-adapter HCI event counter when its scan started, used to estimate stack-level filtering.
+_HCI_BASELINES: Dict[str, Dict[str, int]] = {}
+
+
+# version(1) | flags(1) | time_slot(4, big-endian) | token_prefix(16) | mac(8)
+_HEADER = struct.Struct(">BBI")
+_RECORD = struct.Struct(">BBI24x")
+_ZERO_TOKEN_AND_MAC = bytes(24)
+
+
+@dataclass(frozen=True, slots=True)
 class BlePacketV2:
     version: int
     flags: int
     time_slot: int
+    # bytes, or a read-only memoryview slice when produced by the batch decoder.
     token_prefix: bytes
     mac: bytes
 
 
-def _parse_hnnp_payload(payload: bytes) -> Optional[BlePacketV2]:
+class RawAdvertisement(NamedTuple):
+    """An HNNP service-data payload as delivered by the scanner, before parsing."""
+
+    payload: bytes
+    rssi: Optional[int]
+    received_at: float  # time.monotonic()
+
+
+@dataclass(slots=True)
+class Sighting:
+    """A single parsed HNNP advertisement (one of many rebroadcasts per slot)."""
+
+    packet: BlePacketV2
+    rssi: Optional[int]
+    seen_at: float  # unix time
+    # time.monotonic() stamps for per-stage latency (see tracing.ReportTrace).
+    received_at: float = 0.0
+    parsed_at: float = 0.0
+
+
+@dataclass(frozen=True)
+class SlotWindow:
+    """
+    Clock and drift configuration captured once per scan tick.
+
+    min_slot/max_slot fold the MAX_DRIFT_SLOTS window and the 10-year future
+    sanity bound into a single inclusive range so per-packet checks are two
+    integer comparisons.
+    """
+
+    now: int
+    current_slot: int
+    max_drift_slots: int
+    min_slot: int
+    max_slot: int
+
+    @classmethod
+    def at(cls, now: int, max_drift_slots: int) -> "SlotWindow":
+        # time_slot window validation using 15-second slots with configurable drift.
+        # current_slot = floor(now / 15)
+        # Accept if |time_slot - current_slot| <= MAX_DRIFT_SLOTS (default 1), otherwise drop.
+        current_slot = now // 15
+        # Reject obviously invalid future time_slot (sanity bound): time_slot * 15 > now + 10y.
+        future_bound = (now + TEN_YEARS_SECONDS) // 15
+        return cls(
+            now=now,
+            current_slot=current_slot,
+            max_drift_slots=max_drift_slots,
+            min_slot=current_slot - max_drift_slots,
+            max_slot=min(current_slot + max_drift_slots, future_bound),
+        )
+
+
+_MAX_DRIFT_SLOTS: Optional[int] = None
+_WINDOW_CACHE: Optional[SlotWindow] = None
+
+
+def _current_slot_window() -> SlotWindow:
+    """
+    Return the SlotWindow for the current second.
+
+    MAX_DRIFT_SLOTS is read from the environment once per process and the window
+    is rebuilt only when the wall-clock second changes.
+    """
+    global _MAX_DRIFT_SLOTS, _WINDOW_CACHE
+
+    now = int(time.time())
+    window = _WINDOW_CACHE
+    if window is not None and window.now == now:
+        return window
+
+    if _MAX_DRIFT_SLOTS is None:
+        _MAX_DRIFT_SLOTS = int(os.environ.get("MAX_DRIFT_SLOTS", "1"))
+    window = SlotWindow.at(now, _MAX_DRIFT_SLOTS)
+    _WINDOW_CACHE = window
+    return window
+
+
+def _parse_hnnp_payload(
+    payload: bytes, window: Optional[SlotWindow] = None
+) -> Optional[BlePacketV2]:
     """
     Perform local structural validation and version check for a candidate HNNP v2 payload.
 
     Rules (from protocol/spec.md v2):
     - Payload length MUST be exactly 30 bytes.
     - version MUST be 0x02 for v2 packets (v1/other versions are ignored here).
+    - time_slot must be within MAX_DRIFT_SLOTS of the current 15-second slot.
     - time_slot must not be unreasonably far in the future (>10 years from now).
     - token_prefix + mac must not be all zero (noise).
+
+    window defaults to the cached SlotWindow for the current second.
     """
     if len(payload) != PAYLOAD_LENGTH_BYTES:
         return None
 
-    version = payload[0]
-    flags = payload[1]
+    version, flags, time_slot = _HEADER.unpack_from(payload)
 
     if version != 0x02:
         # For now we ignore non-v2 packets; multi-version support can be added later.
         return None
 
-    time_slot = int.from_bytes(payload[2:6], byteorder="big", signed=False)
-    token_prefix = payload[6:22]
-    mac = payload[22:30]
-
-    now = int(time.time())
-
-    # time_slot window validation using 15-second slots with configurable drift.
-    # current_slot = floor(now / 15)
-    # Accept if |time_slot - current_slot| <= MAX_DRIFT_SLOTS (default 1), otherwise drop.
-    current_slot = now // 15
-    max_drift_slots = int(os.environ.get("MAX_DRIFT_SLOTS", "1"))
-    if abs(time_slot - current_slot) > max_drift_slots:
-        return None
-
-    # Reject obviously invalid future time_slot (sanity bound): interpret as seconds = time_slot * 15.
-    unix_time_estimate = time_slot * 15
-    if unix_time_estimate > now + TEN_YEARS_SECONDS:
+    if window is None:
+        window = _current_slot_window()
+    if time_slot < window.min_slot or time_slot > window.max_slot:
         return None
 
     # Reject packets with all-zero token_prefix and mac (likely noise).
-    if token_prefix == b"\x00" * len(token_prefix) and mac == b"\x00" * len(mac):
+    if payload[6:30] == _ZERO_TOKEN_AND_MAC:
         return None
 
     return BlePacketV2(
         version=version,
         flags=flags,
         time_slot=time_slot,
-        token_prefix=token_prefix,
-        mac=mac,
+        token_prefix=payload[6:22],
+        mac=payload[22:30],
     )
 
 
-async def scan_hnnp_packets() -> AsyncIterator[BlePacketV2]:
+def _drop_reason(payload: bytes, window: SlotWindow) -> str:
+    """
+    Return which _parse_hnnp_payload() rule rejected payload (one of DROP_*).
+    """
+    if len(payload) != PAYLOAD_LENGTH_BYTES:
+        return DROP_LENGTH
+    version, _flags, time_slot = _HEADER.unpack_from(payload)
+    if version != 0x02:
+        return DROP_VERSION
+    if time_slot < window.min_slot or time_slot > window.max_slot:
+        return DROP_TIME_SLOT
+    return DROP_ZERO_TOKEN
+
+
+def _parse_hnnp_buffer(buffer: bytes, window: SlotWindow) -> List[Optional[BlePacketV2]]:
     """
-    Continuous BLE scan loop for HNNP packets.
+    Decode a contiguous buffer of back-to-back 30-byte payloads in one pass.
 
-    - Filters for HNNP service UUID.
-    - Filters by payload length = 30 bytes.
-    - Performs local structural validation and version check.
-    - Decodes candidate packets into BlePacketV2.
+    Applies exactly the rules of _parse_hnnp_payload(); the result list lines up with
+    the records in buffer (None for rejected records). token_prefix and mac are
+    read-only memoryview slices of buffer rather than new bytes objects; they compare
+    and hash like the equivalent bytes.
+    """
+    view = memoryview(buffer)
+    min_slot = window.min_slot
+    max_slot = window.max_slot
+
+    results: List[Optional[BlePacketV2]] = []
+    append = results.append
+    offset = 0
+    for version, flags, time_slot in _RECORD.iter_unpack(view):
+        if (
+            version != 0x02
+            or time_slot < min_slot
+            or time_slot > max_slot
+            or view[offset + 6 : offset + 30] == _ZERO_TOKEN_AND_MAC
+        ):
+            append(None)
+        else:
+            append(
+                BlePacketV2(
+                    version=version,
+                    flags=flags,
+                    time_slot=time_slot,
+                    token_prefix=view[offset + 6 : offset + 22],
+                    mac=view[offset + 22 : offset + 30],
+                )
+            )
+        offset += PAYLOAD_LENGTH_BYTES
+    return results
+
+
+def _parse_hnnp_payloads(
+    payloads: Sequence[bytes], window: Optional[SlotWindow] = None
+) -> List[Optional[BlePacketV2]]:
+    """
+    Batch variant of _parse_hnnp_payload().
 
-    Yields BlePacketV2 instances for further processing (e.g., presence reports).
+    Payloads of the right length are joined into one contiguous buffer and decoded
+    with _parse_hnnp_buffer(); the clock and configuration are read once for the
+    whole batch. The result lines up with payloads and compares equal to
+    [_parse_hnnp_payload(p) for p in payloads].
     """
-    if BleakScanner is None:
-        raise RuntimeError("bleak is not installed; BLE scanning is unavailable")
+    if window is None:
+        window = _current_slot_window()
 
-    # In-memory cache for duplicate suppression keyed by (token_prefix, time_slot).
-    # Maps key -> last_seen_unix_time.
-    seen: dict[tuple[bytes, int], float] = {}
+    if all(len(p) == PAYLOAD_LENGTH_BYTES for p in payloads):
+        return _parse_hnnp_buffer(b"".join(payloads), window)
 
-    while True:
-        now = time.time()
+    results: List[Optional[BlePacketV2]] = [None] * len(payloads)
+    indexes = [i for i, p in enumerate(payloads) if len(p) == PAYLOAD_LENGTH_BYTES]
+    decoded = _parse_hnnp_buffer(b"".join(payloads[i] for i in indexes), window)
+    for i, packet in zip(indexes, decoded):
+        results[i] = packet
+    return results
 
-        # Clean up old entries to keep the cache bounded.
-        duplicate_window = float(
-            os.environ.get("DUPLICATE_SUPPRESS_SECONDS", DEFAULT_DUPLICATE_WINDOW_SECONDS)
-        )
-        expired_before = now - duplicate_window
-        for key, last_seen in list(seen.items()):
-            if last_seen < expired_before:
-                del seen[key]
 
-        devices = await BleakScanner.discover()
+def _get_scan_queue_size() -> int:
+    raw = os.environ.get("HNNP_SCAN_QUEUE_SIZE", str(DEFAULT_SCAN_QUEUE_SIZE))
+    try:
+        value = int(raw)
+    except ValueError:
+        value = DEFAULT_SCAN_QUEUE_SIZE
+    return value if value > 0 else DEFAULT_SCAN_QUEUE_SIZE
+
+
+def _get_dedup_max_entries() -> int:
+    raw = os.environ.get("HNNP_DEDUP_MAX_ENTRIES", str(DEFAULT_DEDUP_MAX_ENTRIES))
+    try:
+        value = int(raw)
+    except ValueError:
+        value = DEFAULT_DEDUP_MAX_ENTRIES
+    return value if value > 0 else DEFAULT_DEDUP_MAX_ENTRIES
+
+
+def get_scan_stats() -> Dict[str, Any]:
+    """
+    Return a snapshot of scanner counters for health/status reporting.
+
+    - adverts_delivered: advertisement callbacks that reached Python at all.
+    - devices_polled: devices returned by discover() windows in poll mode. A
+      device stands for any number of advertisements, so it is not counted in
+      adverts_delivered.
+    - adverts_non_hnnp: delivered advertisements (polled devices in poll mode)
+      without HNNP service data, i.e. traffic that leaked through the BlueZ
+      discovery filter.
+    - adverts_received: HNNP advertisements handed to the parser by the packet source.
+    - payloads_parsed: adverts_received that passed structural validation.
+    - parse_drops: rejected payloads by rule (length, version, time_slot, zero_token).
+    - queue_overflows: advertisements dropped because the scan queue was full.
+    - queue_depth: advertisements waiting to be parsed at the last batch drain.
+    - max_queue_delay_ms: worst observed delay between callback and yield.
+    - hci_frames_malformed: raw HCI frames (hci source) skipped because they
+      could not be decoded.
+    - dedup: duplicate-suppression cache counters (hits/misses/evictions/...).
+    - hci_events_rx: HCI events the scanned adapters delivered to the host since
+      their scans started (Linux only, otherwise null).
+    - filtered_before_python: hci_events_rx - adverts_delivered, i.e. events the
+      stack consumed without waking the receiver. This is an estimate: evt_rx also
+      counts non-advertising events such as command completions. Null while a
+      poll mode scan is running, as it does not count advertisements.
+    """
+    stats: Dict[str, Any] = dict(_SCAN_STATS)
+    stats["parse_drops"] = dict(_PARSE_DROPS)
+    stats["payloads_parsed"] = int(_SCAN_STATS["adverts_received"]) - sum(_PARSE_DROPS.values())
+    stats["dedup"] = _DEDUP_CACHE.stats() if _DEDUP_CACHE is not None else None
+
+    stats["hci_events_rx"] = None
+    stats["filtered_before_python"] = None
+    if _HCI_BASELINES:
+        events_rx = 0
+        delivered_at_start = None
+        counts_adverts = True
+        for baseline in _HCI_BASELINES.values():
+            current = read_hci_dev_stats(baseline["dev_id"])
+            if current is None:
+                continue
+            events_rx += current["evt_rx"] - baseline["evt_rx"]
+            counts_adverts = counts_adverts and bool(baseline["counts_adverts"])
+            if delivered_at_start is None or baseline["adverts_delivered"] < delivered_at_start:
+                delivered_at_start = baseline["adverts_delivered"]
+        if delivered_at_start is not None:
+            delivered = int(_SCAN_STATS["adverts_delivered"]) - delivered_at_start
+            stats["hci_events_rx"] = events_rx
+            if counts_adverts:
+                stats["filtered_before_python"] = max(events_rx - delivered, 0)
+    return stats
+
+
+def _get_adapter() -> str:
+    return os.environ.get("HNNP_BLE_ADAPTER", "hci0").strip() or "hci0"
+
+
+def _bluez_discovery_filter() -> Dict[str, Any]:
+    """
+    BlueZ SetDiscoveryFilter arguments that keep non-HNNP traffic out of Python.
+
+    - UUIDs: only devices advertising the HNNP service UUID are reported.
+    - DuplicateData: when false (default), BlueZ suppresses repeated identical
+      advertisements; set HNNP_BLUEZ_DUPLICATE_DATA=1 to receive every rebroadcast.
+    """
+    duplicate_data = os.environ.get("HNNP_BLUEZ_DUPLICATE_DATA", "0").strip().lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    return {
+        "UUIDs": [HNNP_SERVICE_UUID],
+        "DuplicateData": duplicate_data,
+        "Transport": "le",
+    }
+
+
+def _record_hci_baseline(adapter: str, counts_adverts: bool = True) -> None:
+    try:
+        dev_id = adapter_index(adapter)
+    except ValueError:
+        return
+    current = read_hci_dev_stats(dev_id)
+    if current is None:
+        return
+    _HCI_BASELINES[adapter] = {
+        "dev_id": dev_id,
+        "evt_rx": current["evt_rx"],
+        "adverts_delivered": int(_SCAN_STATS["adverts_delivered"]),
+        "counts_adverts": int(counts_adverts),
+    }
+
+
+async def _continuous_hnnp_batches(adapter: str) -> AsyncIterator[List[RawAdvertisement]]:
+    """
+    Run a single long-lived BLE scan and yield HNNP advertisements in batches.
+
+    Each batch is everything waiting in the queue when the consumer wakes up, so
+    the batch decoder reads the clock and configuration once per tick.
+
+    bleak invokes the detection callback on the event loop for every advertisement,
+    so the callback only does a dict lookup and a put_nowait() into a bounded queue.
+    Parsing and duplicate suppression happen in the consumer.
+
+    Latency bound: at most HNNP_SCAN_QUEUE_SIZE advertisements can be waiting ahead
+    of a new one, so the delay from callback to yield is bounded by
+    queue_size x (time the consumer spends per advertisement) plus one event loop
+    iteration. When the consumer falls behind, new advertisements are dropped and
+    counted in queue_overflows instead of growing that delay.
+    """
+    queue: "asyncio.Queue[RawAdvertisement]" = asyncio.Queue(maxsize=_get_scan_queue_size())
+
+    def _on_detection(_device: Any, advertisement_data: Any) -> None:
+        _SCAN_STATS["adverts_delivered"] += 1
+        payload = (advertisement_data.service_data or {}).get(HNNP_SERVICE_UUID)
+        if payload is None:
+            _SCAN_STATS["adverts_non_hnnp"] += 1
+            return
+        try:
+            queue.put_nowait(
+                RawAdvertisement(payload, getattr(advertisement_data, "rssi", None), time.monotonic())
+            )
+        except asyncio.QueueFull:
+            _SCAN_STATS["queue_overflows"] += 1
+
+    scanner = BleakScanner(
+        detection_callback=_on_detection,
+        service_uuids=[HNNP_SERVICE_UUID],
+        adapter=adapter,
+        bluez={"filters": _bluez_discovery_filter()},
+    )
+    _record_hci_baseline(adapter)
+    await scanner.start()
+    try:
+        while True:
+            # The head of the queue is the oldest entry, so it carries the batch's worst delay.
+            advert = await queue.get()
+            delay_ms = (time.monotonic() - advert.received_at) * 1000.0
+            if delay_ms > _SCAN_STATS["max_queue_delay_ms"]:
+                _SCAN_STATS["max_queue_delay_ms"] = delay_ms
+
+            _SCAN_STATS["queue_depth"] = queue.qsize()
+            batch = [advert]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            yield batch
+    finally:
+        await scanner.stop()
+
+
+async def _polled_hnnp_batches(adapter: str) -> AsyncIterator[List[RawAdvertisement]]:
+    """
+    Legacy scan mode: repeated BleakScanner.discover() windows with a 1s pause.
+
+    Yields one batch of HNNP payloads per discover() window.
+
+    Kept for adapters/platforms where a long-lived scanner misbehaves.
+
+    discover() returns one entry per device, however many advertisements it
+    sent during the window, so devices are counted in devices_polled and not in
+    adverts_delivered.
+    """
+    _record_hci_baseline(adapter, counts_adverts=False)
+    while True:
+        devices = await BleakScanner.discover(
+            service_uuids=[HNNP_SERVICE_UUID],
+            adapter=adapter,
+            bluez={"filters": _bluez_discovery_filter()},
+        )
+        _SCAN_STATS["devices_polled"] += len(devices)
+        received_at = time.monotonic()
+        batch: List[RawAdvertisement] = []
         for d in devices:
             # manufacturer_data and service_data layouts are library dependent.
             # Here we check service_data for the HNNP service UUID.
             service_data = getattr(d, "metadata", {}).get("service_data") or {}
 
-            payload = None
-            if HNNP_SERVICE_UUID in service_data:
-                payload = service_data[HNNP_SERVICE_UUID]
-
+            payload = service_data.get(HNNP_SERVICE_UUID)
             if payload is None:
+                _SCAN_STATS["adverts_non_hnnp"] += 1
                 continue
 
-            packet = _parse_hnnp_payload(payload)
-            if packet is None:
-                continue
+            batch.append(RawAdvertisement(payload, getattr(d, "rssi", None), received_at))
+
+        if batch:
+            yield batch
+
+        await asyncio.sleep(1.0)
 
-            key = (packet.token_prefix, packet.time_slot)
-            last_seen = seen.get(key)
 
-            if last_seen is not None and now - last_seen <= duplicate_window:
-                # Duplicate within the suppression window; drop to reduce spam.
+class PacketSource:
+    """
+    Base class for advertisement sources feeding scan_hnnp_sightings().
+
+    A source yields batches of RawAdvertisement (HNNP service-data payloads with
+    RSSI and a monotonic receive time). Everything downstream of the source
+    (parsing, RSSI gate, dedup/aggregation, signing, sending) is source-agnostic.
+    """
+
+    name = "base"
+
+    def batches(self) -> AsyncIterator[List[RawAdvertisement]]:
+        raise NotImplementedError
+
+
+class BleakPacketSource(PacketSource):
+    """
+    Live BLE scanning through bleak.
+
+    mode is "continuous" (one long-lived scanner feeding a bounded queue) or "poll"
+    (legacy discover() + sleep loop). adapter defaults to HNNP_BLE_ADAPTER.
+    """
+
+    name = "bleak"
+
+    def __init__(self, mode: str = "continuous", adapter: Optional[str] = None) -> None:
+        self.mode = mode
+        self.adapter = adapter or _get_adapter()
+
+    def batches(self) -> AsyncIterator[List[RawAdvertisement]]:
+        if BleakScanner is None:
+            raise RuntimeError("bleak is not installed; BLE scanning is unavailable")
+        if self.mode == "poll":
+            return _polled_hnnp_batches(self.adapter)
+        return _continuous_hnnp_batches(self.adapter)
+
+
+class HciSocketPacketSource(PacketSource):
+    """
+    Linux-only scanning straight from a raw HCI socket, bypassing bleak and D-Bus.
+
+    Enables LE scanning on the adapter, lets the kernel filter the socket down to
+    LE meta events, and decodes advertising reports with hci.py into the same
+    service-data payloads bleak would deliver. Needs CAP_NET_RAW; bluetoothd should
+    not be running its own discovery on the same adapter at the same time.
+    """
+
+    name = "hci"
+    # Largest HCI event: 2-byte header + 255 bytes of parameters, plus the H4 type byte.
+    _FRAME_BYTES = 258
+
+    def __init__(self, adapter: str = "hci0", active: bool = False) -> None:
+        self.adapter = adapter
+        self.active = active
+
+    def _decode_frame(self, frame: bytes, received_at: float, batch: List[RawAdvertisement]) -> None:
+        if not frame or frame[0] != HCI_EVENT_PKT:
+            return
+        try:
+            reports = decode_le_advertising_reports(frame[1:])
+        except (IndexError, ValueError, struct.error):
+            # One corrupt frame from the controller must not end the scan.
+            _SCAN_STATS["hci_frames_malformed"] += 1
+            return
+        for _address, rssi, ad_data in reports:
+            _SCAN_STATS["adverts_delivered"] += 1
+            payload = extract_hnnp_service_data(ad_data)
+            if payload is None:
+                _SCAN_STATS["adverts_non_hnnp"] += 1
                 continue
+            batch.append(RawAdvertisement(payload, rssi, received_at))
+
+    async def batches(self) -> AsyncIterator[List[RawAdvertisement]]:
+        loop = asyncio.get_running_loop()
+        sock = open_hci_socket(adapter_index(self.adapter))
+        try:
+            sock.send(le_set_scan_enable(False))
+            sock.send(le_set_scan_parameters(active=self.active))
+            sock.send(le_set_scan_enable(True, filter_duplicates=False))
+
+            while True:
+                frame = await loop.sock_recv(sock, self._FRAME_BYTES)
+                received_at = time.monotonic()
+                batch: List[RawAdvertisement] = []
+                self._decode_frame(frame, received_at, batch)
+
+                # Drain whatever else is already buffered so one tick decodes many reports.
+                while True:
+                    try:
+                        frame = sock.recv(self._FRAME_BYTES)
+                    except BlockingIOError:
+                        break
+                    self._decode_frame(frame, received_at, batch)
+
+                if batch:
+                    yield batch
+        finally:
+            try:
+                sock.send(le_set_scan_enable(False))
+            except OSError:
+                pass
+            sock.close()
+
+
+async def scan_hnnp_sighting_batches(
+    source: Optional[PacketSource] = None,
+) -> AsyncIterator[List[Sighting]]:
+    """
+    Scan loop yielding the structurally valid HNNP sightings of each source batch.
 
-            seen[key] = now
-            yield packet
+    - Filters for HNNP service UUID (pushed down into the BlueZ discovery filter).
+    - Filters by payload length = 30 bytes.
+    - Performs local structural validation and version check.
+    - Decodes candidate packets into BlePacketV2, keeping the advertisement RSSI.
 
-        await asyncio.sleep(1.0)
+    No duplicate suppression is applied; rebroadcasts of the same token are all
+    yielded. Batches with no valid sighting are skipped.
+
+    Each batch is a unit of work for the "scan" heartbeat (see liveness.Heartbeat),
+    from its arrival until the consumer asks for the next one.
+
+    source defaults to live bleak scanning, in the mode selected with HNNP_SCAN_MODE:
+      - "continuous" (default): one long-lived scanner feeding a bounded queue.
+      - "poll": legacy discover() + sleep loop.
+    See packet_sources.load_packet_source() for capture replay and synthetic sources.
+    """
+    if source is None:
+        source = BleakPacketSource(os.environ.get("HNNP_SCAN_MODE", "continuous").strip().lower())
+
+    beat = heartbeat(LOOP_SCAN)
+    async for batch in source.batches():
+        beat.start()
+        _SCAN_STATS["adverts_received"] += len(batch)
+        now = time.time()
+        window = _current_slot_window()
+        packets = _parse_hnnp_payloads([advert.payload for advert in batch], window)
+        parsed_at = time.monotonic()
+        sightings: List[Sighting] = []
+        for advert, packet in zip(batch, packets):
+            if packet is not None:
+                sightings.append(Sighting(packet, advert.rssi, now, advert.received_at, parsed_at))
+            else:
+                _PARSE_DROPS[_drop_reason(advert.payload, window)] += 1
+        if sightings:
+            yield sightings
+        beat.done()
+
+
+async def iter_sightings(batches: AsyncIterator[List[Sighting]]) -> AsyncIterator[Sighting]:
+    """
+    Flatten a stream of sighting batches into single sightings.
+    """
+    async with aclosing(batches):
+        async for batch in batches:
+            for sighting in batch:
+                yield sighting
+
+
+async def scan_hnnp_sightings(source: Optional[PacketSource] = None) -> AsyncIterator[Sighting]:
+    """
+    Scan loop yielding every structurally valid HNNP sighting, one at a time
+    (see scan_hnnp_sighting_batches()). Use scan_hnnp_packets() for de-duplicated
+    packets.
+    """
+    async with aclosing(iter_sightings(scan_hnnp_sighting_batches(source))) as sightings:
+        async for sighting in sightings:
+            yield sighting
+
+
+def _new_dedup_cache() -> DedupCache:
+    # Duplicate suppression keyed by (token_prefix, time_slot), see dedup_cache.DedupCache.
+    global _DEDUP_CACHE
+    _DEDUP_CACHE = DedupCache(
+        window_seconds=float(
+            os.environ.get("DUPLICATE_SUPPRESS_SECONDS", DEFAULT_DUPLICATE_WINDOW_SECONDS)
+        ),
+        max_entries=_get_dedup_max_entries(),
+    )
+    return _DEDUP_CACHE
+
+
+async def dedup_sightings(sightings: AsyncIterator[Sighting]) -> AsyncIterator[Sighting]:
+    """
+    Drop repeats of the same (token_prefix, time_slot) within
+    DUPLICATE_SUPPRESS_SECONDS from a sighting stream.
+    """
+    dedup = _new_dedup_cache()
+    async for sighting in sightings:
+        packet = sighting.packet
+        if dedup.check_and_add(dedup_key(packet.token_prefix, packet.time_slot), sighting.seen_at):
+            # Duplicate within the suppression window; drop to reduce spam.
+            continue
+
+        yield sighting
+
+
+async def dedup_sighting_batches(
+    batches: AsyncIterator[List[Sighting]],
+) -> AsyncIterator[List[Sighting]]:
+    """
+    Batch variant of dedup_sightings(); batches left empty are skipped.
+    """
+    dedup = _new_dedup_cache()
+    async for batch in batches:
+        fresh = [
+            sighting
+            for sighting in batch
+            if not dedup.check_and_add(
+                dedup_key(sighting.packet.token_prefix, sighting.packet.time_slot), sighting.seen_at
+            )
+        ]
+        if fresh:
+            yield fresh
+
+
+async def scan_hnnp_packets(
+    sightings: Optional[AsyncIterator[Sighting]] = None,
+) -> AsyncIterator[BlePacketV2]:
+    """
+    De-duplicated BLE scan loop for HNNP packets.
+
+    Wraps scan_hnnp_sightings() (or the given sightings stream, e.g. one that has
+    already been through the RSSI gate) and drops repeats of the same
+    (token_prefix, time_slot) within DUPLICATE_SUPPRESS_SECONDS.
+
+    Yields BlePacketV2 instances for further processing (e.g., presence reports).
+    """
+    if sightings is None:
+        sightings = scan_hnnp_sightings()
 
+    async for sighting in dedup_sightings(sightings):
+        yield sighting.packet
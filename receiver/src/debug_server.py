@@ -0,0 +1,213 @@
+import asyncio
+import hmac
+import logging
+import math
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+from .profiling import (
+    DEFAULT_PROFILE_INTERVAL,
+    DEFAULT_TRACEMALLOC_FRAMES,
+    AllocationTracer,
+    Artifact,
+    ArtifactStore,
+    DebugToolError,
+    SamplingProfiler,
+    dump_task_stacks,
+)
+
+
+logger = logging.getLogger("hnnp.receiver.debug")
+
+DEFAULT_PROFILE_SECONDS = 30.0
+MAX_PROFILE_SECONDS = 300.0
+DEFAULT_TRACEMALLOC_SECONDS = 600.0
+MAX_TRACEMALLOC_SECONDS = 3600.0
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+class _BadQuery(Exception):
+    """A query parameter that must not be clamped into range; answered with 400."""
+
+
+def _query_float(request: web.Request, name: str, default: float, minimum: float, maximum: float) -> float:
+    try:
+        value = float(request.query.get(name, default))
+    except ValueError:
+        value = default
+    # min()/max() pass NaN straight through, and inf would become the maximum.
+    if not math.isfinite(value):
+        raise _BadQuery(f"{name} must be a finite number")
+    return min(max(value, minimum), maximum)
+
+
+class DebugEndpoints:
+    """
+    Token-protected /debug/* routes for field diagnostics.
+
+    A CPU profile and a tracemalloc session can each run once at a time and stop
+    by themselves after their time box; every result is kept as a downloadable
+    artifact (see profiling.ArtifactStore).
+    """
+
+    def __init__(self, token: str, store: Optional[ArtifactStore] = None) -> None:
+        self._token = token.encode()
+        self.store = store or ArtifactStore()
+        self.profiler: Optional[SamplingProfiler] = None
+        self.allocations: Optional[AllocationTracer] = None
+        self._profile_timer: Optional[asyncio.TimerHandle] = None
+        self._tracemalloc_timer: Optional[asyncio.TimerHandle] = None
+
+    def add_routes(self, app: web.Application) -> None:
+        routes = [
+            ("POST", "/debug/profile/start", self.profile_start),
+            ("POST", "/debug/profile/stop", self.profile_stop),
+            ("POST", "/debug/tracemalloc/start", self.tracemalloc_start),
+            ("POST", "/debug/tracemalloc/snapshot", self.tracemalloc_snapshot),
+            ("POST", "/debug/tracemalloc/stop", self.tracemalloc_stop),
+            ("GET", "/debug/tasks", self.tasks),
+            ("GET", "/debug/artifacts", self.artifacts),
+            ("GET", "/debug/artifacts/{name}", self.artifact),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, path, self._authorized(handler))
+
+    def _authorized(self, handler: Handler) -> Handler:
+        async def wrapper(request: web.Request) -> web.StreamResponse:
+            header = request.headers.get("Authorization", "")
+            scheme, _, supplied = header.partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.strip().encode(), self._token):
+                logger.warning("Rejected unauthenticated debug request %s %s", request.method, request.path)
+                return web.json_response({"error": "unauthorized"}, status=401)
+            try:
+                return await handler(request)
+            except _BadQuery as exc:
+                return web.json_response({"error": str(exc)}, status=400)
+
+        return wrapper
+
+    async def profile_start(self, request: web.Request) -> web.Response:
+        if self.profiler is not None and self.profiler.running:
+            return web.json_response({"error": "profile already running"}, status=409)
+        seconds = _query_float(request, "seconds", DEFAULT_PROFILE_SECONDS, 1.0, MAX_PROFILE_SECONDS)
+        interval_ms = _query_float(request, "interval_ms", DEFAULT_PROFILE_INTERVAL * 1000.0, 1.0, 100.0)
+        try:
+            profiler = SamplingProfiler(interval_ms / 1000.0)
+            profiler.start()
+        except (DebugToolError, ValueError) as exc:
+            return web.json_response({"error": str(exc)}, status=501)
+        self.profiler = profiler
+        self._profile_timer = asyncio.get_running_loop().call_later(seconds, self._finish_profile)
+        logger.info("CPU profile started (%.0f s, %.1f ms interval)", seconds, interval_ms)
+        return web.json_response({"status": "started", "seconds": seconds, "interval_ms": interval_ms}, status=202)
+
+    async def profile_stop(self, _request: web.Request) -> web.Response:
+        if self.profiler is None or not self.profiler.running:
+            return web.json_response({"error": "no profile running"}, status=409)
+        return web.json_response(self._finish_profile())
+
+    def _finish_profile(self) -> Dict[str, Any]:
+        if self._profile_timer is not None:
+            self._profile_timer.cancel()
+            self._profile_timer = None
+        profiler = self.profiler
+        assert profiler is not None
+        profiler.stop()
+        artifact = self.store.add("cpu-profile", "collapsed", profiler.collapsed())
+        summary = profiler.summary()
+        logger.info("CPU profile finished: %s samples -> %s", summary["samples"], artifact.name)
+        return {"artifact": artifact.describe(), **summary}
+
+    async def tracemalloc_start(self, request: web.Request) -> web.Response:
+        if self.allocations is not None and self.allocations.running:
+            return web.json_response({"error": "tracemalloc already running"}, status=409)
+        seconds = _query_float(
+            request, "seconds", DEFAULT_TRACEMALLOC_SECONDS, 10.0, MAX_TRACEMALLOC_SECONDS
+        )
+        frames = int(_query_float(request, "frames", DEFAULT_TRACEMALLOC_FRAMES, 1, 100))
+        allocations = AllocationTracer(frames)
+        try:
+            allocations.start()
+        except DebugToolError as exc:
+            return web.json_response({"error": str(exc)}, status=409)
+        self.allocations = allocations
+        self._tracemalloc_timer = asyncio.get_running_loop().call_later(seconds, self._finish_tracemalloc)
+        logger.info("tracemalloc started (%.0f s, %s frames)", seconds, frames)
+        return web.json_response({"status": "started", "seconds": seconds, "frames": frames}, status=202)
+
+    async def tracemalloc_snapshot(self, request: web.Request) -> web.Response:
+        if self.allocations is None or not self.allocations.running:
+            return web.json_response({"error": "tracemalloc not running"}, status=409)
+        artifact = self._store_diff(self.allocations, request)
+        return web.json_response({"artifact": artifact.describe()})
+
+    async def tracemalloc_stop(self, request: web.Request) -> web.Response:
+        if self.allocations is None or not self.allocations.running:
+            return web.json_response({"error": "tracemalloc not running"}, status=409)
+        return web.json_response(self._finish_tracemalloc(request))
+
+    def _finish_tracemalloc(self, request: Optional[web.Request] = None) -> Dict[str, Any]:
+        if self._tracemalloc_timer is not None:
+            self._tracemalloc_timer.cancel()
+            self._tracemalloc_timer = None
+        allocations = self.allocations
+        assert allocations is not None
+        try:
+            artifact = self._store_diff(allocations, request)
+        finally:
+            allocations.stop()
+        logger.info("tracemalloc stopped -> %s", artifact.name)
+        return {"status": "stopped", "artifact": artifact.describe()}
+
+    def _store_diff(self, allocations: AllocationTracer, request: Optional[web.Request]) -> Artifact:
+        limit = 50
+        key_type = "lineno"
+        if request is not None:
+            limit = int(_query_float(request, "limit", limit, 1, 1000))
+            if request.query.get("group") == "traceback":
+                key_type = "traceback"
+        return self.store.add("tracemalloc", "txt", allocations.diff(limit, key_type))
+
+    async def tasks(self, _request: web.Request) -> web.Response:
+        artifact = self.store.add("tasks", "txt", dump_task_stacks())
+        return self._download(artifact)
+
+    async def artifacts(self, _request: web.Request) -> web.Response:
+        return web.json_response({"artifacts": self.store.list()})
+
+    async def artifact(self, request: web.Request) -> web.Response:
+        artifact = self.store.get(request.match_info["name"])
+        if artifact is None:
+            return web.json_response({"error": "not found"}, status=404)
+        return self._download(artifact)
+
+    @staticmethod
+    def _download(artifact: Artifact) -> web.Response:
+        return web.Response(
+            body=artifact.data,
+            headers={
+                "Content-Type": f"{artifact.content_type}; charset=utf-8",
+                "Content-Disposition": f'attachment; filename="{artifact.name}"',
+            },
+        )
+
+
+def add_debug_routes(app: web.Application) -> Optional[DebugEndpoints]:
+    """
+    Register /debug/* on app if HNNP_DEBUG_TOKEN is set; otherwise do nothing.
+
+    Without a token the routes do not exist (404) and no profiler or tracemalloc
+    hook is ever installed.
+    """
+    token = os.environ.get("HNNP_DEBUG_TOKEN", "").strip()
+    if not token:
+        return None
+    if len(token) < 16:
+        logger.warning("HNNP_DEBUG_TOKEN is shorter than 16 characters; use a long random token")
+    endpoints = DebugEndpoints(token)
+    endpoints.add_routes(app)
+    logger.info("Debug endpoints enabled under /debug/")
+    return endpoints
@@ -0,0 +1,115 @@
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+
+# time_slot(4, big-endian) || token_prefix(16)
+DEDUP_KEY_BYTES = 20
+DEFAULT_DEDUP_MAX_ENTRIES = 100_000
+
+
+def dedup_key(token_prefix: bytes, time_slot: int) -> bytes:
+    """
+    Build the fixed-width 20-byte duplicate-suppression key for a packet.
+
+    The key is a fresh bytes object, so it does not keep a batch decoder buffer alive.
+    """
+    return time_slot.to_bytes(4, byteorder="big", signed=False) + token_prefix
+
+
+class DedupCache:
+    """
+    Duplicate-suppression cache for (token_prefix, time_slot), bucketed by time.
+
+    Entries are stored in per-bucket dicts (key -> accepted_at). A key is a duplicate
+    if it was accepted at most window_seconds ago; duplicates do not refresh the
+    timestamp, matching the original DUPLICATE_SUPPRESS_SECONDS behaviour.
+
+    Buckets are bucket_seconds wide (at least window_seconds), so a lookup touches at
+    most the current and previous bucket, and expiry drops whole buckets at once
+    instead of scanning every entry. max_entries is a hard cap: when it is reached
+    the oldest bucket (or, if only one is left, its oldest entry) is evicted.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        max_entries: int = DEFAULT_DEDUP_MAX_ENTRIES,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.bucket_seconds = max(float(window_seconds), 1.0)
+        self.max_entries = max_entries
+
+        # Oldest bucket first; each item is (bucket_id, {key: accepted_at}).
+        self._buckets: Deque[Tuple[int, Dict[bytes, float]]] = deque()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def check_and_add(self, key: bytes, now: float) -> bool:
+        """
+        Return True if key is a duplicate within the window; otherwise record it and return False.
+        """
+        self._expire(now)
+
+        for _bucket_id, entries in reversed(self._buckets):
+            accepted_at = entries.get(key)
+            if accepted_at is not None:
+                if now - accepted_at <= self.window_seconds:
+                    self.hits += 1
+                    return True
+                # Newest entry for this key is outside the window; older buckets can only be older.
+                break
+
+        self.misses += 1
+        self._insert(key, now)
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": self._size,
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _expire(self, now: float) -> None:
+        oldest_live_bucket = int((now - self.window_seconds) // self.bucket_seconds)
+        buckets = self._buckets
+        while buckets and buckets[0][0] < oldest_live_bucket:
+            _bucket_id, entries = buckets.popleft()
+            self._size -= len(entries)
+            self.expirations += len(entries)
+
+    def _insert(self, key: bytes, now: float) -> None:
+        if self._size >= self.max_entries:
+            self._evict()
+
+        bucket_id = int(now // self.bucket_seconds)
+        buckets = self._buckets
+        if not buckets or buckets[-1][0] < bucket_id:
+            buckets.append((bucket_id, {}))
+        entries = buckets[-1][1]
+        if key not in entries:
+            self._size += 1
+        entries[key] = now
+
+    def _evict(self) -> None:
+        buckets = self._buckets
+        if len(buckets) > 1:
+            _bucket_id, entries = buckets.popleft()
+            self._size -= len(entries)
+            self.evictions += len(entries)
+            return
+        if buckets:
+            entries = buckets[0][1]
+            del entries[next(iter(entries))]
+            self._size -= 1
+            self.evictions += 1
@@ -0,0 +1,307 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN_SECONDS = 30.0
+MAX_COOLDOWN_SECONDS = 60.0
+# Cooldowns are spread by +/- this fraction so a fleet does not probe in lockstep.
+COOLDOWN_JITTER = 0.2
+
+RETRY_BASE_SECONDS = 1.0
+RETRY_CAP_SECONDS = 60.0
+
+# Priority lanes for Cloud requests: fresh reports vs the retry backlog.
+LANE_LIVE = "live"
+LANE_RETRY = "retry"
+DEFAULT_LIVE_RESERVED = 2
+
+
+def decorrelated_jitter(
+    previous: float,
+    base: float = RETRY_BASE_SECONDS,
+    cap: float = RETRY_CAP_SECONDS,
+    rng: Optional[random.Random] = None,
+) -> float:
+    """
+    Next retry delay: min(cap, uniform(base, previous * 3)) ("decorrelated jitter").
+
+    previous is the last delay returned (or 0 for the first retry). Delays grow
+    roughly exponentially like 2 ** attempts, but each receiver draws its own,
+    so retries after a shared outage spread out instead of arriving in waves.
+    """
+    upper = max(previous * 3.0, base)
+    return min(cap, (rng or random).uniform(base, upper))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around Cloud uploads.
+
+    - closed: requests flow; failure_threshold consecutive failures (network
+      errors, timeouts, 5xx) open the breaker.
+    - open: no requests for a jittered cooldown; callers defer their reports
+      until retry_at.
+    - half_open: after the cooldown, one probe request is let through. Success
+      closes the breaker; failure re-opens it with the cooldown doubled (up to
+      MAX_COOLDOWN_SECONDS).
+
+    Only the probe moves the breaker out of half_open: callers pass probe=True
+    for the request whose allow() claimed it (state is half_open right after
+    allow() returned True). Outcomes of requests that started before the breaker
+    opened and finish late are ignored while open or half_open, apart from a
+    success resetting the failure count. A probe that is never sent (cancelled
+    while waiting for send budget) must be handed back with abandon().
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS,
+        rng: Optional[random.Random] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(failure_threshold, 1)
+        self._clock = clock
+        self.cooldown_seconds = cooldown_seconds
+        self._rng = rng or random.Random()
+        self.state = BREAKER_CLOSED
+        self._failures = 0
+        self._cooldown = cooldown_seconds
+        self._open_until = 0.0
+        self._probe_in_flight = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def retry_at(self) -> float:
+        """
+        Unix time at which the breaker will next let a request through.
+        """
+        if self.state != BREAKER_OPEN:
+            return time.time()
+        return time.time() + max(self._open_until - self._clock(), 0.0)
+
+    def defer_seconds(self) -> float:
+        """
+        Delay for a request rejected while open: until the breaker reopens, plus a
+        random share of the cooldown, so the backlog drains over a cooldown's
+        worth of time after recovery instead of all at the probe.
+        """
+        if self.state != BREAKER_OPEN:
+            return 0.0
+        reopens_in = max(self._open_until - self._clock(), 0.0)
+        return reopens_in + self._rng.uniform(0.0, self._cooldown)
+
+    def allow(self) -> bool:
+        """
+        Return True if a request may be sent now (claims the probe when half-open).
+        """
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN:
+            if self._clock() < self._open_until:
+                self.rejected += 1
+                return False
+            self.state = BREAKER_HALF_OPEN
+        if self._probe_in_flight:
+            self.rejected += 1
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self, probe: bool = False) -> None:
+        self._failures = 0
+        if probe and self.state == BREAKER_HALF_OPEN:
+            self._probe_in_flight = False
+            self.state = BREAKER_CLOSED
+            self._cooldown = self.cooldown_seconds
+
+    def record_failure(self, probe: bool = False) -> None:
+        if self.state == BREAKER_CLOSED:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open(self.cooldown_seconds)
+        elif probe and self.state == BREAKER_HALF_OPEN:
+            self._failures += 1
+            self._probe_in_flight = False
+            self._open(min(self._cooldown * 2.0, MAX_COOLDOWN_SECONDS))
+
+    def abandon(self, probe: bool = False) -> None:
+        """
+        Release the probe claimed by a request that was never sent.
+        """
+        if probe and self.state == BREAKER_HALF_OPEN:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "reopens_in_s": (
+                round(max(self._open_until - self._clock(), 0.0), 3)
+                if self.state == BREAKER_OPEN
+                else None
+            ),
+        }
+
+    def _open(self, cooldown: float) -> None:
+        self._cooldown = cooldown
+        jitter = 1.0 + self._rng.uniform(-COOLDOWN_JITTER, COOLDOWN_JITTER)
+        self._open_until = self._clock() + cooldown * jitter
+        self.state = BREAKER_OPEN
+        self.opened += 1
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending while the circuit breaker is open.
+    """
+
+    def __init__(self, retry_at: float) -> None:
+        super().__init__("circuit breaker open")
+        self.retry_at = retry_at
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on concurrent Cloud requests, between 1 and max_limit.
+
+    Each completed request adjusts the limit:
+      - success at normal latency: +1/limit (about +1 per limit's worth of requests);
+      - failure (5xx, network error, timeout) or latency above
+        latency_tolerance x the recent minimum latency: limit x backoff_ratio,
+        at most once per recent-minimum-latency interval.
+
+    Requests are acquired in one of two lanes. LANE_LIVE may use the whole limit
+    and is woken first; LANE_RETRY only gets slots while no live request is
+    waiting and at most limit - reserved_live are in flight (never fewer than
+    one), so the retry backlog cannot crowd out fresh reports.
+
+    acquire()/release() wrap each request; waiters are woken as the limit allows.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial_limit: Optional[int] = None,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.7,
+        min_latency_floor: float = 0.05,
+        window: int = 100,
+        reserved_live: int = 0,
+    ) -> None:
+        self.max_limit = max(max_limit, 1)
+        self.limit = float(min(initial_limit or self.max_limit, self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.min_latency_floor = min_latency_floor
+        self.reserved_live = max(reserved_live, 0)
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._in_flight = 0
+        self._lane_in_flight: Dict[str, int] = {LANE_LIVE: 0, LANE_RETRY: 0}
+        self._last_decrease = 0.0
+        self._waiters: Dict[str, Deque["asyncio.Future[None]"]] = {
+            LANE_LIVE: deque(),
+            LANE_RETRY: deque(),
+        }
+
+        self.decreases = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self, lane: str = LANE_LIVE) -> None:
+        waiters = self._waiters[lane]
+        while not self._has_room(lane):
+            waiter = asyncio.get_running_loop().create_future()
+            waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                else:
+                    # Woken but cancelled before taking the slot: pass the wakeup on.
+                    self._wake()
+                raise
+        self._in_flight += 1
+        self._lane_in_flight[lane] += 1
+
+    def release(self, latency: Optional[float], ok: bool, lane: str = LANE_LIVE) -> None:
+        """
+        Finish a request. latency is None when it did not complete (network error).
+        """
+        self._in_flight -= 1
+        self._lane_in_flight[lane] -= 1
+        self._update(latency, ok)
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "max_limit": self.max_limit,
+            "reserved_live": self.reserved_live,
+            "in_flight": self._in_flight,
+            "in_flight_live": self._lane_in_flight[LANE_LIVE],
+            "in_flight_retry": self._lane_in_flight[LANE_RETRY],
+            "waiting_live": len(self._waiters[LANE_LIVE]),
+            "waiting_retry": len(self._waiters[LANE_RETRY]),
+            "min_latency_ms": (
+                round(min(self._latencies) * 1000.0, 1) if self._latencies else None
+            ),
+            "decreases": self.decreases,
+        }
+
+    def _retry_limit(self) -> int:
+        return max(int(self.limit) - self.reserved_live, 1)
+
+    def _has_room(self, lane: str) -> bool:
+        if lane == LANE_LIVE:
+            return self._in_flight < int(self.limit)
+        return not self._waiters[LANE_LIVE] and self._in_flight < self._retry_limit()
+
+    def _wake(self) -> None:
+        woken = self._wake_lane(LANE_LIVE, int(self.limit) - self._in_flight)
+        if not self._waiters[LANE_LIVE]:
+            self._wake_lane(LANE_RETRY, self._retry_limit() - self._in_flight - woken)
+
+    def _wake_lane(self, lane: str, free: int) -> int:
+        waiters = self._waiters[lane]
+        woken = 0
+        while woken < free and waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                woken += 1
+        return woken
+
+    def _update(self, latency: Optional[float], ok: bool) -> None:
+        if latency is not None:
+            self._latencies.append(latency)
+        baseline = max(min(self._latencies), self.min_latency_floor) if self._latencies else None
+        congested = not ok or (
+            latency is not None
+            and baseline is not None
+            and latency > baseline * self.latency_tolerance
+        )
+        if not congested:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+            return
+        now = time.monotonic()
+        if now - self._last_decrease < (baseline or self.min_latency_floor):
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * self.backoff_ratio, 1.0)
+        self.decreases += 1
@@ -0,0 +1,234 @@
+import socket
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+
+# From <bluetooth/hci.h>: HCIGETDEVINFO = _IOR('H', 211, int)
+HCIGETDEVINFO = 0x800448D3
+BTPROTO_HCI = 1
+
+# struct hci_dev_info (native alignment), ending in struct hci_dev_stats.
+_HCI_DEV_INFO = struct.Struct("@H8s6sIB8sIIIHHHH10I")
+_HCI_DEV_STATS_FIELDS = (
+    "err_rx",
+    "err_tx",
+    "cmd_tx",
+    "evt_rx",
+    "acl_tx",
+    "acl_rx",
+    "sco_tx",
+    "sco_rx",
+    "byte_rx",
+    "byte_tx",
+)
+
+
+def adapter_index(adapter: str) -> int:
+    """
+    Map an adapter name like "hci1" to its HCI device index (1).
+    """
+    name = adapter.strip().lower()
+    if name.startswith("hci"):
+        name = name[3:]
+    return int(name)
+
+
+def read_hci_dev_stats(dev_id: int) -> Optional[Dict[str, int]]:
+    """
+    Read the kernel's per-adapter HCI counters (as shown by `hciconfig -a`).
+
+    Returns None where raw HCI sockets are unavailable (non-Linux, no Bluetooth
+    support in the Python build, or no such adapter).
+    """
+    af_bluetooth = getattr(socket, "AF_BLUETOOTH", None)
+    if af_bluetooth is None or fcntl is None:
+        return None
+
+    buf = bytearray(_HCI_DEV_INFO.size)
+    struct.pack_into("@H", buf, 0, dev_id)
+    try:
+        with socket.socket(af_bluetooth, socket.SOCK_RAW, BTPROTO_HCI) as sock:
+            fcntl.ioctl(sock.fileno(), HCIGETDEVINFO, buf)
+    except OSError:
+        return None
+
+    fields = _HCI_DEV_INFO.unpack(bytes(buf))
+    return dict(zip(_HCI_DEV_STATS_FIELDS, fields[-len(_HCI_DEV_STATS_FIELDS) :]))
+
+
+# HCI event codes / LE meta subevents (Bluetooth Core spec Vol 4, Part E, 7.7).
+HCI_EVENT_PKT = 0x04
+EVT_LE_META_EVENT = 0x3E
+EVT_LE_ADVERTISING_REPORT = 0x02
+EVT_LE_EXTENDED_ADVERTISING_REPORT = 0x0D
+
+# AD types (Assigned Numbers, "Common Data Types").
+AD_TYPE_SERVICE_DATA_16 = 0x16
+AD_TYPE_SERVICE_DATA_128 = 0x21
+
+# 0000f0e0-0000-1000-8000-00805f9b34fb as it appears on air (little-endian).
+HNNP_SERVICE_UUID16_LE = bytes.fromhex("e0f0")
+HNNP_SERVICE_UUID128_LE = bytes.fromhex("fb349b5f8000008000100000e0f00000")
+
+_EXT_REPORT_HEADER_BYTES = 24
+
+
+def iter_ad_structures(ad_data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (ad_type, value) for each AD structure in an advertising data block.
+
+    Stops at the first zero-length (padding) or truncated structure.
+    """
+    offset = 0
+    end = len(ad_data)
+    while offset < end:
+        length = ad_data[offset]
+        if length == 0 or offset + 1 + length > end:
+            return
+        yield ad_data[offset + 1], ad_data[offset + 2 : offset + 1 + length]
+        offset += 1 + length
+
+
+def extract_hnnp_service_data(ad_data: bytes) -> Optional[bytes]:
+    """
+    Return the HNNP service data (the candidate 30-byte payload) from advertising data.
+
+    This is the same value bleak exposes as service_data[HNNP_SERVICE_UUID].
+    """
+    for ad_type, value in iter_ad_structures(ad_data):
+        if ad_type == AD_TYPE_SERVICE_DATA_16 and value[:2] == HNNP_SERVICE_UUID16_LE:
+            return bytes(value[2:])
+        if ad_type == AD_TYPE_SERVICE_DATA_128 and value[:16] == HNNP_SERVICE_UUID128_LE:
+            return bytes(value[16:])
+    return None
+
+
+def decode_le_advertising_reports(event: bytes) -> List[Tuple[bytes, int, bytes]]:
+    """
+    Decode an HCI LE Advertising Report or LE Extended Advertising Report event.
+
+    event starts at the HCI event code (no H4 packet-type byte). Returns a list of
+    (address, rssi, ad_data) tuples; anything else, or a malformed event, yields [].
+    Reports are read sequentially per report, as the Linux kernel does; a report
+    that runs past the end of the event ends decoding, keeping the reports before it.
+    """
+    if len(event) < 4 or event[0] != EVT_LE_META_EVENT:
+        return []
+    params = event[2 : 2 + event[1]]
+    if len(params) < 2:
+        return []
+    subevent = params[0]
+    num_reports = params[1]
+    offset = 2
+    reports: List[Tuple[bytes, int, bytes]] = []
+
+    if subevent == EVT_LE_ADVERTISING_REPORT:
+        for _ in range(num_reports):
+            # event_type(1) addr_type(1) addr(6) data_len(1) data rssi(1)
+            if offset + 9 > len(params):
+                return reports
+            address = bytes(params[offset + 2 : offset + 8])
+            data_len = params[offset + 8]
+            data_end = offset + 9 + data_len
+            if data_end + 1 > len(params):
+                return reports
+            rssi = params[data_end] - 256 if params[data_end] > 127 else params[data_end]
+            reports.append((address, rssi, bytes(params[offset + 9 : data_end])))
+            offset = data_end + 1
+        return reports
+
+    if subevent == EVT_LE_EXTENDED_ADVERTISING_REPORT:
+        for _ in range(num_reports):
+            # event_type(2) addr_type(1) addr(6) primary_phy(1) secondary_phy(1) sid(1)
+            # tx_power(1) rssi(1) periodic_interval(2) direct_addr_type(1) direct_addr(6)
+            # data_len(1) data
+            if offset + _EXT_REPORT_HEADER_BYTES > len(params):
+                return reports
+            address = bytes(params[offset + 3 : offset + 9])
+            raw_rssi = params[offset + 13]
+            rssi = raw_rssi - 256 if raw_rssi > 127 else raw_rssi
+            data_len = params[offset + 23]
+            data_end = offset + _EXT_REPORT_HEADER_BYTES + data_len
+            if data_end > len(params):
+                return reports
+            reports.append(
+                (address, rssi, bytes(params[offset + _EXT_REPORT_HEADER_BYTES : data_end]))
+            )
+            offset = data_end
+        return reports
+
+    return []
+
+
+def hnnp_payloads_from_event(event: bytes) -> List[Tuple[bytes, int]]:
+    """
+    Return (payload, rssi) for every HNNP advertisement carried by one HCI event.
+    """
+    results: List[Tuple[bytes, int]] = []
+    for _address, rssi, ad_data in decode_le_advertising_reports(event):
+        payload = extract_hnnp_service_data(ad_data)
+        if payload is not None:
+            results.append((payload, rssi))
+    return results
+
+
+# Raw HCI socket access (Linux). Requires CAP_NET_RAW (or root).
+SOL_HCI = 0
+HCI_FILTER = 2
+HCI_COMMAND_PKT = 0x01
+OPCODE_LE_SET_SCAN_PARAMETERS = 0x200B
+OPCODE_LE_SET_SCAN_ENABLE = 0x200C
+# Scan interval/window in 0.625 ms units; equal values mean a 100% duty cycle.
+DEFAULT_SCAN_INTERVAL = 0x0010
+DEFAULT_SCAN_WINDOW = 0x0010
+
+
+def open_hci_socket(dev_id: int) -> socket.socket:
+    """
+    Open a non-blocking raw HCI socket on an adapter, filtered to LE meta events.
+    """
+    af_bluetooth = getattr(socket, "AF_BLUETOOTH", None)
+    if af_bluetooth is None:
+        raise RuntimeError("raw HCI sockets are unavailable (Linux with Bluetooth support only)")
+
+    sock = socket.socket(af_bluetooth, socket.SOCK_RAW, BTPROTO_HCI)
+    try:
+        sock.bind((dev_id,))
+        # struct hci_filter: type_mask, event_mask[2], opcode. Only pass HCI event
+        # packets with code 0x3E (LE meta) so the kernel drops everything else.
+        type_mask = 1 << HCI_EVENT_PKT
+        event_mask = 1 << EVT_LE_META_EVENT
+        sock.setsockopt(
+            SOL_HCI,
+            HCI_FILTER,
+            struct.pack("<IIIH", type_mask, event_mask & 0xFFFFFFFF, event_mask >> 32, 0),
+        )
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def hci_command(opcode: int, params: bytes = b"") -> bytes:
+    """
+    Encode an HCI command packet (H4 type byte, little-endian opcode, length, params).
+    """
+    return struct.pack("<BHB", HCI_COMMAND_PKT, opcode, len(params)) + params
+
+
+def le_set_scan_parameters(active: bool = False) -> bytes:
+    # scan_type, interval, window, own_address_type (public), filter_policy (accept all)
+    params = struct.pack("<BHHBB", 1 if active else 0, DEFAULT_SCAN_INTERVAL, DEFAULT_SCAN_WINDOW, 0, 0)
+    return hci_command(OPCODE_LE_SET_SCAN_PARAMETERS, params)
+
+
+def le_set_scan_enable(enable: bool, filter_duplicates: bool = False) -> bytes:
+    return hci_command(
+        OPCODE_LE_SET_SCAN_ENABLE, bytes([1 if enable else 0, 1 if filter_duplicates else 0])
+    )
@@ -1,50 +1,162 @@
 import os
+from typing import Any, Dict
 
 from aiohttp import web
 
-from sender import get_queue_size  # type: ignore
+from .aggregator import get_aggregation_stats
+from .ble_scanner import get_scan_stats
+from .debug_server import add_debug_routes
+from .liveness import LAG_MONITOR, check_health
+from .metrics import CONTENT_TYPE, render_metrics
+from .packet_sources import get_adapter_stats
+from .proximity import get_proximity_stats
+from .sender import (
+    get_connection_stats,
+    get_latency_histograms,
+    get_queue_size,
+    get_retry_stats,
+    get_send_stats,
+    get_shaping_stats,
+    get_stage_histograms,
+    get_trace_stats,
+    get_upload_control_stats,
+)
 
 try:
   # Optional import; if not available, last_scan_at will be None.
-  from sender import get_last_scan_at  # type: ignore
+  from .sender import get_last_scan_at
 except ImportError:  # pragma: no cover
   def get_last_scan_at() -> int | None:  # type: ignore[override]
     return None
 
 
-async def handle_health(_request: web.Request) -> web.Response:
+def collect_liveness(upload: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    Liveness/readiness verdict (see liveness.check_health) with a status string:
+    "ok" (ready), "not_ready" (live but not delivering) or "stalled" (not live).
+    """
+    if upload is None:
+        upload = get_upload_control_stats()
+    breaker = (upload or {}).get("breaker") or {}
+    result = check_health(
+        sender_ready=upload is not None, breaker_open=breaker.get("state") == "open"
+    )
+    status = "ok" if result["ready"] else "not_ready" if result["live"] else "stalled"
+    return {"status": status, **result}
+
+
+def collect_health() -> Dict[str, Any]:
     """
-    Simple health/status endpoint for the receiver.
+    Snapshot of every receiver stats getter; served as JSON by /health and
+    rendered as Prometheus metrics by /metrics.
 
-    Returns JSON:
-      - status: "ok"
+    Keys:
+      - status: "ok", "not_ready" or "stalled" (see collect_liveness)
       - queued_reports: current number of queued presence reports
       - last_scan_at: unix timestamp (seconds) of the last scanned presence, or null
+      - scan: BLE scanner counters (see ble_scanner.get_scan_stats)
+      - adapters: per-adapter packet counts and rates, or null with a single adapter
+      - aggregation: per-slot aggregation counters, or null when HNNP_AGGREGATE_MODE=off
+      - proximity: RSSI gate thresholds and per-reason drop counters, or null if disabled
+      - sending: send queue depth/overflows and in-flight requests (see sender.get_send_stats)
+      - retry: retry queue size, next due time and evictions by reason
+      - shaping: outbound request rate, Retry-After pause and 429 throttle counts
+      - upload: circuit breaker state, adaptive concurrency limit and per-lane latency
+      - connections: keep-alive reuse, connect time, DNS cache hits and idle pings
+      - tracing: rolling p50/p95/p99 per pipeline stage, radio to Cloud ack
+        (see tracing.PipelineTracer)
+      - liveness: live/ready flags, failing checks, event loop lag percentiles
+        and per-loop heartbeats
     """
-    data = {
-        "status": "ok",
+    upload = get_upload_control_stats()
+    liveness = collect_liveness(upload)
+    return {
+        "status": liveness.pop("status"),
         "queued_reports": get_queue_size(),
         "last_scan_at": get_last_scan_at(),
+        "scan": get_scan_stats(),
+        "adapters": get_adapter_stats(),
+        "aggregation": get_aggregation_stats(),
+        "proximity": get_proximity_stats(),
+        "sending": get_send_stats(),
+        "retry": get_retry_stats(),
+        "shaping": get_shaping_stats(),
+        "upload": upload,
+        "connections": get_connection_stats(),
+        "tracing": get_trace_stats(),
+        "liveness": liveness,
     }
-    return web.json_response(data)
+
+
+async def handle_health(_request: web.Request) -> web.Response:
+    """
+    Simple health/status endpoint for the receiver (JSON, see collect_health()).
+
+    Always 200; use /health/live and /health/ready for probes.
+    """
+    return web.json_response(collect_health())
+
+
+async def handle_live(_request: web.Request) -> web.Response:
+    """
+    Liveness probe: 503 when a loop is stalled or the event loop is badly lagging,
+    i.e. when restarting the receiver is the fix.
+    """
+    result = collect_liveness()
+    return web.json_response(result, status=200 if result["live"] else 503)
+
+
+async def handle_ready(_request: web.Request) -> web.Response:
+    """
+    Readiness probe: 503 while the receiver cannot deliver reports promptly
+    (not live, sender not started, circuit breaker open, or event loop lag).
+    """
+    result = collect_liveness()
+    return web.json_response(result, status=200 if result["ready"] else 503)
+
+
+async def handle_metrics(_request: web.Request) -> web.Response:
+    """
+    Prometheus scrape endpoint: per-stage counters, queue depths, send latency
+    and pipeline stage latency histograms (see metrics.render_metrics).
+    """
+    body = render_metrics(
+        collect_health(),
+        get_latency_histograms(),
+        get_stage_histograms(),
+        LAG_MONITOR.window.histogram(),
+    )
+    return web.Response(body=body.encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+def create_app() -> web.Application:
+    """
+    Build the monitoring app: /health, /health/live, /health/ready, /metrics
+    and, if HNNP_DEBUG_TOKEN is set, /debug/* (see debug_server.py).
+    """
+    app = web.Application()
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/health/live", handle_live)
+    app.router.add_get("/health/ready", handle_ready)
+    app.router.add_get("/metrics", handle_metrics)
+    add_debug_routes(app)
+    return app
 
 
 async def run_health_server() -> None:
     """
-    Start a lightweight HTTP server exposing /health for monitoring.
+    Start a lightweight HTTP server exposing /health, /health/live, /health/ready
+    and /metrics for monitoring.
 
     Configuration (optional):
       - HNNP_HEALTH_HOST (default "127.0.0.1")
       - HNNP_HEALTH_PORT (default "8081")
+      - HNNP_DEBUG_TOKEN: enables the /debug/* profiling endpoints (see debug_server.py)
     """
     host = os.environ.get("HNNP_HEALTH_HOST", "127.0.0.1")
     port = int(os.environ.get("HNNP_HEALTH_PORT", "8081"))
 
-    app = web.Application()
-    app.router.add_get("/health", handle_health)
-
-    runner = web.AppRunner(app)
+    runner = web.AppRunner(create_app())
     await runner.setup()
     site = web.TCPSite(runner, host, port)
     await site.start()
-
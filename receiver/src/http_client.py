@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import ssl
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import aiohttp  # type: ignore
+except ImportError:  # pragma: no cover - aiohttp may not be installed everywhere
+    aiohttp = None  # type: ignore
+
+
+logger = logging.getLogger("hnnp.receiver.http")
+
+DEFAULT_KEEPALIVE_SECONDS = 60.0
+DEFAULT_DNS_TTL_SECONDS = 300
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 3.0
+DEFAULT_READ_TIMEOUT_SECONDS = 10.0
+DEFAULT_PREWARM_CONNECTIONS = 2
+DEFAULT_IDLE_PING_SECONDS = 25.0
+# Cheap unauthenticated Cloud endpoint used for pre-warming and idle pings.
+PING_PATH = "/health"
+
+
+@dataclass(slots=True)
+class HttpSettings:
+    pool_size: int
+    keepalive_seconds: float
+    dns_ttl_seconds: int
+    connect_timeout: float
+    read_timeout: float
+    prewarm_connections: int
+    idle_ping_seconds: float
+
+
+def _get_float(name: str, default: float, minimum: float = 0.0) -> float:
+    import os
+
+    raw = os.environ.get(name, str(default))
+    try:
+        value = float(raw)
+    except ValueError:
+        value = default
+    return value if value >= minimum else default
+
+
+def load_http_settings(pool_size: int) -> HttpSettings:
+    """
+    Read connection settings from the environment.
+
+    pool_size is the connector limit (normally HNNP_MAX_IN_FLIGHT). Setting
+    HNNP_HTTP_PREWARM or HNNP_HTTP_IDLE_PING_SECONDS to 0 disables pre-warming or
+    idle pings.
+    """
+    return HttpSettings(
+        pool_size=max(pool_size, 1),
+        keepalive_seconds=_get_float("HNNP_HTTP_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS),
+        dns_ttl_seconds=int(_get_float("HNNP_DNS_TTL_SECONDS", DEFAULT_DNS_TTL_SECONDS)),
+        connect_timeout=_get_float(
+            "HNNP_HTTP_CONNECT_TIMEOUT_SECONDS", DEFAULT_CONNECT_TIMEOUT_SECONDS, minimum=0.1
+        ),
+        read_timeout=_get_float(
+            "HNNP_HTTP_READ_TIMEOUT_SECONDS", DEFAULT_READ_TIMEOUT_SECONDS, minimum=0.1
+        ),
+        prewarm_connections=int(_get_float("HNNP_HTTP_PREWARM", DEFAULT_PREWARM_CONNECTIONS)),
+        idle_ping_seconds=_get_float("HNNP_HTTP_IDLE_PING_SECONDS", DEFAULT_IDLE_PING_SECONDS),
+    )
+
+
+class ConnectionStats:
+    """
+    Connection reuse counters collected through an aiohttp TraceConfig.
+
+    A request either reuses a pooled keep-alive connection (connections_reused)
+    or opens a new one (connections_created, with DNS + TCP + TLS time in
+    connect_ms_total). dns_cache_hits/misses come from the connector's DNS cache.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.connect_seconds_total = 0.0
+        self.max_connect_seconds = 0.0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        self.prewarmed = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.last_request_at = time.monotonic()
+
+    def trace_config(self) -> "aiohttp.TraceConfig":
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_create_start.append(self._on_create_start)
+        trace.on_connection_create_end.append(self._on_create_end)
+        trace.on_connection_reuseconn.append(self._on_reuse)
+        trace.on_dns_cache_hit.append(self._on_dns_hit)
+        trace.on_dns_cache_miss.append(self._on_dns_miss)
+        return trace
+
+    def stats(self) -> Dict[str, Any]:
+        opened = self.connections_created + self.connections_reused
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": round(self.connections_reused / opened, 3) if opened else None,
+            "avg_connect_ms": (
+                round(self.connect_seconds_total / self.connections_created * 1000.0, 1)
+                if self.connections_created
+                else None
+            ),
+            "max_connect_ms": round(self.max_connect_seconds * 1000.0, 1),
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "prewarmed": self.prewarmed,
+            "pings": self.pings,
+            "ping_failures": self.ping_failures,
+            "idle_s": round(time.monotonic() - self.last_request_at, 1),
+        }
+
+    async def _on_request_start(self, _session: Any, _ctx: SimpleNamespace, _params: Any) -> None:
+        self.requests += 1
+        self.last_request_at = time.monotonic()
+
+    async def _on_create_start(self, _session: Any, ctx: SimpleNamespace, _params: Any) -> None:
+        ctx.connect_started = time.monotonic()
+
+    async def _on_create_end(self, _session: Any, ctx: SimpleNamespace, _params: Any) -> None:
+        self.connections_created += 1
+        elapsed = time.monotonic() - getattr(ctx, "connect_started", time.monotonic())
+        self.connect_seconds_total += elapsed
+        self.max_connect_seconds = max(self.max_connect_seconds, elapsed)
+
+    async def _on_reuse(self, _session: Any, _ctx: SimpleNamespace, _params: Any) -> None:
+        self.connections_reused += 1
+
+    async def _on_dns_hit(self, _session: Any, _ctx: SimpleNamespace, _params: Any) -> None:
+        self.dns_cache_hits += 1
+
+    async def _on_dns_miss(self, _session: Any, _ctx: SimpleNamespace, _params: Any) -> None:
+        self.dns_cache_misses += 1
+
+
+def create_session(
+    settings: HttpSettings, stats: ConnectionStats, base_url: str
+) -> "aiohttp.ClientSession":
+    """
+    Build the shared Cloud session: bounded keep-alive pool, DNS cache with TTL,
+    one SSLContext for all connections and split connect/read timeouts.
+
+    The total timeout is connect + read; sock_read bounds each wait for response
+    bytes, so a stalled Cloud fails fast without cutting off slow uploads.
+    """
+    ssl_context: Any = None
+    if base_url.startswith("https://"):
+        # One context for the whole pool: certificates are loaded once, not per
+        # connection. asyncio cannot resume TLS sessions across connections, so
+        # handshakes are avoided by keeping connections alive instead.
+        ssl_context = ssl.create_default_context()
+    connector = aiohttp.TCPConnector(
+        limit=settings.pool_size,
+        limit_per_host=settings.pool_size,
+        ttl_dns_cache=settings.dns_ttl_seconds or None,
+        use_dns_cache=settings.dns_ttl_seconds > 0,
+        keepalive_timeout=settings.keepalive_seconds,
+        ssl=ssl_context,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.connect_timeout + settings.read_timeout,
+        connect=settings.connect_timeout,
+        sock_connect=settings.connect_timeout,
+        sock_read=settings.read_timeout,
+    )
+    return aiohttp.ClientSession(
+        connector=connector, timeout=timeout, trace_configs=[stats.trace_config()]
+    )
+
+
+async def _ping(session: "aiohttp.ClientSession", url: str) -> bool:
+    async with session.get(url) as resp:
+        await resp.read()
+        return resp.status < 500
+
+
+async def prewarm(
+    session: "aiohttp.ClientSession", base_url: str, connections: int, stats: ConnectionStats
+) -> None:
+    """
+    Open `connections` keep-alive connections (DNS, TCP, TLS) before the first
+    report needs them, with concurrent GETs of PING_PATH.
+    """
+    if connections <= 0:
+        return
+    started = time.monotonic()
+    url = f"{base_url}{PING_PATH}"
+    results = await asyncio.gather(
+        *(_ping(session, url) for _ in range(connections)), return_exceptions=True
+    )
+    stats.prewarmed += sum(1 for result in results if result is True)
+    logger.info(
+        "Pre-warmed %s/%s Cloud connections in %.0f ms",
+        stats.prewarmed,
+        connections,
+        (time.monotonic() - started) * 1000.0,
+    )
+
+
+async def keep_warm(
+    session: "aiohttp.ClientSession",
+    base_url: str,
+    interval: float,
+    stats: ConnectionStats,
+    before_ping: Callable[[], Awaitable[bool]],
+) -> None:
+    """
+    Send a GET of PING_PATH whenever no request has been made for `interval`
+    seconds, so an idle receiver keeps one warm connection (and its DNS entry).
+
+    before_ping() is awaited first and may return False to skip the ping (e.g.
+    while the circuit breaker is open); it is also where the rate budget is taken.
+    """
+    url = f"{base_url}{PING_PATH}"
+    while True:
+        idle = time.monotonic() - stats.last_request_at
+        if idle < interval:
+            await asyncio.sleep(interval - idle)
+            continue
+        if not await before_ping():
+            await asyncio.sleep(interval)
+            continue
+        stats.pings += 1
+        try:
+            if not await _ping(session, url):
+                stats.ping_failures += 1
+        except Exception as exc:
+            stats.ping_failures += 1
+            logger.debug("Keep-alive ping failed: %s", exc)
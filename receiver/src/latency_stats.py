@@ -0,0 +1,65 @@
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Deque, Dict, List, Sequence, Tuple
+
+
+DEFAULT_WINDOW = 1024
+# Histogram upper bounds in seconds (Prometheus "le"), plus an implicit +Inf.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class LatencyWindow:
+    """
+    Latency percentiles over the most recent `window` samples (seconds), plus an
+    all-time fixed-bucket histogram for /metrics.
+
+    record() is O(1) apart from a bisect over the bucket bounds; percentiles are
+    computed on demand (a sort of at most `window` floats), which is cheap at
+    /health polling rates.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self._samples: Deque[float] = deque(maxlen=max(window, 1))
+        self.count = 0
+        self.sum = 0.0
+        self.bounds = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self.bounds) + 1)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self.count += 1
+        self.sum += seconds
+        self._bucket_counts[bisect_left(self.bounds, seconds)] += 1
+
+    def histogram(self) -> Dict[str, Any]:
+        """
+        Return cumulative bucket counts as [(upper_bound, count), ...] ending with
+        (inf, count), plus sum and count.
+        """
+        cumulative: List[Tuple[float, int]] = []
+        running = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self._bucket_counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return count (all time) and p50/p95/p99/max in milliseconds over the window.
+        """
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+
+        def pick(q: float) -> float:
+            return round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000.0, 3)
+
+        return {
+            "count": self.count,
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000.0, 3),
+        }
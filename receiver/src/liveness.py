@@ -0,0 +1,222 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import time
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from .latency_stats import LatencyWindow
+
+
+LOOP_SCAN = "scan"
+LOOP_SEND = "send"
+LOOP_RETRY = "retry"
+
+DEFAULT_LAG_INTERVAL = 0.25
+# 240 samples at 0.25 s: lag percentiles cover the last minute.
+DEFAULT_LAG_WINDOW = 240
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_STALL_SECONDS = 300.0
+DEFAULT_LIVE_MAX_LAG_MS = 1000.0
+DEFAULT_READY_MAX_LAG_MS = 250.0
+
+
+class Heartbeat:
+    """
+    Progress marker for one receiver loop (scan, send or retry).
+
+    A loop calls start(key) when it picks up a unit of work (a scan batch, a
+    report, a retry) and done(key) when it is finished with it; key tells
+    concurrent workers apart. Waiting for work is never a stall, so an idle
+    receiver is healthy: a loop is stalled only while some unit of work has been
+    in progress for longer than the stall threshold.
+
+    Waiting for send budget (rate shaper, concurrency limiter) is waiting too:
+    code that may wait there wraps it in admission_wait(), which pauses the unit
+    of work started by the current task and restarts its clock afterwards.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.completed = 0
+        self.last_done: Optional[float] = None
+        self._in_progress: Dict[Hashable, float] = {}
+        self._waiting: Dict[Hashable, int] = {}
+
+    def start(self, key: Hashable = 0) -> None:
+        self._in_progress[key] = time.monotonic()
+        _CURRENT_WORK.set((self, key))
+
+    def done(self, key: Hashable = 0) -> None:
+        self._in_progress.pop(key, None)
+        self._waiting.pop(key, None)
+        self.completed += 1
+        self.last_done = time.monotonic()
+        if _CURRENT_WORK.get() == (self, key):
+            _CURRENT_WORK.set(None)
+
+    def pause(self, key: Hashable = 0) -> None:
+        if key in self._in_progress:
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+
+    def resume(self, key: Hashable = 0) -> None:
+        waiting = self._waiting.get(key, 0) - 1
+        if waiting > 0:
+            self._waiting[key] = waiting
+            return
+        self._waiting.pop(key, None)
+        if key in self._in_progress:
+            self._in_progress[key] = time.monotonic()
+
+    def busy_seconds(self, now: Optional[float] = None) -> float:
+        """
+        Return how long the oldest unit of work has been in progress (0 if idle).
+
+        Work paused in admission_wait() does not count.
+        """
+        started = [at for key, at in self._in_progress.items() if key not in self._waiting]
+        if not started:
+            return 0.0
+        return (now if now is not None else time.monotonic()) - min(started)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "in_progress": len(self._in_progress),
+            "waiting_for_admission": len(self._waiting),
+            "busy_s": round(self.busy_seconds(now), 1),
+            "idle_s": round(now - self.last_done, 1) if self.last_done is not None else None,
+        }
+
+
+_HEARTBEATS: Dict[str, Heartbeat] = {}
+# The (heartbeat, key) whose unit of work the current task is running. asyncio
+# copies context into child tasks, so retries gathered concurrently each see
+# the work they started themselves.
+_CURRENT_WORK: "contextvars.ContextVar[Optional[Tuple[Heartbeat, Hashable]]]" = contextvars.ContextVar(
+    "hnnp_current_work", default=None
+)
+
+
+def heartbeat(name: str) -> Heartbeat:
+    """
+    Return the process-wide Heartbeat for loop `name`, creating it on first use.
+    """
+    beat = _HEARTBEATS.get(name)
+    if beat is None:
+        beat = _HEARTBEATS[name] = Heartbeat(name)
+    return beat
+
+
+@contextlib.contextmanager
+def admission_wait() -> Iterator[None]:
+    """
+    Pause the current task's heartbeat while it waits to be admitted to send.
+
+    A Retry-After pause (up to 10 minutes) or retries queued behind live
+    traffic are throttling, not a hung loop, and must not fail liveness.
+    """
+    current = _CURRENT_WORK.get()
+    if current is None:
+        yield
+        return
+    beat, key = current
+    beat.pause(key)
+    try:
+        yield
+    finally:
+        beat.resume(key)
+
+
+class LoopLagMonitor:
+    """
+    Event loop scheduling delay: sleeps `interval` seconds and records how much
+    later than requested it woke up.
+
+    A callback that blocks the loop delays every other task (BLE callbacks,
+    sends, /health itself) by the same amount, which shows up here as lag.
+    """
+
+    def __init__(self, interval: float = DEFAULT_LAG_INTERVAL, window: int = DEFAULT_LAG_WINDOW) -> None:
+        self.interval = interval
+        self.window = LatencyWindow(window, LAG_BUCKETS)
+        self.last_lag = 0.0
+        self.last_tick: Optional[float] = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - expected, 0.0)
+            self.window.record(self.last_lag)
+            self.last_tick = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.window.stats()
+        stats["last_ms"] = round(self.last_lag * 1000.0, 3)
+        return stats
+
+
+LAG_MONITOR = LoopLagMonitor()
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, str(default))
+    try:
+        value = float(raw)
+    except ValueError:
+        value = default
+    return value if value >= 0 else default
+
+
+def check_health(sender_ready: bool, breaker_open: bool) -> Dict[str, Any]:
+    """
+    Evaluate liveness and readiness from event loop lag and loop heartbeats.
+
+    Not live (restart the receiver) if:
+      - a scan/send/retry unit of work has been in progress longer than
+        HNNP_STALL_SECONDS (default 300), or
+      - event loop lag p95 over the last minute exceeds HNNP_LIVE_MAX_LAG_MS
+        (default 1000).
+    Not ready (live, but not delivering reports promptly) if, in addition:
+      - lag p95 exceeds HNNP_READY_MAX_LAG_MS (default 250),
+      - the sender has not started yet or the circuit breaker is open, or
+      - HNNP_READY_MAX_SCAN_IDLE_SECONDS is set and no scan batch arrived for
+        that long (off by default: a quiet room is not a fault).
+    """
+    now = time.monotonic()
+    stall_seconds = _env_float("HNNP_STALL_SECONDS", DEFAULT_STALL_SECONDS)
+    live_max_lag = _env_float("HNNP_LIVE_MAX_LAG_MS", DEFAULT_LIVE_MAX_LAG_MS)
+    ready_max_lag = _env_float("HNNP_READY_MAX_LAG_MS", DEFAULT_READY_MAX_LAG_MS)
+    max_scan_idle = _env_float("HNNP_READY_MAX_SCAN_IDLE_SECONDS", 0.0)
+
+    lag = LAG_MONITOR.stats()
+    lag_p95 = lag["p95_ms"] or 0.0
+    not_live: List[str] = []
+    not_ready: List[str] = []
+    for name, beat in _HEARTBEATS.items():
+        if stall_seconds and beat.busy_seconds(now) > stall_seconds:
+            not_live.append(f"{name}_stalled")
+    if live_max_lag and lag_p95 > live_max_lag:
+        not_live.append("event_loop_lag")
+    if ready_max_lag and lag_p95 > ready_max_lag and "event_loop_lag" not in not_live:
+        not_ready.append("event_loop_lag")
+    if not sender_ready:
+        not_ready.append("sender_not_started")
+    if breaker_open:
+        not_ready.append("circuit_open")
+    scan = _HEARTBEATS.get(LOOP_SCAN)
+    if max_scan_idle:
+        last_scan = scan.last_done if scan is not None else None
+        if last_scan is None or now - last_scan > max_scan_idle:
+            not_ready.append("scan_idle")
+
+    return {
+        "live": not not_live,
+        "ready": not not_live and not not_ready,
+        "failing": not_live + not_ready,
+        "event_loop_lag": lag,
+        "loops": {name: beat.stats(now) for name, beat in _HEARTBEATS.items()},
+    }
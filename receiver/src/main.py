@@ -1,13 +1,14 @@
 import asyncio
 import logging
 
-from config_loader import load_receiver_config
-from sender import run_sender
-from health_server import run_health_server
+from .config_loader import load_receiver_config
+from .sender import run_sender
+from .health_server import run_health_server
+from .liveness import LAG_MONITOR
 
 
 async def _run_all() -> None:
-    await asyncio.gather(run_sender(), run_health_server())
+    await asyncio.gather(run_sender(), run_health_server(), LAG_MONITOR.run())
 
 
 def main() -> None:
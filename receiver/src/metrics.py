@@ -0,0 +1,304 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+PREFIX = "hnnp_receiver_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Optional[Dict[str, str]]
+
+
+class MetricsWriter:
+    """
+    Minimal Prometheus text exposition (format 0.0.4) writer.
+
+    The receiver keeps plain int/float counters on its hot paths; this only runs
+    when /metrics is scraped, turning the stats snapshots into metric families.
+    """
+
+    def __init__(self) -> None:
+        self._lines: List[str] = []
+
+    def family(
+        self, name: str, kind: str, help_text: str, samples: Iterable[Tuple[Labels, Any]]
+    ) -> None:
+        """
+        Write one metric family; samples with a None value are skipped.
+        """
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        full = PREFIX + name
+        self._lines.append(f"# HELP {full} {help_text}")
+        self._lines.append(f"# TYPE {full} {kind}")
+        for labels, value in samples:
+            self._lines.append(f"{full}{_labels(labels)} {_number(value)}")
+
+    def counter(self, name: str, help_text: str, value: Any, labels: Labels = None) -> None:
+        self.family(name, "counter", help_text, [(labels, value)])
+
+    def gauge(self, name: str, help_text: str, value: Any, labels: Labels = None) -> None:
+        self.family(name, "gauge", help_text, [(labels, value)])
+
+    def histogram(
+        self, name: str, help_text: str, series: Iterable[Tuple[Labels, Dict[str, Any]]]
+    ) -> None:
+        """
+        Write a histogram family; each series is (labels, LatencyWindow.histogram()).
+        """
+        full = PREFIX + name
+        self._lines.append(f"# HELP {full} {help_text}")
+        self._lines.append(f"# TYPE {full} histogram")
+        for labels, data in series:
+            for bound, count in data["buckets"]:
+                le = "+Inf" if math.isinf(bound) else _number(bound)
+                self._lines.append(f"{full}_bucket{_labels({**(labels or {}), 'le': le})} {count}")
+            self._lines.append(f"{full}_sum{_labels(labels)} {_number(data['sum'])}")
+            self._lines.append(f"{full}_count{_labels(labels)} {data['count']}")
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _get(data: Optional[Dict[str, Any]], *keys: str) -> Any:
+    for key in keys:
+        if data is None:
+            return None
+        data = data.get(key)
+    return data
+
+
+def render_metrics(
+    health: Dict[str, Any],
+    latency: Dict[str, Dict[str, Any]],
+    stages: Optional[Dict[str, Dict[str, Any]]] = None,
+    loop_lag: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Render the /health snapshot (see health_server.collect_health), the per-lane
+    latency histograms (sender.get_latency_histograms), the pipeline stage
+    histograms (sender.get_stage_histograms) and the event loop lag histogram
+    (liveness.LAG_MONITOR) as Prometheus metrics.
+
+    Stages, in pipeline order: advertisements -> parsed payloads (drops by rule)
+    -> dedup -> proximity gate -> signed reports -> HTTP outcomes / drops.
+    """
+    out = MetricsWriter()
+    scan = health.get("scan") or {}
+    out.counter(
+        "adverts_delivered_total",
+        "Advertisement callbacks delivered to Python.",
+        scan.get("adverts_delivered"),
+    )
+    out.counter(
+        "devices_polled_total",
+        "Devices returned by poll mode discover() windows.",
+        scan.get("devices_polled"),
+    )
+    out.counter(
+        "adverts_non_hnnp_total",
+        "Delivered advertisements without HNNP service data.",
+        scan.get("adverts_non_hnnp"),
+    )
+    out.counter(
+        "adverts_received_total",
+        "HNNP advertisements handed to the parser.",
+        scan.get("adverts_received"),
+    )
+    out.counter(
+        "payloads_parsed_total",
+        "HNNP payloads that passed structural validation.",
+        scan.get("payloads_parsed"),
+    )
+    out.family(
+        "parse_drops_total",
+        "counter",
+        "HNNP payloads rejected by the parser, by rule.",
+        [({"reason": reason}, count) for reason, count in (scan.get("parse_drops") or {}).items()],
+    )
+    out.counter(
+        "scan_queue_overflows_total",
+        "Advertisements dropped because the scan queue was full.",
+        scan.get("queue_overflows"),
+    )
+    out.gauge("scan_queue_depth", "Advertisements waiting to be parsed.", scan.get("queue_depth"))
+    out.counter(
+        "hci_frames_malformed_total",
+        "Raw HCI frames skipped because they could not be decoded.",
+        scan.get("hci_frames_malformed"),
+    )
+    out.counter(
+        "dedup_hits_total",
+        "Packets suppressed as duplicates.",
+        _get(scan, "dedup", "hits"),
+    )
+    out.gauge(
+        "dedup_entries",
+        "Entries in the duplicate-suppression cache.",
+        _get(scan, "dedup", "entries"),
+    )
+
+    proximity = health.get("proximity")
+    out.counter(
+        "proximity_admitted_total",
+        "Sightings admitted by the RSSI gate.",
+        _get(proximity, "admitted"),
+    )
+    out.family(
+        "proximity_drops_total",
+        "counter",
+        "Sightings dropped by the RSSI gate, by reason.",
+        [
+            ({"reason": reason}, count)
+            for reason, count in (_get(proximity, "drops") or {}).items()
+        ],
+    )
+    out.counter(
+        "aggregation_sightings_total",
+        "Sightings fed to the slot aggregator.",
+        _get(health.get("aggregation"), "sightings"),
+    )
+    out.counter(
+        "aggregation_late_sightings_total",
+        "Sightings dropped because their slot had already closed.",
+        _get(health.get("aggregation"), "late_sightings"),
+    )
+
+    sending = health.get("sending") or {}
+    out.counter("reports_signed_total", "Presence reports signed.", sending.get("reports_signed"))
+    out.counter(
+        "reports_sent_total",
+        "Presence reports accepted by Cloud.",
+        sending.get("reports_sent"),
+    )
+    out.counter(
+        "batches_sent_total",
+        "Batch requests accepted by Cloud.",
+        sending.get("batches_sent"),
+    )
+    out.family(
+        "http_responses_total",
+        "counter",
+        "Cloud requests by outcome (status class, 429, or network_error).",
+        [({"class": klass}, count) for klass, count in (sending.get("responses") or {}).items()],
+    )
+    out.family(
+        "reports_dropped_total",
+        "counter",
+        "Reports given up on, by reason.",
+        [({"reason": reason}, count) for reason, count in (sending.get("dropped") or {}).items()]
+        + [
+            ({"reason": f"evicted_{reason}"}, count)
+            for reason, count in (_get(health.get("retry"), "evictions") or {}).items()
+        ],
+    )
+    out.gauge(
+        "send_queue_depth",
+        "Reports waiting for a sender worker.",
+        sending.get("send_queue_depth"),
+    )
+    out.counter(
+        "send_queue_overflows_total",
+        "Reports diverted to the retry queue because the send queue was full.",
+        sending.get("send_queue_overflows"),
+    )
+    out.gauge(
+        "in_flight_requests",
+        "Cloud requests currently in flight.",
+        sending.get("in_flight"),
+    )
+    out.gauge(
+        "retry_queue_size",
+        "Reports waiting in the retry queue.",
+        health.get("queued_reports"),
+    )
+    out.gauge(
+        "last_scan_timestamp_seconds",
+        "Unix time of the last scanned report.",
+        health.get("last_scan_at"),
+    )
+
+    upload = health.get("upload")
+    breaker_state = _get(upload, "breaker", "state")
+    out.family(
+        "breaker_state",
+        "gauge",
+        "Circuit breaker state (1 for the current state).",
+        [
+            ({"state": state}, int(state == breaker_state))
+            for state in ("closed", "open", "half_open")
+            if breaker_state is not None
+        ],
+    )
+    out.gauge(
+        "concurrency_limit",
+        "Adaptive concurrency limit.",
+        _get(upload, "concurrency", "limit"),
+    )
+    out.gauge(
+        "send_rate_per_second",
+        "Rate shaper request rate.",
+        _get(health.get("shaping"), "rate_per_s"),
+    )
+    out.histogram(
+        "send_latency_seconds",
+        "Upload latency per lane: waiting for send budget plus the HTTP round trip.",
+        [({"lane": lane}, data) for lane, data in latency.items()],
+    )
+    if stages:
+        out.histogram(
+            "stage_latency_seconds",
+            "Per-stage latency of reports acknowledged by Cloud (stage=total: radio to ack).",
+            [({"stage": stage}, data) for stage, data in stages.items()],
+        )
+
+    liveness = health.get("liveness")
+    out.gauge("live", "1 if the receiver passes its liveness checks.", _get(liveness, "live"))
+    out.gauge("ready", "1 if the receiver passes its readiness checks.", _get(liveness, "ready"))
+    out.family(
+        "loop_busy_seconds",
+        "gauge",
+        "How long each loop's oldest unit of work has been in progress (0 when idle).",
+        [
+            ({"loop": name}, loop.get("busy_s"))
+            for name, loop in (_get(liveness, "loops") or {}).items()
+        ],
+    )
+    if loop_lag:
+        out.histogram(
+            "event_loop_lag_seconds",
+            "Event loop scheduling delay, sampled every 0.25 s.",
+            [(None, loop_lag)],
+        )
+
+    connections = health.get("connections")
+    out.counter(
+        "connections_created_total",
+        "Cloud connections opened.",
+        _get(connections, "connections_created"),
+    )
+    out.counter(
+        "connections_reused_total",
+        "Cloud requests served on a pooled keep-alive connection.",
+        _get(connections, "connections_reused"),
+    )
+    return out.text()
@@ -0,0 +1,414 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import random
+import struct
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from .ble_scanner import BleakPacketSource, HciSocketPacketSource, PacketSource, RawAdvertisement
+from .hci import HCI_EVENT_PKT, hnnp_payloads_from_event
+
+
+logger = logging.getLogger("hnnp.receiver.sources")
+
+REPLAY_BATCH_SIZE = 256
+
+# btsnoop (btmon -w, Android HCI snoop log) container.
+_BTSNOOP_MAGIC = b"btsnoop\x00"
+_BTSNOOP_HEADER = struct.Struct(">8sII")
+_BTSNOOP_RECORD = struct.Struct(">IIIIq")
+# Microseconds between 0000-01-01 and the unix epoch, as used by btsnoop timestamps.
+_BTSNOOP_EPOCH_DELTA_US = 0x00DCDDB30F2F8000
+_BTSNOOP_DATALINK_H1 = 1001
+_BTSNOOP_DATALINK_H4 = 1002
+_BTSNOOP_DATALINK_MONITOR = 2001
+_MONITOR_OPCODE_EVENT_PKT = 0x0003
+
+# pcap container with Bluetooth link types.
+_PCAP_LINKTYPE_H4 = 187
+_PCAP_LINKTYPE_H4_WITH_PHDR = 201
+_PCAP_LINKTYPE_MONITOR = 254
+
+
+def _read_btsnoop_events(data: bytes) -> Iterator[Tuple[float, bytes]]:
+    _magic, _version, datalink = _BTSNOOP_HEADER.unpack_from(data, 0)
+    offset = _BTSNOOP_HEADER.size
+    while offset + _BTSNOOP_RECORD.size <= len(data):
+        _orig_len, incl_len, flags, _drops, ts_us = _BTSNOOP_RECORD.unpack_from(data, offset)
+        offset += _BTSNOOP_RECORD.size
+        packet = data[offset : offset + incl_len]
+        offset += incl_len
+        ts = (ts_us - _BTSNOOP_EPOCH_DELTA_US) / 1_000_000
+
+        if datalink == _BTSNOOP_DATALINK_H4:
+            if packet[:1] == bytes([HCI_EVENT_PKT]):
+                yield ts, packet[1:]
+        elif datalink == _BTSNOOP_DATALINK_H1:
+            # bit 0: received, bit 1: command/event rather than data.
+            if flags & 0x03 == 0x03:
+                yield ts, packet
+        elif datalink == _BTSNOOP_DATALINK_MONITOR:
+            if flags & 0xFFFF == _MONITOR_OPCODE_EVENT_PKT:
+                yield ts, packet
+
+
+def _read_pcap_events(data: bytes) -> Iterator[Tuple[float, bytes]]:
+    magic = data[:4]
+    if magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+        endian = ">"
+    else:
+        endian = "<"
+    nanoseconds = magic in (b"\xa1\xb2\x3c\x4d", b"\x4d\x3c\xb2\xa1")
+    linktype = struct.unpack_from(endian + "I", data, 20)[0]
+    record = struct.Struct(endian + "IIII")
+
+    offset = 24
+    while offset + record.size <= len(data):
+        ts_sec, ts_frac, incl_len, _orig_len = record.unpack_from(data, offset)
+        offset += record.size
+        packet = data[offset : offset + incl_len]
+        offset += incl_len
+        ts = ts_sec + ts_frac / (1_000_000_000 if nanoseconds else 1_000_000)
+
+        if linktype == _PCAP_LINKTYPE_H4_WITH_PHDR:
+            # 4-byte direction pseudo-header, then the H4 packet.
+            packet = packet[4:]
+
+        if linktype in (_PCAP_LINKTYPE_H4, _PCAP_LINKTYPE_H4_WITH_PHDR):
+            if packet[:1] == bytes([HCI_EVENT_PKT]):
+                yield ts, packet[1:]
+        elif linktype == _PCAP_LINKTYPE_MONITOR and len(packet) >= 4:
+            # adapter_id(2, BE) opcode(2, BE), then the HCI packet.
+            if struct.unpack_from(">H", packet, 2)[0] == _MONITOR_OPCODE_EVENT_PKT:
+                yield ts, packet[4:]
+
+
+def read_capture_events(path: str) -> Iterator[Tuple[float, bytes]]:
+    """
+    Yield (unix_time, hci_event) for every HCI event in a btsnoop or pcap capture.
+
+    Supported inputs: `btmon -w` and Android snoop logs (btsnoop H1/H4/monitor),
+    and pcap/pcap-ns files with link types 187, 201 or 254 (e.g. from Wireshark).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data.startswith(_BTSNOOP_MAGIC):
+        return _read_btsnoop_events(data)
+    if data[:4] in (
+        b"\xa1\xb2\xc3\xd4",
+        b"\xd4\xc3\xb2\xa1",
+        b"\xa1\xb2\x3c\x4d",
+        b"\x4d\x3c\xb2\xa1",
+    ):
+        return _read_pcap_events(data)
+    raise ValueError(f"read_capture_events: unrecognised capture format: {path}")
+
+
+def _retime_payload(payload: bytes, recorded_at: float, now: float) -> bytes:
+    """
+    Move a payload recorded at unix time recorded_at into the slot current at now.
+
+    The drift the phone had when it was recorded (its time_slot minus the slot
+    of recorded_at) is kept. Under accelerated replay, several recorded slots
+    land in the same wall-clock slot instead of running ahead of it.
+    """
+    drift = int.from_bytes(payload[2:6], "big") - int(recorded_at) // 15
+    time_slot = (int(now) // 15 + drift) & 0xFFFFFFFF
+    return payload[:2] + time_slot.to_bytes(4, "big") + payload[6:]
+
+
+class CaptureReplaySource(PacketSource):
+    """
+    Replay HNNP advertisements from a btmon/btsnoop or pcap HCI capture.
+
+    - speed: 1.0 replays at recorded speed, 10.0 ten times faster, 0 as fast as
+      the pipeline can consume (line rate).
+    - retime: rewrite each time_slot as it is emitted, keeping its offset from
+      the slot it was recorded in but moving it to the current wall-clock slot,
+      so old captures pass the MAX_DRIFT_SLOTS check at any speed (the packet MAC
+      no longer verifies in Cloud, which is fine for load and profiling runs).
+    - loop: start over at the end of the capture.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, speed: float = 1.0, retime: bool = True, loop: bool = False) -> None:
+        self.path = path
+        self.speed = max(speed, 0.0)
+        self.retime = retime
+        self.loop = loop
+
+    def _load(self) -> List[Tuple[float, bytes, int]]:
+        records: List[Tuple[float, bytes, int]] = []
+        for ts, event in read_capture_events(self.path):
+            for payload, rssi in hnnp_payloads_from_event(event):
+                records.append((ts, payload, rssi))
+        logger.info("Loaded %d HNNP advertisements from %s", len(records), self.path)
+        return records
+
+    async def batches(self) -> AsyncIterator[List[RawAdvertisement]]:
+        records = self._load()
+        if not records:
+            return
+
+        while True:
+            origin = records[0][0]
+            started = time.monotonic()
+            batch: List[RawAdvertisement] = []
+
+            for ts, payload, rssi in records:
+                if self.speed > 0:
+                    due = (ts - origin) / self.speed
+                    wait = due - (time.monotonic() - started)
+                    if wait > 0:
+                        if batch:
+                            yield batch
+                            batch = []
+                        await asyncio.sleep(wait)
+
+                if self.retime and len(payload) == 30:
+                    payload = _retime_payload(payload, ts, time.time())
+                batch.append(RawAdvertisement(payload, rssi, time.monotonic()))
+
+                if len(batch) >= REPLAY_BATCH_SIZE:
+                    yield batch
+                    batch = []
+                    await asyncio.sleep(0)
+
+            if batch:
+                yield batch
+            if not self.loop:
+                return
+
+
+def _synthetic_payload(device_auth_key: bytes, time_slot: int, flags: int = 0x00) -> bytes:
+    """
+    Build a spec-valid v2 payload (protocol/spec.md sections 5 and 6) for one device.
+    """
+    slot_bytes = time_slot.to_bytes(4, byteorder="big", signed=False)
+    full_token = hmac.new(device_auth_key, slot_bytes + b"hnnp_v2_presence", hashlib.sha256).digest()
+    token_prefix = full_token[:16]
+    header = bytes([0x02, flags]) + slot_bytes
+    mac = hmac.new(device_auth_key, header + token_prefix, hashlib.sha256).digest()[:8]
+    return header + token_prefix + mac
+
+
+class SyntheticPacketSource(PacketSource):
+    """
+    Generate spec-valid HNNP v2 advertisements for a simulated crowd.
+
+    Every device gets a random device_auth_key and a base RSSI, and rebroadcasts
+    its current-slot payload once per interval_ms (0 = line rate). Tokens rotate
+    with the real 15-second slot, so the rest of the pipeline behaves exactly as
+    it would with real phones.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, devices: int = 100, interval_ms: float = 300.0, seed: Optional[int] = None) -> None:
+        rng = random.Random(seed)
+        self.interval_ms = max(interval_ms, 0.0)
+        self._rng = rng
+        self._keys = [rng.randbytes(32) for _ in range(max(devices, 1))]
+        self._base_rssi = [rng.randint(-95, -45) for _ in self._keys]
+        self._slot: Optional[int] = None
+        self._payloads: List[bytes] = []
+
+    def _current_payloads(self) -> List[bytes]:
+        time_slot = int(time.time()) // 15
+        if time_slot != self._slot:
+            self._payloads = [_synthetic_payload(key, time_slot) for key in self._keys]
+            self._slot = time_slot
+        return self._payloads
+
+    async def batches(self) -> AsyncIterator[List[RawAdvertisement]]:
+        rng = self._rng
+        while True:
+            received_at = time.monotonic()
+            yield [
+                RawAdvertisement(payload, base + rng.randint(-4, 4), received_at)
+                for payload, base in zip(self._current_payloads(), self._base_rssi)
+            ]
+            await asyncio.sleep(self.interval_ms / 1000.0)
+
+
+class _RateCounter:
+    """
+    Packet counter with a sliding per-second rate over the last window_seconds.
+    """
+
+    def __init__(self, window_seconds: int = 10) -> None:
+        self.window_seconds = window_seconds
+        self.total = 0
+        self._first_second: Optional[int] = None
+        self._buckets: Dict[int, int] = {}
+
+    def add(self, count: int, now: float) -> None:
+        self.total += count
+        second = int(now)
+        if self._first_second is None:
+            self._first_second = second
+        self._buckets[second] = self._buckets.get(second, 0) + count
+        if len(self._buckets) > self.window_seconds + 1:
+            oldest = second - self.window_seconds
+            for key in [k for k in self._buckets if k < oldest]:
+                del self._buckets[key]
+
+    def rate(self, now: float) -> float:
+        # Only complete seconds count, so the rate does not dip at the start of each second.
+        current = int(now)
+        if self._first_second is None or current <= self._first_second:
+            return 0.0
+        span = min(self.window_seconds, current - self._first_second)
+        start = current - span
+        count = sum(n for second, n in self._buckets.items() if start <= second < current)
+        return count / span
+
+
+class MergedPacketSource(PacketSource):
+    """
+    Run several packet sources concurrently and merge their batches into one stream.
+
+    Used for multi-adapter receivers: every adapter scans at the same time, and the
+    merged stream feeds a single scan_hnnp_sightings() pipeline, so one dedup cache
+    (or aggregator) sees all adapters and a token heard by two dongles is reported
+    once. A failing adapter is logged and dropped; the others keep scanning.
+    """
+
+    name = "merged"
+
+    def __init__(self, sources: Dict[str, PacketSource], queue_size: int = 64) -> None:
+        self.sources = sources
+        self.queue_size = queue_size
+        self._rates = {label: _RateCounter() for label in sources}
+        self._errors: Dict[str, Optional[str]] = {label: None for label in sources}
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            label: {
+                "source": self.sources[label].name,
+                "packets": counter.total,
+                "packets_per_second": round(counter.rate(now), 2),
+                "error": self._errors[label],
+            }
+            for label, counter in self._rates.items()
+        }
+
+    async def batches(self) -> AsyncIterator[List[RawAdvertisement]]:
+        global _MERGED_SOURCE
+        _MERGED_SOURCE = self
+
+        queue: "asyncio.Queue[Optional[List[RawAdvertisement]]]" = asyncio.Queue(
+            maxsize=self.queue_size
+        )
+
+        async def _pump(label: str, source: PacketSource) -> None:
+            counter = self._rates[label]
+            try:
+                async for batch in source.batches():
+                    counter.add(len(batch), time.time())
+                    await queue.put(batch)
+            except asyncio.CancelledError:
+                # Cancelled by the consumer: nobody is waiting for the end marker,
+                # and waiting for room in a full queue would never finish.
+                raise
+            except Exception as exc:
+                self._errors[label] = str(exc)
+                logger.error("Packet source %s (%s) failed: %s", label, source.name, exc)
+            await queue.put(None)
+
+        pumps = [asyncio.ensure_future(_pump(label, src)) for label, src in self.sources.items()]
+        running = len(pumps)
+        try:
+            while running:
+                batch = await queue.get()
+                if batch is None:
+                    running -= 1
+                    continue
+                yield batch
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+
+        if all(self._errors.values()):
+            details = "; ".join(f"{label}: {error}" for label, error in self._errors.items())
+            raise RuntimeError(f"all packet sources failed: {details}")
+
+
+_MERGED_SOURCE: Optional[MergedPacketSource] = None
+
+
+def get_adapter_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return per-adapter packet counts and rates, or None for single-adapter receivers.
+    """
+    return _MERGED_SOURCE.stats() if _MERGED_SOURCE is not None else None
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        logger.warning("Invalid %s=%r; using default %s", name, raw, default)
+        return default
+
+
+def load_packet_source() -> PacketSource:
+    """
+    Select the advertisement source from HNNP_PACKET_SOURCE.
+
+    - "bleak" (default): live scanning, HNNP_SCAN_MODE=continuous|poll.
+    - "hci": live scanning from a raw HCI socket on HNNP_BLE_ADAPTER (Linux,
+      CAP_NET_RAW), bypassing bleak and D-Bus.
+
+    For "bleak" and "hci", HNNP_BLE_ADAPTERS=hci0,hci1,... scans on every listed
+    adapter at once through a MergedPacketSource.
+    - "replay": HNNP_REPLAY_PATH capture file, HNNP_REPLAY_SPEED (default 1,
+      0 = line rate), HNNP_REPLAY_LOOP=1 to repeat.
+    - "synthetic": HNNP_SYNTHETIC_DEVICES (default 100) devices rebroadcasting every
+      HNNP_SYNTHETIC_INTERVAL_MS (default 300, 0 = line rate).
+    """
+    kind = os.environ.get("HNNP_PACKET_SOURCE", "bleak").strip().lower()
+
+    if kind == "replay":
+        path = os.environ.get("HNNP_REPLAY_PATH", "")
+        if not path:
+            raise RuntimeError("HNNP_PACKET_SOURCE=replay requires HNNP_REPLAY_PATH")
+        return CaptureReplaySource(
+            path,
+            speed=_env_float("HNNP_REPLAY_SPEED", 1.0),
+            loop=os.environ.get("HNNP_REPLAY_LOOP", "0").strip().lower() in ("1", "true", "yes"),
+        )
+
+    if kind == "synthetic":
+        return SyntheticPacketSource(
+            devices=int(_env_float("HNNP_SYNTHETIC_DEVICES", 100)),
+            interval_ms=_env_float("HNNP_SYNTHETIC_INTERVAL_MS", 300.0),
+        )
+
+    if kind not in ("bleak", "hci"):
+        logger.warning("Unknown HNNP_PACKET_SOURCE=%r; using bleak", kind)
+        kind = "bleak"
+
+    scan_mode = os.environ.get("HNNP_SCAN_MODE", "continuous").strip().lower()
+
+    def _live_source(adapter: str) -> PacketSource:
+        if kind == "hci":
+            return HciSocketPacketSource(adapter)
+        return BleakPacketSource(scan_mode, adapter=adapter)
+
+    adapters = [a.strip() for a in os.environ.get("HNNP_BLE_ADAPTERS", "").split(",") if a.strip()]
+    if len(adapters) > 1:
+        return MergedPacketSource({adapter: _live_source(adapter) for adapter in adapters})
+    if adapters:
+        return _live_source(adapters[0])
+    return _live_source(os.environ.get("HNNP_BLE_ADAPTER", "hci0").strip() or "hci0")
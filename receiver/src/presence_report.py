@@ -1,33 +1,153 @@
-import hmac
-import hashlib
+import functools
+import struct
 import time
-from dataclasses import dataclass, asdict
-from typing import Any, AsyncIterator, Dict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from .ble_scanner import BlePacketV2, scan_hnnp_packets
+from .aggregator import EMIT_OFF, aggregate_sighting_batches, get_aggregate_mode
+from .ble_scanner import (
+    BlePacketV2,
+    dedup_sighting_batches,
+    iter_sightings,
+    scan_hnnp_sighting_batches,
+)
 from .config_loader import load_receiver_config
+from .packet_sources import load_packet_source
+from .proximity import gate_sighting_batches, load_rssi_gate
+from .signer import ReportSigner
+from .tracing import ReportTrace
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PresenceReport:
+    """
+    A signed presence report.
+
+    token_prefix, mac and signature are kept as raw bytes (16/8/32 bytes); hex
+    encoding happens only when the report is serialized for Cloud (serializer.py,
+    or to_json()).
+
+    trace carries the report's pipeline stamps (see tracing.ReportTrace). It is
+    not part of the report: it is never sent, compared or stored in ReportColumns.
+    """
+
     org_id: str
     receiver_id: str
     timestamp: int
     time_slot: int
     version: int
     flags: int
-    token_prefix: str  # hex
-    mac: str  # hex
-    signature: str  # hex
+    token_prefix: bytes
+    mac: bytes
+    signature: bytes
+    trace: Optional[ReportTrace] = field(default=None, compare=False, repr=False)
 
     def to_json(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {
+            "org_id": self.org_id,
+            "receiver_id": self.receiver_id,
+            "timestamp": self.timestamp,
+            "time_slot": self.time_slot,
+            "version": self.version,
+            "flags": self.flags,
+            "token_prefix": self.token_prefix.hex(),
+            "mac": self.mac.hex(),
+            "signature": self.signature.hex(),
+        }
 
 
-def _encode_uint32_be(value: int) -> bytes:
-    if value < 0 or value > 0xFFFFFFFF:
-        raise ValueError(f"encode_uint32_be: value out of range: {value}")
-    return value.to_bytes(4, byteorder="big", signed=False)
+class ReportColumns:
+    """
+    Columnar store for presence reports that share one org_id/receiver_id.
+
+    Each report occupies a fixed 66-byte row in a single bytearray:
+    timestamp(4) | time_slot(4) | version(1) | flags(1) | token_prefix(16) |
+    mac(8) | signature(32). org_id and receiver_id are stored once for the whole
+    store. Released rows are reused, so the buffer only grows to the peak number
+    of live reports.
+    """
+
+    ROW = struct.Struct(">IIBB16s8s32s")
+    _TIMESTAMP = struct.Struct(">I")
+
+    def __init__(self, org_id: str, receiver_id: str) -> None:
+        self.org_id = org_id
+        self.receiver_id = receiver_id
+        self._rows = bytearray()
+        self._free: List[int] = []
+        self._live = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._rows)
+
+    def append(self, report: PresenceReport) -> int:
+        if report.org_id != self.org_id or report.receiver_id != self.receiver_id:
+            raise ValueError("ReportColumns: report belongs to a different org_id/receiver_id")
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._rows) // self.ROW.size
+            self._rows.extend(bytes(self.ROW.size))
+        self.ROW.pack_into(
+            self._rows,
+            row * self.ROW.size,
+            report.timestamp,
+            report.time_slot,
+            report.version,
+            report.flags,
+            report.token_prefix,
+            report.mac,
+            report.signature,
+        )
+        self._live += 1
+        return row
+
+    def append_raw(self, raw: bytes) -> int:
+        """
+        Append a row previously returned by raw() (e.g. read back from disk).
+        """
+        if len(raw) != self.ROW.size:
+            raise ValueError(f"ReportColumns: row must be {self.ROW.size} bytes, got {len(raw)}")
+        if self._free:
+            row = self._free.pop()
+            self._rows[row * self.ROW.size : (row + 1) * self.ROW.size] = raw
+        else:
+            row = len(self._rows) // self.ROW.size
+            self._rows.extend(raw)
+        self._live += 1
+        return row
+
+    def raw(self, row: int) -> bytes:
+        offset = row * self.ROW.size
+        return bytes(self._rows[offset : offset + self.ROW.size])
+
+    def get(self, row: int) -> PresenceReport:
+        timestamp, time_slot, version, flags, token_prefix, mac, signature = self.ROW.unpack_from(
+            self._rows, row * self.ROW.size
+        )
+        return PresenceReport(
+            org_id=self.org_id,
+            receiver_id=self.receiver_id,
+            timestamp=timestamp,
+            time_slot=time_slot,
+            version=version,
+            flags=flags,
+            token_prefix=token_prefix,
+            mac=mac,
+            signature=signature,
+        )
+
+    def timestamp(self, row: int) -> int:
+        return self._TIMESTAMP.unpack_from(self._rows, row * self.ROW.size)[0]
+
+    def release(self, row: int) -> None:
+        self._free.append(row)
+        self._live -= 1
 
 
 def build_presence_report(
@@ -43,49 +163,144 @@ def build_presence_report(
     signature = HMAC-SHA256(receiver_secret,
                  org_id || receiver_id || encode_uint32(time_slot) ||
                  token_prefix || encode_uint32(timestamp))
-    """
-    ts = timestamp if timestamp is not None else int(time.time())
 
-    key = receiver_secret.encode("utf-8")
-    msg = (
-        org_id.encode("utf-8")
-        + receiver_id.encode("utf-8")
-        + _encode_uint32_be(packet.time_slot)
-        + packet.token_prefix
-        + _encode_uint32_be(ts)
+    The pre-keyed ReportSigner is cached per (org_id, receiver_id, receiver_secret);
+    callers holding a ReportSigner can use sign_presence_report() directly.
+    """
+    return sign_presence_report(
+        packet, _cached_signer(org_id, receiver_id, receiver_secret), timestamp
     )
 
-    mac = hmac.new(key, msg, hashlib.sha256).hexdigest()
 
-    return PresenceReport(
-        org_id=org_id,
-        receiver_id=receiver_id,
+@functools.lru_cache(maxsize=8)
+def _cached_signer(org_id: str, receiver_id: str, receiver_secret: str) -> ReportSigner:
+    return ReportSigner(org_id, receiver_id, receiver_secret)
+
+
+def sign_presence_report(
+    packet: BlePacketV2,
+    signer: ReportSigner,
+    timestamp: int | None = None,
+    trace: Optional[ReportTrace] = None,
+) -> PresenceReport:
+    """
+    Build a PresenceReport for packet, signed by a pre-keyed ReportSigner.
+
+    If trace is given, its signed stamp is set and it is attached to the report.
+    """
+    ts = timestamp if timestamp is not None else int(time.time())
+    token_prefix = bytes(packet.token_prefix)
+    report = PresenceReport(
+        org_id=signer.org_id,
+        receiver_id=signer.receiver_id,
         timestamp=ts,
         time_slot=packet.time_slot,
         version=packet.version,
         flags=packet.flags,
-        token_prefix=packet.token_prefix.hex(),
-        mac=packet.mac.hex(),
-        signature=mac,
+        token_prefix=token_prefix,
+        mac=bytes(packet.mac),
+        signature=signer.sign(packet.time_slot, token_prefix, ts),
+        trace=trace,
+    )
+    if trace is not None:
+        trace.signed = time.monotonic()
+    return report
+
+
+def sign_presence_reports(
+    items: Iterable[Tuple[BlePacketV2, int]],
+    signer: ReportSigner,
+    traces: Optional[Sequence[Optional[ReportTrace]]] = None,
+) -> List[PresenceReport]:
+    """
+    Batch variant of sign_presence_report() for (packet, timestamp) pairs, e.g. a
+    closed slot's aggregated observations or one batch of a replayed capture.
+
+    If traces is given (one per item, None to skip), each is stamped once the
+    whole batch is signed and attached to its report.
+    """
+    items = list(items)
+    token_prefixes = [bytes(packet.token_prefix) for packet, _ts in items]
+    signatures = signer.sign_many(
+        (packet.time_slot, token_prefix, ts)
+        for (packet, ts), token_prefix in zip(items, token_prefixes)
     )
+    if traces is None:
+        traces = [None] * len(items)
+    signed = time.monotonic()
+    reports = []
+    for (packet, ts), token_prefix, signature, trace in zip(items, token_prefixes, signatures, traces):
+        if trace is not None:
+            trace.signed = signed
+        reports.append(
+            PresenceReport(
+                org_id=signer.org_id,
+                receiver_id=signer.receiver_id,
+                timestamp=ts,
+                time_slot=packet.time_slot,
+                version=packet.version,
+                flags=packet.flags,
+                token_prefix=token_prefix,
+                mac=bytes(packet.mac),
+                signature=signature,
+                trace=trace,
+            )
+        )
+    return reports
 
 
-async def scan_presence_reports() -> AsyncIterator[PresenceReport]:
+async def scan_presence_reports(signer: Optional[ReportSigner] = None) -> AsyncIterator[PresenceReport]:
     """
     High-level helper that:
 
-    - Scans BLE for HNNP v2 packets (structurally valid, de-duplicated).
+    - Scans BLE (or the replay/synthetic source selected by HNNP_PACKET_SOURCE)
+      for HNNP v2 packets (structurally valid, de-duplicated).
     - Builds a signed presence report for each accepted packet.
 
-    Configuration is loaded via load_receiver_config() from environment and optional config file.
+    With HNNP_AGGREGATE_MODE=first|close, sightings are instead collapsed into one
+    observation per (token_prefix, time_slot) (see aggregator.SlotAggregator) and
+    one report is built per observation, timestamped at its last sighting.
+
+    If HNNP_RSSI_ENTER_DBM is set, sightings first pass through the RSSI proximity
+    gate (see proximity.RssiGate) so far-away devices are never signed or sent.
+
+    Reports are signed a batch at a time (see sign_presence_reports()): one
+    batch per source batch, e.g. a chunk of a replayed capture, or per closed
+    slot when aggregating.
+
+    Every report carries a ReportTrace stamped at receipt, parse and signing; the
+    sender adds the remaining stamps (see tracing.PipelineTracer).
+
+    Reports are signed by signer; the sender passes the one it keeps for its whole
+    run. Without one, a signer is built from load_receiver_config() (environment
+    and optional config file).
     """
-    cfg = load_receiver_config()
-
-    async for packet in scan_hnnp_packets():
-        report = build_presence_report(
-            packet=packet,
-            org_id=cfg.org_id,
-            receiver_id=cfg.receiver_id,
-            receiver_secret=cfg.receiver_secret,
-        )
-        yield report
+    if signer is None:
+        signer = ReportSigner.from_config(load_receiver_config())
+
+    batches = scan_hnnp_sighting_batches(load_packet_source())
+    rssi_gate = load_rssi_gate()
+    if rssi_gate is not None:
+        batches = gate_sighting_batches(batches, rssi_gate)
+
+    aggregate_mode = get_aggregate_mode()
+    if aggregate_mode != EMIT_OFF:
+        async for observations in aggregate_sighting_batches(
+            iter_sightings(batches), emit=aggregate_mode
+        ):
+            for report in sign_presence_reports(
+                [(observation.packet, int(observation.last_seen)) for observation in observations],
+                signer,
+                [ReportTrace(o.received_at, o.parsed_at) for o in observations],
+            ):
+                yield report
+        return
+
+    async for sightings in dedup_sighting_batches(batches):
+        now = int(time.time())
+        for report in sign_presence_reports(
+            [(sighting.packet, now) for sighting in sightings],
+            signer,
+            [ReportTrace(s.received_at, s.parsed_at) for s in sightings],
+        ):
+            yield report
@@ -0,0 +1,223 @@
+import asyncio
+import io
+import os
+import signal
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_PROFILE_INTERVAL = 0.005
+DEFAULT_TRACEMALLOC_FRAMES = 10
+DEFAULT_MAX_ARTIFACTS = 8
+
+
+class DebugToolError(Exception):
+    """A debug tool cannot be started (already running, or unsupported here)."""
+
+
+@dataclass(slots=True)
+class Artifact:
+    name: str
+    kind: str
+    created_at: int
+    content_type: str
+    data: bytes
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "created_at": self.created_at,
+            "bytes": len(self.data),
+        }
+
+
+class ArtifactStore:
+    """
+    The last `max_artifacts` debug results, kept in memory for download.
+    """
+
+    def __init__(self, max_artifacts: int = DEFAULT_MAX_ARTIFACTS) -> None:
+        self.max_artifacts = max(max_artifacts, 1)
+        self._artifacts: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._serial = 0
+
+    def add(self, kind: str, extension: str, data: bytes, content_type: str = "text/plain") -> Artifact:
+        self._serial += 1
+        now = time.time()
+        name = f"{kind}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))}-{self._serial}.{extension}"
+        artifact = Artifact(name, kind, int(now), content_type, data)
+        self._artifacts[name] = artifact
+        while len(self._artifacts) > self.max_artifacts:
+            self._artifacts.popitem(last=False)
+        return artifact
+
+    def get(self, name: str) -> Optional[Artifact]:
+        return self._artifacts.get(name)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [artifact.describe() for artifact in self._artifacts.values()]
+
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler driven by ITIMER_PROF.
+
+    While running, the kernel sends SIGPROF every `interval` seconds of process
+    CPU time; the handler runs on the main thread (the event loop) and counts the
+    Python stack it interrupted. An idle receiver therefore takes almost no
+    samples, and a busy one is sampled in proportion to where CPU goes. Nothing
+    is installed until start(), and stop() restores the previous handler.
+
+    The result is in collapsed-stack format ("outer;inner;leaf count" per line),
+    which flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, interval: float = DEFAULT_PROFILE_INTERVAL) -> None:
+        if not hasattr(signal, "setitimer"):
+            raise DebugToolError("CPU profiling needs setitimer (Linux/macOS)")
+        self.interval = max(interval, 0.001)
+        self.samples: Counter = Counter()
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._labels: Dict[CodeType, str] = {}
+        self._previous_handler: Any = None
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None and self.stopped_at is None
+
+    def start(self) -> None:
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.started_at = time.monotonic()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self.stopped_at = time.monotonic()
+
+    def _sample(self, _signum: int, frame: Optional[FrameType]) -> None:
+        labels = self._labels
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = (
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[";".join(stack)] += 1
+
+    def collapsed(self) -> bytes:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common()).encode()
+
+    def summary(self, limit: int = 10) -> Dict[str, Any]:
+        """
+        Return sample counts, CPU seconds sampled and the top functions by self time.
+        """
+        total = sum(self.samples.values())
+        leaves: Counter = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        end = self.stopped_at if self.stopped_at is not None else time.monotonic()
+        return {
+            "samples": total,
+            "interval_ms": round(self.interval * 1000.0, 3),
+            "wall_s": round(end - (self.started_at or end), 1),
+            "cpu_s": round(total * self.interval, 2),
+            "top_self": [
+                {"function": leaf, "percent": round(count * 100.0 / total, 1)}
+                for leaf, count in leaves.most_common(limit)
+            ],
+        }
+
+
+class AllocationTracer:
+    """
+    tracemalloc session: a baseline snapshot at start, then diffs against it.
+
+    tracemalloc slows allocations down noticeably (and costs memory per
+    traced block), so it only runs between start() and stop().
+    """
+
+    def __init__(self, frames: int = DEFAULT_TRACEMALLOC_FRAMES) -> None:
+        self.frames = min(max(frames, 1), 100)
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.baseline is not None
+
+    def start(self) -> None:
+        if tracemalloc.is_tracing():
+            raise DebugToolError("tracemalloc is already tracing")
+        tracemalloc.start(self.frames)
+        self.started_at = time.monotonic()
+        self.baseline = self._snapshot()
+
+    def stop(self) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.baseline = None
+
+    def diff(self, limit: int = 50, key_type: str = "lineno") -> bytes:
+        """
+        Return the top `limit` allocation sites by growth since start(), as text.
+
+        key_type "traceback" groups by full allocation stack (up to `frames` deep).
+        """
+        if self.baseline is None:
+            raise DebugToolError("tracemalloc is not running")
+        snapshot = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        out = io.StringIO()
+        out.write(
+            f"# tracemalloc diff after {time.monotonic() - (self.started_at or 0.0):.0f} s: "
+            f"traced {current / 1024:.0f} KiB (peak {peak / 1024:.0f} KiB), "
+            f"overhead {tracemalloc.get_tracemalloc_memory() / 1024:.0f} KiB\n"
+        )
+        for stat in snapshot.compare_to(self.baseline, key_type)[:limit]:
+            out.write(f"{stat}\n")
+            if key_type == "traceback":
+                for line in stat.traceback.format():
+                    out.write(f"    {line}\n")
+        return out.getvalue().encode()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            )
+        )
+
+
+def dump_task_stacks() -> bytes:
+    """
+    Return the stacks of all asyncio tasks on the running loop, grouped summary first.
+    """
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    by_coroutine = Counter(
+        getattr(task.get_coro(), "__qualname__", repr(task.get_coro())) for task in tasks
+    )
+    out = io.StringIO()
+    out.write(f"# {len(tasks)} tasks\n")
+    for name, count in by_coroutine.most_common():
+        out.write(f"#   {count:5d}  {name}\n")
+    for task in tasks:
+        out.write("\n")
+        task.print_stack(file=out)
+    return out.getvalue().encode()
@@ -0,0 +1,178 @@
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from .ble_scanner import Sighting
+
+
+logger = logging.getLogger("hnnp.receiver.proximity")
+
+DEFAULT_EXIT_HYSTERESIS_DB = 5
+# Per-token state is kept for the current slot and the MAX_DRIFT_SLOTS neighbours.
+_TRACKED_SLOT_SPAN = 3
+
+DROP_BELOW_ENTER = "below_enter"
+DROP_BELOW_EXIT = "below_exit"
+
+
+@dataclass
+class _TokenState:
+    samples: Deque[int] = field(default_factory=deque)
+    total: int = 0
+    inside: bool = False
+
+
+class RssiGate:
+    """
+    Edge proximity gate: drop sightings of devices that are too far away.
+
+    Each token has a smoothed RSSI (mean of its last smoothing_window samples) and
+    an inside/outside state with hysteresis:
+      - an outside token is admitted once smoothed RSSI >= enter_dbm;
+      - an inside token stays admitted while smoothed RSSI >= exit_dbm.
+
+    exit_dbm is normally a few dB below enter_dbm so a device standing near the
+    threshold does not flap. Sightings without RSSI are passed through.
+    """
+
+    def __init__(self, enter_dbm: int, exit_dbm: int, smoothing_window: int = 1) -> None:
+        if exit_dbm > enter_dbm:
+            raise ValueError(
+                f"RssiGate: exit_dbm ({exit_dbm}) must not be above enter_dbm ({enter_dbm})"
+            )
+        self.enter_dbm = enter_dbm
+        self.exit_dbm = exit_dbm
+        self.smoothing_window = max(smoothing_window, 1)
+        # time_slot -> token_prefix -> state; whole slots are dropped once out of range.
+        self._slots: Dict[int, Dict[bytes, _TokenState]] = {}
+
+        self.admitted = 0
+        self.unmeasured = 0
+        self.drops: Dict[str, int] = {DROP_BELOW_ENTER: 0, DROP_BELOW_EXIT: 0}
+
+    def admit(self, sighting: Sighting) -> bool:
+        rssi = sighting.rssi
+        if rssi is None:
+            self.unmeasured += 1
+            return True
+
+        packet = sighting.packet
+        tokens = self._slots.get(packet.time_slot)
+        if tokens is None:
+            tokens = self._slots[packet.time_slot] = {}
+            self._prune(packet.time_slot)
+
+        key = bytes(packet.token_prefix)
+        state = tokens.get(key)
+        if state is None:
+            state = tokens[key] = _TokenState()
+
+        state.samples.append(rssi)
+        state.total += rssi
+        if len(state.samples) > self.smoothing_window:
+            state.total -= state.samples.popleft()
+        smoothed = state.total / len(state.samples)
+
+        if state.inside:
+            if smoothed >= self.exit_dbm:
+                self.admitted += 1
+                return True
+            state.inside = False
+            self.drops[DROP_BELOW_EXIT] += 1
+            return False
+
+        if smoothed >= self.enter_dbm:
+            state.inside = True
+            self.admitted += 1
+            return True
+        self.drops[DROP_BELOW_ENTER] += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enter_dbm": self.enter_dbm,
+            "exit_dbm": self.exit_dbm,
+            "smoothing_window": self.smoothing_window,
+            "admitted": self.admitted,
+            "unmeasured": self.unmeasured,
+            "drops": dict(self.drops),
+            "tracked_tokens": sum(len(tokens) for tokens in self._slots.values()),
+        }
+
+    def _prune(self, newest_slot: int) -> None:
+        for time_slot in [s for s in self._slots if s < newest_slot - _TRACKED_SLOT_SPAN]:
+            del self._slots[time_slot]
+
+
+_GATE: Optional[RssiGate] = None
+
+
+def _parse_int(name: str, raw: Optional[str]) -> Optional[int]:
+    if raw is None or raw.strip() == "":
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        logger.warning("Invalid %s=%r; ignoring", name, raw)
+        return None
+
+
+def load_rssi_gate() -> Optional[RssiGate]:
+    """
+    Build an RssiGate from the environment, or return None if it is disabled.
+
+    Configuration:
+      - HNNP_RSSI_ENTER_DBM: admit threshold in dBm (unset disables the gate)
+      - HNNP_RSSI_EXIT_DBM: stay-inside threshold (default enter - 5 dB)
+      - HNNP_RSSI_SMOOTHING_WINDOW: samples averaged per token (default 1)
+    """
+    enter_dbm = _parse_int("HNNP_RSSI_ENTER_DBM", os.environ.get("HNNP_RSSI_ENTER_DBM"))
+    if enter_dbm is None:
+        return None
+
+    exit_dbm = _parse_int("HNNP_RSSI_EXIT_DBM", os.environ.get("HNNP_RSSI_EXIT_DBM"))
+    if exit_dbm is None or exit_dbm > enter_dbm:
+        exit_dbm = enter_dbm - DEFAULT_EXIT_HYSTERESIS_DB
+
+    window = _parse_int(
+        "HNNP_RSSI_SMOOTHING_WINDOW", os.environ.get("HNNP_RSSI_SMOOTHING_WINDOW")
+    )
+    return RssiGate(enter_dbm=enter_dbm, exit_dbm=exit_dbm, smoothing_window=window or 1)
+
+
+def get_proximity_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return RSSI gate thresholds and drop counters, or None if the gate is disabled.
+    """
+    return _GATE.stats() if _GATE is not None else None
+
+
+async def gate_sightings(
+    sightings: AsyncIterator[Sighting], gate: RssiGate
+) -> AsyncIterator[Sighting]:
+    """
+    Yield only the sightings admitted by gate.
+    """
+    global _GATE
+    _GATE = gate
+
+    async for sighting in sightings:
+        if gate.admit(sighting):
+            yield sighting
+
+
+async def gate_sighting_batches(
+    batches: AsyncIterator[List[Sighting]], gate: RssiGate
+) -> AsyncIterator[List[Sighting]]:
+    """
+    Batch variant of gate_sightings(); batches left empty are skipped.
+    """
+    global _GATE
+    _GATE = gate
+
+    async for batch in batches:
+        admitted = [sighting for sighting in batch if gate.admit(sighting)]
+        if admitted:
+            yield admitted
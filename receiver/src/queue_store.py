@@ -0,0 +1,171 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger("hnnp.receiver.queue_store")
+
+DEFAULT_COMMIT_INTERVAL_MS = 200
+SYNC_FULL = "full"
+SYNC_NORMAL = "normal"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY,
+    expires_at INTEGER NOT NULL,
+    row BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_expires_at ON reports (expires_at);
+"""
+
+
+class SqliteQueueStore:
+    """
+    Persistent journal for the retry queue, in SQLite with WAL journaling.
+
+    Only two writes exist: add (a report enters the queue) and ack (it was sent,
+    dropped or evicted). Each report is stored as its 66-byte ReportColumns row,
+    keyed by the RetryQueue seq; retry attempts and backoff are not persisted.
+
+    Writes are buffered in memory and committed as one transaction by flush(),
+    which run_sender() calls every HNNP_QUEUE_COMMIT_MS, so many adds/acks share
+    one fsync. sync selects SQLite's synchronous level:
+      - "full": each commit is fsynced; a crash or power loss loses at most the
+        writes buffered since the last commit.
+      - "normal": commits are fsynced only at WAL checkpoints; a power loss may
+        also lose recent commits (a process crash does not).
+    Either way the queue is never corrupted, and a lost ack only means the report
+    is sent again after restart.
+    """
+
+    def __init__(self, path: str, sync: str = SYNC_FULL) -> None:
+        self.path = path
+        self.sync = SYNC_NORMAL if sync == SYNC_NORMAL else SYNC_FULL
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        # Only takes effect on a new file; lets recover() return freed pages to the OS.
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={self.sync.upper()}")
+        self._conn.executescript(_SCHEMA)
+        # flush() may run on a worker thread; serialize it with recover()/close().
+        self._lock = threading.Lock()
+        self._adds: List[Tuple[int, int, bytes]] = []
+        self._acks: List[Tuple[int]] = []
+
+        self.commits = 0
+        self.written = 0
+        self.recovered = 0
+        self.expired_on_recovery = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._adds) + len(self._acks)
+
+    def add(self, seq: int, expires_at: int, row: bytes) -> None:
+        self._adds.append((seq, expires_at, row))
+
+    def ack(self, seq: int) -> None:
+        self._acks.append((seq,))
+
+    def take_pending(self) -> Tuple[List[Tuple[int, int, bytes]], List[Tuple[int]]]:
+        """
+        Hand over the buffered writes (for flush() on a worker thread).
+        """
+        adds, acks = self._adds, self._acks
+        self._adds, self._acks = [], []
+        return adds, acks
+
+    def requeue(self, pending: Tuple[List[Tuple[int, int, bytes]], List[Tuple[int]]]) -> None:
+        """
+        Put writes taken by take_pending() back in front of the buffer after a
+        failed flush(), so the next commit includes them.
+        """
+        adds, acks = pending
+        self._adds[:0] = adds
+        self._acks[:0] = acks
+
+    def flush(
+        self,
+        pending: Optional[Tuple[List[Tuple[int, int, bytes]], List[Tuple[int]]]] = None,
+    ) -> int:
+        """
+        Commit buffered adds and acks in one transaction; return the number of writes.
+
+        Adds go first, so an add and its ack in the same batch cancel out.
+        """
+        adds, acks = pending if pending is not None else self.take_pending()
+        if not adds and not acks:
+            return 0
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO reports VALUES (?, ?, ?)", adds)
+                conn.executemany("DELETE FROM reports WHERE seq = ?", acks)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.commits += 1
+        self.written += len(adds) + len(acks)
+        return len(adds) + len(acks)
+
+    def recover(
+        self, org_id: str, receiver_id: str, now: int
+    ) -> Tuple[int, List[Tuple[int, bytes]]]:
+        """
+        Compact and load the persisted queue.
+
+        Deletes reports that expired (expires_at = timestamp + max skew <= now) and reclaims their
+        space, then returns (expired_count, [(seq, row), ...]) in queue order. A queue
+        written for a different org_id/receiver_id is discarded, since its rows do not
+        carry those fields.
+        """
+        with self._lock:
+            conn = self._conn
+            identity = f"{org_id}\n{receiver_id}"
+            stored = conn.execute("SELECT value FROM meta WHERE key = 'identity'").fetchone()
+            if stored is not None and stored[0] != identity:
+                logger.warning(
+                    "Persistent queue belongs to another org_id/receiver_id; discarding it"
+                )
+                conn.execute("DELETE FROM reports")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('identity', ?)", (identity,))
+
+            expired = conn.execute("DELETE FROM reports WHERE expires_at <= ?", (now,)).rowcount
+            if expired:
+                conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            rows = conn.execute("SELECT seq, row FROM reports ORDER BY seq").fetchall()
+        self.recovered = len(rows)
+        self.expired_on_recovery = expired
+        return expired, rows
+
+    def size_bytes(self) -> int:
+        total = 0
+        for suffix in ("", "-wal"):
+            try:
+                total += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "sync": self.sync,
+            "pending_writes": self.pending,
+            "commits": self.commits,
+            "written": self.written,
+            "recovered": self.recovered,
+            "expired_on_recovery": self.expired_on_recovery,
+            "size_bytes": self.size_bytes(),
+        }
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,130 @@
+import asyncio
+import email.utils
+import time
+from typing import Any, Dict, Optional
+
+
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_BURST = 10
+# Multiplicative decrease on 429; additive increase of INCREASE_PER_SECOND req/s
+# for every second's worth of successful requests.
+DECREASE_FACTOR = 0.5
+INCREASE_PER_SECOND = 1.0
+# Retry-After values above this are clamped (a broken header must not stall sending for days).
+MAX_RETRY_AFTER_SECONDS = 600.0
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Parse a Retry-After header (delay-seconds or HTTP-date) into seconds from now.
+
+    Returns None if the header is missing or malformed.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER_SECONDS)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = time.time() if now is None else now
+    return min(max(when.timestamp() - now, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+class RateShaper:
+    """
+    Token-bucket shaper for outbound Cloud requests, adapted from 429 responses.
+
+    Every request (single report or batch) takes one token; tokens refill at
+    `rate` per second up to `burst`. On a 429 the rate is halved (not below
+    min_rate; 429s arriving during the resulting pause do not halve it again) and
+    sending pauses until Retry-After has passed; each success adds
+    INCREASE_PER_SECOND / rate, i.e. about +1 req/s per second of successful
+    traffic, up to max_rate (AIMD).
+    """
+
+    def __init__(
+        self,
+        max_rate: float = DEFAULT_MAX_RATE,
+        min_rate: float = DEFAULT_MIN_RATE,
+        burst: int = DEFAULT_BURST,
+    ) -> None:
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = max(burst, 1)
+        self.rate = max_rate
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+
+        self.throttled = 0
+        self.deferred = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def resume_at(self) -> float:
+        """
+        Unix time at which a Retry-After pause ends (now if not paused).
+        """
+        return time.time() + max(self._paused_until - time.monotonic(), 0.0)
+
+    async def acquire(self, headroom: int = 0) -> None:
+        """
+        Wait for a token (and for any Retry-After pause to end).
+
+        With headroom > 0 the token is only taken once headroom more are left in
+        the bucket, so lower-priority callers leave tokens for everyone else.
+        """
+        started = time.monotonic()
+        needed = 1.0 + min(max(headroom, 0), self.burst - 1)
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= needed:
+                self._tokens -= 1.0
+                break
+            await asyncio.sleep((needed - self._tokens) / self.rate)
+        self.wait_seconds += time.monotonic() - started
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            self.rate = min(self.rate + INCREASE_PER_SECOND / self.rate, self.max_rate)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        """
+        Record a 429: back off the rate and pause for Retry-After (default 1 s).
+        """
+        self.throttled += 1
+        now = time.monotonic()
+        self._refill(now)
+        if now >= self._paused_until:
+            # Requests already in flight when the first 429 arrived get 429s too;
+            # back off once per throttling episode, not once per response.
+            self.rate = max(self.rate * DECREASE_FACTOR, self.min_rate)
+        self._tokens = min(self._tokens, 1.0)
+        delay = DEFAULT_RETRY_AFTER_SECONDS if retry_after is None else retry_after
+        self._paused_until = max(self._paused_until, now + delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_s": round(self.rate, 3),
+            "max_rate_per_s": self.max_rate,
+            "burst": self.burst,
+            "paused_for_s": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "throttled": self.throttled,
+            "deferred_reports": self.deferred,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._tokens + (now - self._refilled_at) * self.rate, float(self.burst))
+        self._refilled_at = now
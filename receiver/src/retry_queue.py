@@ -0,0 +1,246 @@
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .presence_report import PresenceReport, ReportColumns
+from .queue_store import SqliteQueueStore
+
+
+@dataclass(slots=True)
+class QueuedReport:
+    """
+    Retry-queue entry. The report itself lives in a row of a ReportColumns store.
+    """
+
+    store: ReportColumns
+    row: int
+    first_seen: int
+    attempts: int
+    next_retry_at: float
+    backoff: float = 0.0
+    seq: int = field(default=0, compare=False)
+
+    @property
+    def report(self) -> PresenceReport:
+        return self.store.get(self.row)
+
+    @property
+    def timestamp(self) -> int:
+        return self.store.timestamp(self.row)
+
+
+EVICT_EXPIRING = "expiring"
+EVICT_OLDEST = "oldest"
+
+
+class RetryQueue:
+    """
+    Reports waiting for a retry, indexed by heaps instead of scanned as a list.
+
+    - _due: (next_retry_at, seq) -> the retry loop only looks at items that are due.
+    - _expiring: (expires_at, seq, next_retry_at) for items that will pass
+      max_skew_seconds before their next retry; they are evicted first when the
+      queue is full.
+    - _by_expiry: (expires_at, seq) -> otherwise the oldest report is evicted.
+
+    expires_at is report.timestamp + max_skew_seconds. Heap entries are deleted
+    lazily: an entry is valid only while its item is waiting (not checked out by
+    pop_due()) and, for _due and _expiring, its next_retry_at still matches. Stale entries are
+    skipped when popped, and the heaps are rebuilt once stale entries dominate.
+
+    Items handed out by pop_due() are "in flight": they still count towards
+    len() and max_size, but cannot be evicted until they are rescheduled.
+
+    With a journal (SqliteQueueStore), every report entering the queue is recorded
+    and every report leaving it (sent, dropped or evicted) is acked, keyed by seq.
+
+    on_evict(item, reason) is called for every evicted item before its store row
+    is released, so it can still read item.report.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 0,
+        max_skew_seconds: int = 120,
+        journal: Optional[SqliteQueueStore] = None,
+        on_evict: Optional[Callable[[QueuedReport, str], None]] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.max_skew_seconds = max_skew_seconds
+        self.journal = journal
+        self.on_evict = on_evict
+        self._waiting: Dict[int, QueuedReport] = {}
+        self._in_flight = 0
+        self._due: List[Tuple[float, int]] = []
+        self._expiring: List[Tuple[int, int, float]] = []
+        self._by_expiry: List[Tuple[int, int]] = []
+        self._seq = itertools.count(1)
+        self._wakeup = asyncio.Event()
+
+        self.evictions: Dict[str, int] = {EVICT_EXPIRING: 0, EVICT_OLDEST: 0}
+
+    def __len__(self) -> int:
+        return len(self._waiting) + self._in_flight
+
+    def push(self, item: QueuedReport) -> Optional[QueuedReport]:
+        """
+        Add a new item. If the queue is full, evict one first and return it (its
+        store row is already released).
+        """
+        evicted = None
+        if self.max_size > 0 and len(self) >= self.max_size:
+            evicted = self._evict()
+        item.seq = next(self._seq)
+        if self.journal is not None:
+            self.journal.add(
+                item.seq, item.timestamp + self.max_skew_seconds, item.store.raw(item.row)
+            )
+        self._schedule(item)
+        return evicted
+
+    def restore(self, items: Iterable[QueuedReport]) -> int:
+        """
+        Re-queue items recovered from the journal, keeping their seq (already persisted).
+
+        max_size applies as for push(): if more items were persisted than fit
+        (e.g. MAX_QUEUE_SIZE was lowered), the surplus is evicted by the usual
+        policy. Returns the number of items evicted.
+        """
+        last_seq = 0
+        for item in items:
+            last_seq = max(last_seq, item.seq)
+            self._schedule(item)
+        if last_seq:
+            self._seq = itertools.count(max(last_seq + 1, next(self._seq)))
+        evicted = 0
+        while self.max_size > 0 and len(self) > self.max_size and self._evict() is not None:
+            evicted += 1
+        return evicted
+
+    def reschedule(self, item: QueuedReport) -> None:
+        """
+        Put an in-flight item back after a failed attempt (next_retry_at updated).
+        """
+        self._in_flight -= 1
+        self._schedule(item)
+
+    def discard(self, item: QueuedReport) -> None:
+        """
+        Finish an in-flight item (sent or dropped) and release its store row.
+        """
+        self._in_flight -= 1
+        self._forget(item)
+
+    def pop_due(self, now: float, limit: int = 0) -> List[QueuedReport]:
+        """
+        Check out every item with next_retry_at <= now, earliest first (at most
+        `limit` items if limit > 0; the rest stay due).
+        """
+        due: List[QueuedReport] = []
+        heap = self._due
+        while heap and heap[0][0] <= now and (limit <= 0 or len(due) < limit):
+            next_retry_at, seq = heapq.heappop(heap)
+            item = self._waiting.get(seq)
+            if item is None or item.next_retry_at != next_retry_at:
+                continue
+            del self._waiting[seq]
+            due.append(item)
+        self._in_flight += len(due)
+        return due
+
+    def next_due_at(self) -> Optional[float]:
+        heap = self._due
+        while heap:
+            next_retry_at, seq = heap[0]
+            item = self._waiting.get(seq)
+            if item is not None and item.next_retry_at == next_retry_at:
+                return next_retry_at
+            heapq.heappop(heap)
+        return None
+
+    async def wait(self, now: float, max_wait: float) -> None:
+        """
+        Sleep until the earliest item is due (at most max_wait), or until an item
+        that is due earlier than that is scheduled.
+        """
+        next_due_at = self.next_due_at()
+        timeout = max_wait if next_due_at is None else min(max(next_due_at - now, 0.0), max_wait)
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self),
+            "in_flight": self._in_flight,
+            "max_size": self.max_size,
+            "next_due_at": self.next_due_at(),
+            "evictions": dict(self.evictions),
+            "heap_entries": len(self._due) + len(self._expiring) + len(self._by_expiry),
+            "journal": self.journal.stats() if self.journal is not None else None,
+        }
+
+    def _schedule(self, item: QueuedReport) -> None:
+        seq = item.seq
+        expires_at = item.timestamp + self.max_skew_seconds
+        head = self._due[0][0] if self._due else None
+
+        self._waiting[seq] = item
+        heapq.heappush(self._due, (item.next_retry_at, seq))
+        heapq.heappush(self._by_expiry, (expires_at, seq))
+        if expires_at <= item.next_retry_at:
+            heapq.heappush(self._expiring, (expires_at, seq, item.next_retry_at))
+
+        if head is None or item.next_retry_at < head:
+            self._wakeup.set()
+        self._maybe_compact()
+
+    def _evict(self) -> Optional[QueuedReport]:
+        expiring = self._expiring
+        while expiring:
+            _expires_at, seq, next_retry_at = heapq.heappop(expiring)
+            item = self._waiting.get(seq)
+            # Rescheduled since this entry was pushed: it may no longer expire first.
+            if item is not None and item.next_retry_at == next_retry_at:
+                return self._evict_item(item, EVICT_EXPIRING)
+        by_expiry = self._by_expiry
+        while by_expiry:
+            _expires_at, seq = heapq.heappop(by_expiry)
+            item = self._waiting.get(seq)
+            if item is not None:
+                return self._evict_item(item, EVICT_OLDEST)
+        # Everything is in flight; let the queue grow by one rather than lose the new report.
+        return None
+
+    def _evict_item(self, item: QueuedReport, reason: str) -> QueuedReport:
+        del self._waiting[item.seq]
+        self.evictions[reason] += 1
+        if self.on_evict is not None:
+            self.on_evict(item, reason)
+        self._forget(item)
+        return item
+
+    def _forget(self, item: QueuedReport) -> None:
+        item.store.release(item.row)
+        if self.journal is not None:
+            self.journal.ack(item.seq)
+
+    def _maybe_compact(self) -> None:
+        live = len(self._waiting)
+        if len(self._due) + len(self._by_expiry) + len(self._expiring) <= 4 * live + 64:
+            return
+        waiting = self._waiting
+        self._due = [(item.next_retry_at, seq) for seq, item in waiting.items()]
+        self._by_expiry = []
+        self._expiring = []
+        for seq, item in waiting.items():
+            expires_at = item.timestamp + self.max_skew_seconds
+            self._by_expiry.append((expires_at, seq))
+            if expires_at <= item.next_retry_at:
+                self._expiring.append((expires_at, seq, item.next_retry_at))
+        for heap in (self._due, self._by_expiry, self._expiring):
+            heapq.heapify(heap)
@@ -1,8 +1,7 @@
 import asyncio
 import logging
 import time
-from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
     import aiohttp  # type: ignore
@@ -10,23 +9,86 @@ except ImportError:  # pragma: no cover - aiohttp may not be installed everywher
     aiohttp = None  # type: ignore
 
 from .config_loader import load_receiver_config
-from .presence_report import PresenceReport, scan_presence_reports
+from .presence_report import PresenceReport, ReportColumns, scan_presence_reports
+from .flow_control import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    DEFAULT_COOLDOWN_SECONDS,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_LIVE_RESERVED,
+    LANE_LIVE,
+    LANE_RETRY,
+    RETRY_BASE_SECONDS,
+    AdaptiveConcurrency,
+    CircuitBreaker,
+    CircuitOpenError,
+    decorrelated_jitter,
+)
+from .http_client import (
+    ConnectionStats,
+    create_session,
+    keep_warm,
+    load_http_settings,
+    prewarm,
+)
+from .latency_stats import LatencyWindow
+from .liveness import LOOP_RETRY, LOOP_SEND, admission_wait, heartbeat
+from .queue_store import DEFAULT_COMMIT_INTERVAL_MS, SqliteQueueStore
+from .rate_shaper import (
+    DEFAULT_BURST,
+    DEFAULT_MAX_RATE,
+    DEFAULT_MIN_RATE,
+    RateShaper,
+    parse_retry_after,
+)
+from .retry_queue import QueuedReport, RetryQueue
+from .serializer import ReportSerializer, load_serializer
+from .signer import ReportSigner
+from .tracing import PipelineTracer, load_tracer
 
 
 logger = logging.getLogger("hnnp.receiver.sender")
 
 
-@dataclass
-class QueuedReport:
-    report: PresenceReport
-    first_seen: int
-    attempts: int
-    next_retry_at: float
-
-
-# Global queue to allow health/status reporting.
-QUEUE: List[QueuedReport] = []
+# Global retry queue to allow health/status reporting; replaced by run_sender().
+QUEUE = RetryQueue()
 _LAST_SCAN_AT: Optional[int] = None
+_SHAPER: Optional[RateShaper] = None
+_BREAKER: Optional[CircuitBreaker] = None
+_LIMITER: Optional[AdaptiveConcurrency] = None
+_SERIALIZER: Optional[ReportSerializer] = None
+_CONNECTIONS: Optional[ConnectionStats] = None
+_TRACER: Optional[PipelineTracer] = None
+# Per-lane upload latency: waiting for send budget plus the HTTP round trip.
+_LANE_LATENCY: Dict[str, LatencyWindow] = {LANE_LIVE: LatencyWindow(), LANE_RETRY: LatencyWindow()}
+
+DEFAULT_SEND_WORKERS = 4
+DEFAULT_SEND_QUEUE_SIZE = 1024
+DEFAULT_MAX_IN_FLIGHT = 8
+
+UPLOAD_SINGLE = "single"
+UPLOAD_BATCH = "batch"
+DEFAULT_BATCH_MAX_REPORTS = 100
+DEFAULT_BATCH_MAX_DELAY_MS = 250
+
+# Scan -> send pipeline counters, exposed on /health.
+_SEND_STATS: Dict[str, Any] = {
+    "workers": 0,
+    "max_in_flight": 0,
+    "in_flight": 0,
+    "send_queue_size": 0,
+    "send_queue_depth": 0,
+    "send_queue_overflows": 0,
+    "max_send_queue_delay_ms": 0.0,
+    "reports_signed": 0,
+    "reports_sent": 0,
+    "upload_mode": UPLOAD_SINGLE,
+    "batches_sent": 0,
+    # HTTP outcomes per request (a batch counts once).
+    "responses": {"2xx": 0, "429": 0, "4xx": 0, "5xx": 0, "other": 0, "network_error": 0},
+    # Reports given up on, by reason (queue evictions are under retry.evictions).
+    "dropped": {"stale": 0, "max_attempts": 0, "rejected": 0},
+}
 
 
 def _get_max_skew_seconds() -> int:
@@ -40,10 +102,172 @@ def _get_max_skew_seconds() -> int:
     return max(value, 0)
 
 
+def _get_positive_int(name: str, default: int) -> int:
+    import os
+
+    raw = os.environ.get(name, str(default))
+    try:
+        value = int(raw)
+    except ValueError:
+        value = default
+    return max(value, 1)
+
+
+def _get_non_negative_int(name: str, default: int) -> int:
+    import os
+
+    raw = os.environ.get(name, str(default))
+    try:
+        value = int(raw)
+    except ValueError:
+        value = default
+    return max(value, 0)
+
+
+def _get_positive_float(name: str, default: float) -> float:
+    import os
+
+    raw = os.environ.get(name, str(default))
+    try:
+        value = float(raw)
+    except ValueError:
+        value = default
+    return value if value > 0 else default
+
+
+def _get_upload_mode() -> str:
+    import os
+
+    mode = os.environ.get("HNNP_UPLOAD_MODE", UPLOAD_SINGLE).strip().lower()
+    return UPLOAD_BATCH if mode == UPLOAD_BATCH else UPLOAD_SINGLE
+
+
+def _open_queue_journal() -> Optional[SqliteQueueStore]:
+    """
+    Open the persistent retry queue at HNNP_QUEUE_PATH, or return None (memory only).
+    """
+    import os
+
+    path = os.environ.get("HNNP_QUEUE_PATH", "").strip()
+    if not path:
+        return None
+    return SqliteQueueStore(path, sync=os.environ.get("HNNP_QUEUE_SYNC", "full").strip().lower())
+
+
+def _recover_queue(
+    queue: RetryQueue, journal: SqliteQueueStore, store: ReportColumns, now: int
+) -> None:
+    """
+    Load reports persisted by a previous run.
+
+    They are scheduled like newly queued reports (first retry after a jittered
+    backoff), so a restart does not make the whole backlog due at once, and the
+    queue's max_size applies.
+    """
+    started = time.monotonic()
+    expired, rows = journal.recover(store.org_id, store.receiver_id, now)
+    items = []
+    for seq, raw in rows:
+        backoff = decorrelated_jitter(RETRY_BASE_SECONDS)
+        items.append(
+            QueuedReport(
+                store=store,
+                row=store.append_raw(raw),
+                first_seen=now,
+                attempts=1,
+                next_retry_at=now + backoff,
+                backoff=backoff,
+                seq=seq,
+            )
+        )
+    evicted = queue.restore(items)
+    logger.info(
+        "Recovered %s queued presence reports from %s (%s expired, %s evicted, %.0f ms)",
+        len(rows),
+        journal.path,
+        expired,
+        evicted,
+        (time.monotonic() - started) * 1000.0,
+    )
+
+
 def get_queue_size() -> int:
     return len(QUEUE)
 
 
+def get_retry_stats() -> Dict[str, Any]:
+    """
+    Return retry queue size, eviction counters by reason and the next due time.
+    """
+    return QUEUE.stats()
+
+
+def get_shaping_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return the outbound rate shaper's current rate, pause and throttle counters.
+    """
+    return _SHAPER.stats() if _SHAPER is not None else None
+
+
+def get_upload_control_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return circuit breaker state, the adaptive concurrency limit and per-lane
+    (live/retry) upload latency percentiles.
+    """
+    if _BREAKER is None or _LIMITER is None:
+        return None
+    return {
+        "breaker": _BREAKER.stats(),
+        "concurrency": _LIMITER.stats(),
+        "lanes": {lane: window.stats() for lane, window in _LANE_LATENCY.items()},
+    }
+
+
+def get_connection_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return Cloud connection pool reuse, connect time, DNS cache and ping counters.
+    """
+    return _CONNECTIONS.stats() if _CONNECTIONS is not None else None
+
+
+def get_latency_histograms() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the per-lane upload latency histograms (cumulative buckets, sum, count).
+    """
+    return {lane: window.histogram() for lane, window in _LANE_LATENCY.items()}
+
+
+def get_trace_stats() -> Optional[Dict[str, Any]]:
+    """
+    Return rolling per-stage latency (scan, build, queue, admission, http, total)
+    of reports acknowledged by Cloud, and sampled trace log counters.
+    """
+    return _TRACER.stats() if _TRACER is not None else None
+
+
+def get_stage_histograms() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the per-stage latency histograms (cumulative buckets, sum, count).
+    """
+    return _TRACER.histograms() if _TRACER is not None else {}
+
+
+def get_send_stats() -> Dict[str, Any]:
+    """
+    Return scan -> send backpressure counters.
+
+    send_queue_depth is the number of reports waiting for a sender worker;
+    send_queue_overflows counts reports diverted to the retry queue because the
+    send queue was full; max_send_queue_delay_ms is the longest time a report
+    waited for a worker. responses counts HTTP outcomes by status class, dropped
+    counts reports given up on (stale, max_attempts, rejected by Cloud).
+    serialization has the request body encoder and compression counters.
+    """
+    stats = dict(_SEND_STATS)
+    stats["serialization"] = _SERIALIZER.stats() if _SERIALIZER is not None else None
+    return stats
+
+
 def get_last_scan_at() -> Optional[int]:
     """
     Return the unix timestamp (seconds) of the last presence report
@@ -56,25 +280,85 @@ async def _post_presence(
     session: "aiohttp.ClientSession",
     base_url: str,
     report: PresenceReport,
-) -> int:
+    serializer: ReportSerializer,
+) -> Tuple[int, Optional[float]]:
     """
     Send a single presence report to Cloud via POST /v2/presence.
 
-    Returns the HTTP status code. Caller decides how to handle failures.
+    Returns the HTTP status code and, for 429 responses, the Retry-After delay in
+    seconds (None if absent). Caller decides how to handle failures.
     """
     url = f"{base_url}/v2/presence"
-    async with session.post(url, json=report.to_json(), timeout=10) as resp:
-        return resp.status
+    if report.trace is not None:
+        report.trace.sent = time.monotonic()
+    body, headers = serializer.report(report)
+    async with session.post(url, data=body, headers=headers) as resp:
+        return resp.status, _retry_after(resp)
+
+
+def _retry_after(resp: Any) -> Optional[float]:
+    if resp.status != 429:
+        return None
+    return parse_retry_after(resp.headers.get("Retry-After"))
+
+
+async def _post_presence_batch(
+    session: "aiohttp.ClientSession",
+    base_url: str,
+    reports: List[PresenceReport],
+    serializer: ReportSerializer,
+) -> Tuple[int, Optional[float]]:
+    """
+    Send several presence reports in one request via POST /v2/presence/batch.
+
+    Body: {"reports": [<report JSON>, ...]}, gzip/deflate compressed if
+    HNNP_UPLOAD_COMPRESSION is set. The status applies to the whole batch.
+    """
+    url = f"{base_url}/v2/presence/batch"
+    sent = time.monotonic()
+    for report in reports:
+        if report.trace is not None:
+            report.trace.sent = sent
+    body, headers = serializer.batch(reports)
+    async with session.post(url, data=body, headers=headers) as resp:
+        return resp.status, _retry_after(resp)
 
 
 async def run_sender() -> None:
     """
     High-level receiver loop:
 
-    - Consumes signed PresenceReport instances from scan_presence_reports().
-    - Sends them to Cloud via POST /v2/presence.
-    - On network/5xx failures, enqueues reports in-memory and retries with backoff.
+    - Consumes signed PresenceReport instances from scan_presence_reports() and
+      hands them to a bounded send queue without waiting for HTTP.
+    - A pool of HNNP_SEND_WORKERS senders sends them to Cloud via POST /v2/presence,
+      with at most HNNP_MAX_IN_FLIGHT requests (live + retry) outstanding.
+    - If the send queue (HNNP_SEND_QUEUE_SIZE) is full, reports go straight to the
+      retry queue, so scanning never waits on Cloud.
+    - With HNNP_UPLOAD_MODE=batch, reports are grouped and sent via
+      POST /v2/presence/batch once HNNP_BATCH_MAX_REPORTS are buffered or the oldest
+      has waited HNNP_BATCH_MAX_DELAY_MS; if Cloud answers 404/405 the sender
+      falls back to single POSTs for the rest of the run.
+    - Requests pass through a token-bucket RateShaper (HNNP_SEND_RATE_MAX req/s).
+      A 429 halves the rate, pauses sending for Retry-After, and defers the
+      report(s) to the retry queue instead of dropping them.
+    - Requests go through a circuit breaker (opened by HNNP_BREAKER_FAILURES
+      consecutive network/5xx failures; reports are deferred while it is open) and
+      an AIMD concurrency limit (up to HNNP_MAX_IN_FLIGHT) that shrinks on 5xx and
+      latency spikes. Live reports get HNNP_LIVE_RESERVED_SLOTS of that limit to
+      themselves and are served before retries; the retry backlog uses the rest.
+    - On network/5xx failures, enqueues reports in-memory and retries with
+      decorrelated-jitter backoff.
+      With HNNP_QUEUE_PATH set, the retry queue is also journaled to SQLite and
+      reports left over from a previous run are recovered at startup.
+    - Request bodies are encoded straight to bytes by a ReportSerializer
+      (HNNP_JSON_ENCODER); batches can be compressed (HNNP_UPLOAD_COMPRESSION).
+    - Connections come from a keep-alive pool (see http_client.py): pre-warmed at
+      startup, kept warm with idle pings, DNS cached, split connect/read timeouts.
+    - Reports accepted on their first attempt complete their ReportTrace, feeding
+      rolling per-stage latency and the sampled trace log (see tracing.py).
     - Drops events older than max_skew_seconds.
+    - Send workers and retries report progress on the "send" and "retry"
+      heartbeats, which /health/live uses to detect a stalled loop.
 
     No secrets or full MACs are logged; only high-level status.
     """
@@ -87,16 +371,127 @@ async def run_sender() -> None:
     max_retry_attempts = cfg.max_retry_attempts
     max_queue_size = cfg.max_queue_size
 
-    queue = QUEUE
+    global QUEUE, _SHAPER, _BREAKER, _LIMITER, _SERIALIZER, _CONNECTIONS, _TRACER
+    serializer = _SERIALIZER = load_serializer()
+    tracer = _TRACER = load_tracer()
+    shaper = _SHAPER = RateShaper(
+        max_rate=_get_positive_float("HNNP_SEND_RATE_MAX", DEFAULT_MAX_RATE),
+        min_rate=_get_positive_float("HNNP_SEND_RATE_MIN", DEFAULT_MIN_RATE),
+        burst=_get_positive_int("HNNP_SEND_BURST", DEFAULT_BURST),
+    )
+    signer = ReportSigner.from_config(cfg)
+    store = ReportColumns(cfg.org_id, cfg.receiver_id)
+    journal = _open_queue_journal()
+    queue = QUEUE = RetryQueue(
+        max_size=max_queue_size,
+        max_skew_seconds=max_skew_seconds,
+        journal=journal,
+        on_evict=lambda item, reason: _log_eviction(item, reason, max_queue_size),
+    )
+    if journal is not None:
+        _recover_queue(queue, journal, store, int(time.time()))
+    commit_interval = (
+        _get_positive_int("HNNP_QUEUE_COMMIT_MS", DEFAULT_COMMIT_INTERVAL_MS) / 1000.0
+    )
+
+    send_workers = _get_positive_int("HNNP_SEND_WORKERS", DEFAULT_SEND_WORKERS)
+    send_queue_size = _get_positive_int("HNNP_SEND_QUEUE_SIZE", DEFAULT_SEND_QUEUE_SIZE)
+    max_in_flight = _get_positive_int("HNNP_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)
+    send_queue: "asyncio.Queue[Tuple[PresenceReport, float]]" = asyncio.Queue(
+        maxsize=send_queue_size
+    )
+    limiter = _LIMITER = AdaptiveConcurrency(
+        max_in_flight,
+        reserved_live=_get_non_negative_int("HNNP_LIVE_RESERVED_SLOTS", DEFAULT_LIVE_RESERVED),
+    )
+    lane_latency = _LANE_LATENCY
+    responses = _SEND_STATS["responses"]
+    dropped = _SEND_STATS["dropped"]
+    breaker = _BREAKER = CircuitBreaker(
+        failure_threshold=_get_positive_int("HNNP_BREAKER_FAILURES", DEFAULT_FAILURE_THRESHOLD),
+        cooldown_seconds=_get_positive_float("HNNP_BREAKER_COOLDOWN_SECONDS", DEFAULT_COOLDOWN_SECONDS),
+    )
+    upload_mode = _get_upload_mode()
+    batch_max_reports = _get_positive_int("HNNP_BATCH_MAX_REPORTS", DEFAULT_BATCH_MAX_REPORTS)
+    batch_max_delay = (
+        _get_positive_int("HNNP_BATCH_MAX_DELAY_MS", DEFAULT_BATCH_MAX_DELAY_MS) / 1000.0
+    )
+    batch_queue: "asyncio.Queue[List[PresenceReport]]" = asyncio.Queue(maxsize=send_workers)
+    http_settings = load_http_settings(max_in_flight)
+    connections = _CONNECTIONS = ConnectionStats()
+    send_beat = heartbeat(LOOP_SEND)
+    retry_beat = heartbeat(LOOP_RETRY)
+    stats = _SEND_STATS
+    stats.update(
+        workers=send_workers,
+        max_in_flight=max_in_flight,
+        send_queue_size=send_queue_size,
+        upload_mode=upload_mode,
+    )
+
+    async with create_session(http_settings, connections, base_url) as session:
+        async def guarded(send: Any, lane: str) -> int:
+            # breaker -> rate shaper -> adaptive concurrency -> HTTP. Network errors
+            # and 5xx count as failures for both the breaker and the limiter. Retries
+            # leave a token in the bucket and reserved slots free for live reports.
+            # Only requests that were actually sent count for the breaker; one
+            # cancelled while waiting for budget hands back its probe, if any.
+            if not breaker.allow():
+                raise CircuitOpenError(time.time() + max(breaker.defer_seconds(), 1.0))
+            probe = breaker.state == BREAKER_HALF_OPEN
+            ok = False
+            outcome: Optional[bool] = None
+            latency: Optional[float] = None
+            acquired = False
+            queued_at = time.monotonic()
+            try:
+                with admission_wait():
+                    await shaper.acquire(headroom=0 if lane == LANE_LIVE else 1)
+                    await limiter.acquire(lane)
+                acquired = True
+                stats["in_flight"] += 1
+                started = time.monotonic()
+                try:
+                    status, retry_after = await send()
+                except Exception:
+                    responses["network_error"] += 1
+                    outcome = False
+                    raise
+                responses[_status_class(status)] += 1
+                latency = time.monotonic() - started
+                lane_latency[lane].record(time.monotonic() - queued_at)
+                ok = outcome = status < 500
+                return _shape(shaper, status, retry_after)
+            finally:
+                if acquired:
+                    stats["in_flight"] -= 1
+                    limiter.release(latency, ok, lane)
+                if outcome is None:
+                    breaker.abandon(probe)
+                elif outcome:
+                    breaker.record_success(probe)
+                else:
+                    breaker.record_failure(probe)
+
+        async def post(report: PresenceReport, lane: str = LANE_LIVE) -> int:
+            return await guarded(lambda: _post_presence(session, base_url, report, serializer), lane)
+
+        async def post_batch(reports: List[PresenceReport]) -> int:
+            return await guarded(
+                lambda: _post_presence_batch(session, base_url, reports, serializer), LANE_LIVE
+            )
+
+        def defer(report: PresenceReport, now: int) -> None:
+            # Throttled, not rejected: retry once the Retry-After pause is over.
+            shaper.deferred += 1
+            _enqueue_report(queue, store, report, now, next_retry_at=shaper.resume_at)
 
-    async with aiohttp.ClientSession() as session:  # type: ignore[arg-type]
         async def handle_report(report: PresenceReport) -> None:
             now = int(time.time())
-            global _LAST_SCAN_AT
-            _LAST_SCAN_AT = now
 
             # Drop events older than allowed skew.
             if now - report.timestamp > max_skew_seconds:
+                dropped["stale"] += 1
                 logger.info(
                     "Dropping stale presence event (age=%ss, time_slot=%s)",
                     now - report.timestamp,
@@ -106,7 +501,10 @@ async def run_sender() -> None:
 
             status: Optional[int] = None
             try:
-                status = await _post_presence(session, base_url, report)
+                status = await post(report)
+            except CircuitOpenError as exc:
+                _enqueue_report(queue, store, report, now, next_retry_at=exc.retry_at)
+                return
             except Exception as exc:
                 # Network-level failure: queue for retry.
                 logger.warning(
@@ -116,11 +514,14 @@ async def run_sender() -> None:
                     report.time_slot,
                     exc,
                 )
-                _enqueue_report(queue, report, now, max_queue_size)
+                _enqueue_report(queue, store, report, now)
                 return
 
             if 200 <= status < 300:
                 # Success.
+                stats["reports_sent"] += 1
+                if report.trace is not None:
+                    tracer.finish(report.trace, time.monotonic())
                 logger.debug(
                     "Presence accepted (status=%s, time_slot=%s)",
                     status,
@@ -128,6 +529,13 @@ async def run_sender() -> None:
                 )
                 return
 
+            if status == 429:
+                logger.info(
+                    "Presence throttled by Cloud (time_slot=%s); deferring", report.time_slot
+                )
+                defer(report, now)
+                return
+
             if 500 <= status < 600:
                 # Server-side transient error: enqueue for retry.
                 logger.warning(
@@ -135,126 +543,388 @@ async def run_sender() -> None:
                     status,
                     report.time_slot,
                 )
-                _enqueue_report(queue, report, now, max_queue_size)
+                _enqueue_report(queue, store, report, now)
                 return
 
             # 4xx and other non-retriable errors: drop.
+            dropped["rejected"] += 1
             logger.info(
                 "Dropping presence due to non-retriable status (status=%s, time_slot=%s)",
                 status,
                 report.time_slot,
             )
 
+        async def handle_batch(reports: List[PresenceReport]) -> None:
+            now = int(time.time())
+            fresh = [report for report in reports if now - report.timestamp <= max_skew_seconds]
+            if len(fresh) < len(reports):
+                dropped["stale"] += len(reports) - len(fresh)
+                logger.info(
+                    "Dropping %s stale presence events from batch", len(reports) - len(fresh)
+                )
+            if not fresh:
+                return
+
+            if stats["upload_mode"] != UPLOAD_BATCH:
+                await asyncio.gather(*(handle_report(report) for report in fresh))
+                return
+
+            status: Optional[int] = None
+            try:
+                status = await post_batch(fresh)
+            except CircuitOpenError as exc:
+                for report in fresh:
+                    _enqueue_report(queue, store, report, now, next_retry_at=exc.retry_at)
+                return
+            except Exception as exc:
+                logger.warning(
+                    "Network error sending presence batch (receiver_id=%s, reports=%s): %s",
+                    cfg.receiver_id,
+                    len(fresh),
+                    exc,
+                )
+                for report in fresh:
+                    _enqueue_report(queue, store, report, now)
+                return
+
+            if 200 <= status < 300:
+                stats["reports_sent"] += len(fresh)
+                stats["batches_sent"] += 1
+                acked = time.monotonic()
+                for report in fresh:
+                    if report.trace is not None:
+                        tracer.finish(report.trace, acked)
+                logger.debug("Presence batch accepted (status=%s, reports=%s)", status, len(fresh))
+                return
+
+            if status in (404, 405):
+                # Cloud has no batch endpoint: switch to single POSTs for good.
+                logger.warning(
+                    "Batch upload not supported by Cloud (status=%s); falling back to single POSTs",
+                    status,
+                )
+                stats["upload_mode"] = UPLOAD_SINGLE
+                await asyncio.gather(*(handle_report(report) for report in fresh))
+                return
+
+            if status == 413:
+                logger.warning(
+                    "Presence batch too large (reports=%s); resending individually", len(fresh)
+                )
+                await asyncio.gather(*(handle_report(report) for report in fresh))
+                return
+
+            if status == 429:
+                logger.info("Presence batch throttled by Cloud (reports=%s); deferring", len(fresh))
+                for report in fresh:
+                    defer(report, now)
+                return
+
+            if 500 <= status < 600:
+                logger.warning(
+                    "Server error sending presence batch (status=%s, reports=%s); enqueueing for retry",
+                    status,
+                    len(fresh),
+                )
+                for report in fresh:
+                    _enqueue_report(queue, store, report, now)
+                return
+
+            dropped["rejected"] += len(fresh)
+            logger.info(
+                "Dropping presence batch due to non-retriable status (status=%s, reports=%s)",
+                status,
+                len(fresh),
+            )
+
+        async def retry_item(item: QueuedReport) -> None:
+            retry_beat.start(id(item))
+            try:
+                await _retry_item(item)
+            finally:
+                retry_beat.done(id(item))
+
+        async def _retry_item(item: QueuedReport) -> None:
+            now = time.time()
+            report = item.report
+
+            # Drop if too old.
+            if now - report.timestamp > max_skew_seconds:
+                dropped["stale"] += 1
+                logger.info(
+                    "Dropping queued stale presence event (age=%ss, time_slot=%s)",
+                    int(now - report.timestamp),
+                    report.time_slot,
+                )
+                queue.discard(item)
+                return
+
+            status: Optional[int] = None
+            try:
+                status = await post(report, LANE_RETRY)
+            except CircuitOpenError as exc:
+                # Not an attempt: the request was never sent.
+                item.next_retry_at = exc.retry_at
+                queue.reschedule(item)
+                return
+            except Exception as exc:
+                logger.warning(
+                    "Retry network error (org_id=%s, receiver_id=%s, attempt=%s, time_slot=%s): %s",
+                    report.org_id,
+                    cfg.receiver_id,
+                    item.attempts,
+                    report.time_slot,
+                    exc,
+                )
+                _retry_or_drop(queue, item, report, max_retry_attempts)
+                return
+
+            if 200 <= status < 300:
+                stats["reports_sent"] += 1
+                logger.debug(
+                    "Queued presence accepted after retry (attempt=%s, time_slot=%s)",
+                    item.attempts,
+                    report.time_slot,
+                )
+                queue.discard(item)
+                return
+
+            if status == 429:
+                # Throttling is not the report's fault: do not count it as an attempt.
+                shaper.deferred += 1
+                item.next_retry_at = max(shaper.resume_at, now + 1)
+                queue.reschedule(item)
+                return
+
+            if 500 <= status < 600:
+                logger.warning(
+                    "Retry server error (status=%s, attempt=%s, time_slot=%s)",
+                    status,
+                    item.attempts,
+                    report.time_slot,
+                )
+                _retry_or_drop(queue, item, report, max_retry_attempts)
+                return
+
+            # Non-retriable error.
+            dropped["rejected"] += 1
+            logger.info(
+                "Dropping queued presence due to non-retriable status (status=%s, time_slot=%s)",
+                status,
+                report.time_slot,
+            )
+            queue.discard(item)
+
         async def retry_loop() -> None:
+            # Only wakes for items that are due (or earlier items being queued);
+            # due items are retried concurrently, bounded by the in-flight cap.
+            # Checking out a few rounds of max_in_flight at a time keeps a large
+            # backlog (e.g. after recovery) from becoming one huge gather().
+            while True:
+                due = queue.pop_due(time.time(), limit=4 * max_in_flight)
+                if due:
+                    await asyncio.gather(*(retry_item(item) for item in due))
+                await queue.wait(time.time(), max_wait=60.0)
+
+        async def send_worker(index: int) -> None:
             while True:
-                now = time.time()
-                for item in list(queue):
-                    if item.next_retry_at > now:
-                        continue
-
-                    # Drop if too old.
-                    if now - item.report.timestamp > max_skew_seconds:
-                        logger.info(
-                            "Dropping queued stale presence event (age=%ss, time_slot=%s)",
-                            int(now - item.report.timestamp),
-                            item.report.time_slot,
-                        )
-                        queue.remove(item)
-                        continue
-
-                    status: Optional[int] = None
+                report, enqueued_at = await send_queue.get()
+                send_beat.start(index)
+                stats["send_queue_depth"] = send_queue.qsize()
+                dequeued = time.monotonic()
+                if report.trace is not None:
+                    report.trace.dequeued = dequeued
+                delay_ms = (dequeued - enqueued_at) * 1000.0
+                if delay_ms > stats["max_send_queue_delay_ms"]:
+                    stats["max_send_queue_delay_ms"] = round(delay_ms, 3)
+                try:
+                    await handle_report(report)
+                except Exception:
+                    logger.exception("Unexpected error in sender worker (time_slot=%s)", report.time_slot)
+                finally:
+                    send_beat.done(index)
+
+        async def batcher() -> None:
+            # Group the send queue into batches: flush at batch_max_reports, or once
+            # the oldest buffered report has waited batch_max_delay.
+            loop = asyncio.get_running_loop()
+            while True:
+                report, enqueued_at = await send_queue.get()
+                batch = [report]
+                deadline = loop.time() + batch_max_delay
+                oldest_enqueued_at = enqueued_at
+                while len(batch) < batch_max_reports:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
                     try:
-                        status = await _post_presence(session, base_url, item.report)
-                    except Exception as exc:
-                        logger.warning(
-                            "Retry network error (org_id=%s, receiver_id=%s, attempt=%s, time_slot=%s): %s",
-                            item.report.org_id,
-                            cfg.receiver_id,
-                            item.attempts,
-                            item.report.time_slot,
-                            exc,
-                        )
-                        if not _schedule_next_retry(item, max_retry_attempts):
-                            logger.warning(
-                                "Dropping queued presence after max_retry_attempts "
-                                "(org_id=%s, receiver_id=%s, attempts=%s, time_slot=%s)",
-                                item.report.org_id,
-                                cfg.receiver_id,
-                                item.attempts,
-                                item.report.time_slot,
-                            )
-                            queue.remove(item)
-                        continue
-
-                    if 200 <= status < 300:
-                        logger.debug(
-                            "Queued presence accepted after retry (attempt=%s, time_slot=%s)",
-                            item.attempts,
-                            item.report.time_slot,
-                        )
-                        queue.remove(item)
-                        continue
-
-                    if 500 <= status < 600:
-                        logger.warning(
-                            "Retry server error (status=%s, attempt=%s, time_slot=%s)",
-                            status,
-                            item.attempts,
-                            item.report.time_slot,
-                        )
-                        if not _schedule_next_retry(item, max_retry_attempts):
-                            logger.warning(
-                                "Dropping queued presence after max_retry_attempts "
-                                "(org_id=%s, receiver_id=%s, attempts=%s, time_slot=%s)",
-                                item.report.org_id,
-                                cfg.receiver_id,
-                                item.attempts,
-                                item.report.time_slot,
-                            )
-                            queue.remove(item)
-                        continue
-
-                    # Non-retriable error.
-                    logger.info(
-                        "Dropping queued presence due to non-retriable status (status=%s, time_slot=%s)",
-                        status,
-                        item.report.time_slot,
-                    )
-                    queue.remove(item)
-
-                await asyncio.sleep(1.0)
+                        report, _enqueued_at = await asyncio.wait_for(send_queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(report)
+                stats["send_queue_depth"] = send_queue.qsize()
+                delay_ms = (time.monotonic() - oldest_enqueued_at) * 1000.0
+                if delay_ms > stats["max_send_queue_delay_ms"]:
+                    stats["max_send_queue_delay_ms"] = round(delay_ms, 3)
+                await batch_queue.put(batch)
+
+        async def batch_worker(index: int) -> None:
+            while True:
+                batch = await batch_queue.get()
+                send_beat.start(index)
+                dequeued = time.monotonic()
+                for report in batch:
+                    if report.trace is not None:
+                        report.trace.dequeued = dequeued
+                try:
+                    await handle_batch(batch)
+                except Exception:
+                    logger.exception("Unexpected error in batch sender worker (reports=%s)", len(batch))
+                finally:
+                    send_beat.done(index)
 
         async def consume_reports() -> None:
-            async for report in scan_presence_reports():
-                await handle_report(report)
+            global _LAST_SCAN_AT
+            async for report in scan_presence_reports(signer):
+                now = int(time.time())
+                _LAST_SCAN_AT = now
+                stats["reports_signed"] += 1
+                try:
+                    send_queue.put_nowait((report, time.monotonic()))
+                except asyncio.QueueFull:
+                    # Never block the scanner on Cloud: park the report for retry instead.
+                    stats["send_queue_overflows"] += 1
+                    _enqueue_report(queue, store, report, now)
+                stats["send_queue_depth"] = send_queue.qsize()
+
+        if upload_mode == UPLOAD_BATCH:
+            senders = [batcher(), *(batch_worker(index) for index in range(send_workers))]
+        else:
+            senders = [send_worker(index) for index in range(send_workers)]
+
+        async def journal_flusher() -> None:
+            # Group-commit queue writes; the commit (and fsync) runs off the event loop.
+            while True:
+                await asyncio.sleep(commit_interval)
+                await _flush_journal(journal)
+
+        async def ping_budget() -> bool:
+            # Idle pings are optional traffic: skip them while Cloud is failing and
+            # take rate budget like a retry would.
+            if breaker.state != BREAKER_CLOSED:
+                return False
+            await shaper.acquire(headroom=1)
+            return True
+
+        async def connection_keeper() -> None:
+            await prewarm(session, base_url, http_settings.prewarm_connections, connections)
+            if http_settings.idle_ping_seconds > 0:
+                await keep_warm(
+                    session, base_url, http_settings.idle_ping_seconds, connections, ping_budget
+                )
 
-        await asyncio.gather(consume_reports(), retry_loop())
+        senders.append(connection_keeper())
+        if journal is not None:
+            senders.append(journal_flusher())
+        try:
+            await asyncio.gather(consume_reports(), retry_loop(), *senders)
+        finally:
+            if journal is not None:
+                journal.close()
+
+
+async def _flush_journal(journal: SqliteQueueStore) -> bool:
+    """
+    Commit the journal's buffered writes on a worker thread.
+
+    If the commit fails, the writes go back to the journal's buffer and are
+    retried with the next commit, so no queued report loses its persistence.
+    """
+    pending = journal.take_pending()
+    try:
+        await asyncio.to_thread(journal.flush, pending)
+    except Exception:
+        journal.requeue(pending)
+        logger.exception(
+            "Failed to persist retry queue to %s; keeping %s writes for the next commit",
+            journal.path,
+            journal.pending,
+        )
+        return False
+    return True
 
 
 def _enqueue_report(
-    queue: List[QueuedReport],
+    queue: RetryQueue,
+    store: ReportColumns,
     report: PresenceReport,
     now: int,
-    max_queue_size: int,
+    next_retry_at: Optional[float] = None,
 ) -> None:
-    if max_queue_size > 0 and len(queue) >= max_queue_size:
-        oldest = queue.pop(0)
-        logger.warning(
-            "Queue full (max_queue_size=%s); dropping oldest report (org_id=%s, time_slot=%s)",
-            max_queue_size,
-            oldest.report.org_id,
-            oldest.report.time_slot,
-        )
-    queue.append(
+    backoff = decorrelated_jitter(RETRY_BASE_SECONDS)
+    # A full queue evicts one report; RetryQueue.on_evict (_log_eviction) logs it.
+    queue.push(
         QueuedReport(
-            report=report,
+            store=store,
+            row=store.append(report),
             first_seen=now,
             attempts=1,
-            next_retry_at=now + 1,
+            next_retry_at=max(now + backoff, next_retry_at or 0),
+            backoff=backoff,
         )
     )
 
 
+def _log_eviction(item: QueuedReport, reason: str, max_queue_size: int) -> None:
+    # Called before the evicted report's store row is released.
+    report = item.report
+    logger.warning(
+        "Queue full (max_queue_size=%s); dropping %s report (org_id=%s, time_slot=%s)",
+        max_queue_size,
+        reason,
+        report.org_id,
+        report.time_slot,
+    )
+
+
+_STATUS_CLASSES = {2: "2xx", 4: "4xx", 5: "5xx"}
+
+
+def _status_class(status: int) -> str:
+    if status == 429:
+        return "429"
+    return _STATUS_CLASSES.get(status // 100, "other")
+
+
+def _shape(shaper: RateShaper, status: int, retry_after: Optional[float]) -> int:
+    if status == 429:
+        shaper.on_throttled(retry_after)
+    elif 200 <= status < 300:
+        shaper.on_success()
+    return status
+
+
+def _retry_or_drop(
+    queue: RetryQueue,
+    item: QueuedReport,
+    report: PresenceReport,
+    max_retry_attempts: int,
+) -> None:
+    if _schedule_next_retry(item, max_retry_attempts):
+        queue.reschedule(item)
+        return
+    _SEND_STATS["dropped"]["max_attempts"] += 1
+    logger.warning(
+        "Dropping queued presence after max_retry_attempts "
+        "(org_id=%s, receiver_id=%s, attempts=%s, time_slot=%s)",
+        report.org_id,
+        report.receiver_id,
+        item.attempts,
+        report.time_slot,
+    )
+    queue.discard(item)
+
+
 def _schedule_next_retry(item: QueuedReport, max_retry_attempts: int) -> bool:
     """
     Increment attempt counter and schedule next retry.
@@ -264,7 +934,8 @@ def _schedule_next_retry(item: QueuedReport, max_retry_attempts: int) -> bool:
     item.attempts += 1
     if item.attempts > max_retry_attempts:
         return False
-    # Exponential backoff capped at 60 seconds.
-    delay = min(60, 2 ** min(item.attempts, 6))
-    item.next_retry_at = time.time() + delay
+    # Decorrelated jitter, capped at 60 seconds: grows like 2 ** attempts, but
+    # receivers that failed together do not retry together.
+    item.backoff = decorrelated_jitter(item.backoff)
+    item.next_retry_at = time.time() + item.backoff
     return True
@@ -0,0 +1,77 @@
+import hashlib
+import hmac
+import struct
+from typing import Iterable, List, Tuple
+
+from .config_loader import ReceiverConfig
+
+
+# encode_uint32(time_slot) || token_prefix || encode_uint32(timestamp)
+_SIGNED_SUFFIX = struct.Struct(">I16sI")
+
+
+class ReportSigner:
+    """
+    Receiver signature engine (spec §7.4):
+
+    signature = HMAC-SHA256(receiver_secret,
+                 org_id || receiver_id || encode_uint32(time_slot) ||
+                 token_prefix || encode_uint32(timestamp))
+
+    The secret is keyed and org_id || receiver_id absorbed once, at construction.
+    Each signature clones that state and feeds only the 24 per-report bytes.
+    """
+
+    def __init__(self, org_id: str, receiver_id: str, receiver_secret: str) -> None:
+        self.org_id = org_id
+        self.receiver_id = receiver_id
+        self._prefixed = hmac.new(
+            receiver_secret.encode("utf-8"),
+            org_id.encode("utf-8") + receiver_id.encode("utf-8"),
+            hashlib.sha256,
+        )
+
+    @classmethod
+    def from_config(cls, cfg: ReceiverConfig) -> "ReportSigner":
+        return cls(cfg.org_id, cfg.receiver_id, cfg.receiver_secret)
+
+    def sign(self, time_slot: int, token_prefix: bytes, timestamp: int) -> bytes:
+        """
+        Return the raw 32-byte signature for one report.
+
+        token_prefix must be a 16-byte bytes object. Raises ValueError if it is not,
+        or if time_slot/timestamp do not fit in a uint32.
+        """
+        if len(token_prefix) != 16:
+            raise ValueError(f"ReportSigner: token_prefix must be 16 bytes, got {len(token_prefix)}")
+        try:
+            suffix = _SIGNED_SUFFIX.pack(time_slot, token_prefix, timestamp)
+        except struct.error as exc:
+            raise ValueError(f"ReportSigner: cannot encode signed fields: {exc}") from None
+        state = self._prefixed.copy()
+        state.update(suffix)
+        return state.digest()
+
+    def sign_many(self, items: Iterable[Tuple[int, bytes, int]]) -> List[bytes]:
+        """
+        Sign a batch of (time_slot, token_prefix, timestamp) tuples, in order.
+
+        Intended for aggregated or replayed packets, where many reports are built
+        at once.
+        """
+        prefixed = self._prefixed
+        pack = _SIGNED_SUFFIX.pack
+        signatures: List[bytes] = []
+        for time_slot, token_prefix, timestamp in items:
+            if len(token_prefix) != 16:
+                raise ValueError(
+                    f"ReportSigner: token_prefix must be 16 bytes, got {len(token_prefix)}"
+                )
+            try:
+                suffix = pack(time_slot, token_prefix, timestamp)
+            except struct.error as exc:
+                raise ValueError(f"ReportSigner: cannot encode signed fields: {exc}") from None
+            state = prefixed.copy()
+            state.update(suffix)
+            signatures.append(state.digest())
+        return signatures
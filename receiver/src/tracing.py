@@ -0,0 +1,163 @@
+import logging
+import os
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from .latency_stats import LatencyWindow
+
+
+logger = logging.getLogger("hnnp.receiver.trace")
+
+# Pipeline stages, in order. Each is the time between two ReportTrace stamps:
+#   scan:      advertisement received -> payload parsed (scan queue wait + parse)
+#   build:     parsed -> report signed (dedup, RSSI gate, aggregation hold, signing)
+#   queue:     signed -> picked up by a sender worker (send queue, batching)
+#   admission: picked up -> request started (breaker, rate shaper, concurrency limit)
+#   http:      request started -> Cloud acknowledged (2xx)
+#   total:     advertisement received -> Cloud acknowledged
+STAGE_SCAN = "scan"
+STAGE_BUILD = "build"
+STAGE_QUEUE = "queue"
+STAGE_ADMISSION = "admission"
+STAGE_HTTP = "http"
+STAGE_TOTAL = "total"
+STAGES: Tuple[str, ...] = (
+    STAGE_SCAN,
+    STAGE_BUILD,
+    STAGE_QUEUE,
+    STAGE_ADMISSION,
+    STAGE_HTTP,
+    STAGE_TOTAL,
+)
+
+# Early stages take microseconds, so the histogram starts well below the
+# 5 ms first bucket used for upload latency.
+STAGE_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+DEFAULT_STAGE_WINDOW = 1024
+
+
+@dataclass(slots=True)
+class ReportTrace:
+    """
+    time.monotonic() stamps of one report on its way from radio to Cloud.
+
+    received is the advertisement's RawAdvertisement.received_at; with
+    aggregation it is the first sighting of the (token_prefix, time_slot).
+    Stamps that have not been reached yet are 0.0.
+    """
+
+    received: float
+    parsed: float
+    signed: float = 0.0
+    dequeued: float = 0.0
+    sent: float = 0.0
+    acked: float = 0.0
+
+    def stages(self) -> Tuple[float, ...]:
+        """
+        Stage durations in seconds, in STAGES order.
+        """
+        return (
+            self.parsed - self.received,
+            self.signed - self.parsed,
+            self.dequeued - self.signed,
+            self.sent - self.dequeued,
+            self.acked - self.sent,
+            self.acked - self.received,
+        )
+
+
+class PipelineTracer:
+    """
+    Rolling per-stage latency for reports acknowledged by Cloud.
+
+    Each stage keeps a LatencyWindow over the last `window` reports (bounded
+    memory: a fixed-size sample ring plus fixed histogram buckets), so the
+    percentiles follow current conditions rather than the whole uptime.
+
+    Only reports accepted on their first attempt complete a trace; reports that
+    go through the retry queue are stored without their trace (see
+    presence_report.ReportColumns) and show up in the retry lane latency instead.
+
+    With sample_rate > 0, that fraction of completed traces is logged on
+    "hnnp.receiver.trace"; traces slower than slow_seconds end-to-end are always
+    logged.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        slow_seconds: float = 0.0,
+        window: int = DEFAULT_STAGE_WINDOW,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.slow_seconds = max(slow_seconds, 0.0)
+        self.windows: Dict[str, LatencyWindow] = {
+            stage: LatencyWindow(window, STAGE_BUCKETS) for stage in STAGES
+        }
+        self.completed = 0
+        self.logged = 0
+        self._random = (rng or random.Random()).random
+
+    def finish(self, trace: ReportTrace, acked: Optional[float] = None) -> None:
+        """
+        Record a trace whose report Cloud has just acknowledged.
+        """
+        if acked is not None:
+            trace.acked = acked
+        durations = trace.stages()
+        for window, seconds in zip(self.windows.values(), durations):
+            window.record(seconds)
+        self.completed += 1
+        total = durations[-1]
+        if (self.slow_seconds and total >= self.slow_seconds) or (
+            self.sample_rate and self._random() < self.sample_rate
+        ):
+            self.logged += 1
+            logger.info(
+                "trace total=%.1fms %s",
+                total * 1000.0,
+                " ".join(
+                    f"{stage}={seconds * 1000.0:.2f}ms"
+                    for stage, seconds in zip(STAGES[:-1], durations[:-1])
+                ),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return completed/logged trace counts and p50/p95/p99/max per stage.
+        """
+        return {
+            "completed": self.completed,
+            "logged": self.logged,
+            "sample_rate": self.sample_rate,
+            "stages": {stage: window.stats() for stage, window in self.windows.items()},
+        }
+
+    def histograms(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: window.histogram() for stage, window in self.windows.items()}
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, str(default))
+    try:
+        value = float(raw)
+    except ValueError:
+        value = default
+    return value if value >= 0 else default
+
+
+def load_tracer() -> PipelineTracer:
+    """
+    Build a PipelineTracer from HNNP_TRACE_SAMPLE_RATE (fraction of completed
+    traces to log, default 0) and HNNP_TRACE_SLOW_MS (always log traces at least
+    this slow end-to-end, default 0 = off).
+    """
+    return PipelineTracer(
+        sample_rate=_env_float("HNNP_TRACE_SAMPLE_RATE", 0.0),
+        slow_seconds=_env_float("HNNP_TRACE_SLOW_MS", 0.0) / 1000.0,
+    )
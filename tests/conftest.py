@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The Python receiver lives in receiver/src and uses package-relative imports,
+# so tests import it as the "src" namespace package.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "receiver"))
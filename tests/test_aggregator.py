@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+from src.aggregator import EMIT_ON_CLOSE, EMIT_ON_FIRST, SlotAggregator, aggregate_sightings
+from src.ble_scanner import BlePacketV2, Sighting
+
+
+SLOT = 117_566_666
+SLOT_START = SLOT * 15
+
+
+def _sighting(token: int, seen_at: float, rssi=-60, time_slot: int = SLOT) -> Sighting:
+    packet = BlePacketV2(
+        version=2,
+        flags=0,
+        time_slot=time_slot,
+        token_prefix=token.to_bytes(16, "big"),
+        mac=bytes(8),
+    )
+    return Sighting(packet, rssi, seen_at)
+
+
+def test_first_mode_emits_on_first_sighting_only():
+    aggregator = SlotAggregator(emit=EMIT_ON_FIRST, close_grace_seconds=5.0)
+    first = aggregator.add(_sighting(1, SLOT_START + 1))
+    assert first is not None and first.count == 1
+    assert aggregator.add(_sighting(1, SLOT_START + 2, rssi=-70)) is None
+    assert aggregator.add(_sighting(2, SLOT_START + 3)) is not None
+
+    # Later sightings still update the already emitted observation.
+    assert first.count == 2 and first.last_seen == SLOT_START + 2
+    assert aggregator.close_due(SLOT_START + 100) == []
+    assert aggregator.stats()["observations"] == 2
+    assert aggregator.stats()["open_observations"] == 0
+
+
+def test_close_mode_emits_when_the_slot_rolls_over():
+    aggregator = SlotAggregator(emit=EMIT_ON_CLOSE, close_grace_seconds=5.0)
+    for i in range(3):
+        assert aggregator.add(_sighting(1, SLOT_START + i)) is None
+    assert aggregator.add(_sighting(2, SLOT_START + 14, time_slot=SLOT + 1)) is None
+
+    close_at = SLOT_START + 15 + 5.0
+    assert aggregator.next_close_at() == close_at
+    assert aggregator.close_due(close_at - 0.001) == []
+    (observation,) = aggregator.close_due(close_at)
+    assert observation.packet.time_slot == SLOT
+    assert (observation.count, observation.first_seen, observation.last_seen) == (3, SLOT_START, SLOT_START + 2)
+
+    # The next slot closes 15 s later.
+    assert aggregator.next_close_at() == close_at + 15
+    assert [o.packet.time_slot for o in aggregator.close_due(close_at + 15)] == [SLOT + 1]
+    assert aggregator.stats()["reduction_factor"] == 2.0
+
+
+def test_observation_and_closed_statistics():
+    aggregator = SlotAggregator(emit=EMIT_ON_FIRST, close_grace_seconds=0.0)
+    for seen_at, rssi in ((0, -70), (4, -60), (6, None), (10, -65)):
+        aggregator.add(_sighting(1, SLOT_START + seen_at, rssi=rssi))
+    aggregator.add(_sighting(2, SLOT_START + 1, rssi=-80))
+    aggregator.add(_sighting(3, SLOT_START + 2, rssi=None))
+
+    assert aggregator.stats()["closed"]["observations"] == 0
+    aggregator.close_due(SLOT_START + 15)
+    observation_stats = aggregator.stats()["closed"]
+    assert observation_stats == {
+        "observations": 3,
+        "sightings_per_observation": 2.0,
+        "mean_dwell_s": round(10 / 3, 3),
+        "rssi_mean_dbm": -68.8,  # (-70 - 60 - 65 - 80) / 4
+        "rssi_min_dbm": -80,
+        "rssi_max_dbm": -60,
+        "rssi_mean_spread_db": 5.0,  # token 1: 10 dB, token 2: 0 dB, token 3: no RSSI
+    }
+
+
+def test_single_observation_rssi_fields():
+    aggregator = SlotAggregator(emit=EMIT_ON_FIRST)
+    observation = aggregator.add(_sighting(1, SLOT_START, rssi=-70))
+    aggregator.add(_sighting(1, SLOT_START + 1, rssi=None))
+    aggregator.add(_sighting(1, SLOT_START + 2, rssi=-50))
+    assert (observation.count, observation.rssi_count) == (3, 2)
+    assert (observation.rssi_min, observation.rssi_max, observation.rssi_mean) == (-70, -50, -60.0)
+
+
+@pytest.mark.parametrize("emit", [EMIT_ON_FIRST, EMIT_ON_CLOSE])
+def test_late_sighting_after_close_does_not_reopen_the_slot(emit):
+    aggregator = SlotAggregator(emit=emit, close_grace_seconds=5.0)
+    aggregator.add(_sighting(1, SLOT_START + 1))
+    closed = aggregator.close_due(SLOT_START + 20)
+    assert len(closed) == (1 if emit == EMIT_ON_CLOSE else 0)
+
+    # The same key arrives after the grace period, as does an older slot.
+    assert aggregator.add(_sighting(1, SLOT_START + 21)) is None
+    assert aggregator.add(_sighting(2, SLOT_START - 14, time_slot=SLOT - 1)) is None
+    assert aggregator.close_due(SLOT_START + 100) == []
+    assert aggregator.next_close_at() is None
+
+    # Later slots are aggregated as usual.
+    aggregator.add(_sighting(1, SLOT_START + 22, time_slot=SLOT + 1))
+    assert len(aggregator.close_due(SLOT_START + 100)) == (1 if emit == EMIT_ON_CLOSE else 0)
+    stats = aggregator.stats()
+    assert (stats["sightings"], stats["late_sightings"], stats["observations"]) == (4, 2, 2)
+    assert stats["closed"]["observations"] == 2
+
+
+def test_aggregate_sightings_flushes_open_slots_when_the_source_ends():
+    now = time.time()
+
+    async def sightings():
+        for i in range(5):
+            yield _sighting(i % 2, now, time_slot=int(now) // 15)
+
+    async def run():
+        return [o async for o in aggregate_sightings(sightings(), emit=EMIT_ON_CLOSE)]
+
+    observations = asyncio.run(run())
+    assert sorted(o.count for o in observations) == [2, 3]
+
+
+
+def test_aggregate_sightings_stops_its_pump_and_surfaces_source_errors():
+    now = time.time()
+
+    async def endless():
+        while True:
+            yield _sighting(1, now, time_slot=int(now) // 15)
+
+    async def close_early():
+        observations = aggregate_sightings(endless(), emit=EMIT_ON_FIRST)
+        await observations.__anext__()
+        await asyncio.sleep(0.01)  # the pump now waits for room in the full queue
+        await asyncio.wait_for(observations.aclose(), timeout=1.0)
+        return [task for task in asyncio.all_tasks() if getattr(task.get_coro(), "__qualname__", "").endswith("._pump")]
+
+    assert asyncio.run(close_early()) == []
+
+    async def failing():
+        yield _sighting(1, now, time_slot=int(now) // 15)
+        raise RuntimeError("bleak is not installed")
+
+    async def drain():
+        return [o async for o in aggregate_sightings(failing(), emit=EMIT_ON_FIRST)]
+
+    with pytest.raises(RuntimeError, match="bleak"):
+        asyncio.run(drain())
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from src.debug_server import DebugEndpoints  # noqa: E402
+
+_AUTH = {"Authorization": "Bearer secret"}
+
+
+def _post(endpoints: DebugEndpoints, path: str):
+    async def run():
+        app = web.Application()
+        endpoints.add_routes(app)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(path, headers=_AUTH)
+            return response.status, await response.json()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "NaN"])
+@pytest.mark.parametrize(
+    "path, name",
+    [
+        ("/debug/profile/start", "seconds"),
+        ("/debug/profile/start", "interval_ms"),
+        ("/debug/tracemalloc/start", "seconds"),
+        ("/debug/tracemalloc/start", "frames"),
+    ],
+)
+def test_non_finite_query_values_are_rejected(path, name, value):
+    endpoints = DebugEndpoints("secret")
+    status, body = _post(endpoints, f"{path}?{name}={value}")
+    assert status == 400
+    assert body == {"error": f"{name} must be a finite number"}
+    # Nothing was started with an unbounded time box.
+    assert endpoints.profiler is None and endpoints.allocations is None
+
+
+def test_query_values_are_checked_after_authentication():
+    async def run():
+        app = web.Application()
+        DebugEndpoints("secret").add_routes(app)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/debug/profile/start?seconds=nan")
+            return response.status
+
+    assert asyncio.run(run()) == 401
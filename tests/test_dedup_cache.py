@@ -0,0 +1,74 @@
+from src.dedup_cache import DEDUP_KEY_BYTES, DedupCache, dedup_key
+
+
+SLOT = 117_566_666
+
+
+def _key(i: int) -> bytes:
+    return dedup_key((i + 1).to_bytes(16, "big"), SLOT)
+
+
+def test_duplicates_are_suppressed_within_the_window_only():
+    cache = DedupCache(window_seconds=5.0)
+    assert len(_key(0)) == DEDUP_KEY_BYTES
+    assert dedup_key(bytes(16), SLOT) != dedup_key(bytes(16), SLOT + 1)
+
+    assert not cache.check_and_add(_key(0), 100.0)
+    assert cache.check_and_add(_key(0), 102.0)
+    # Duplicates do not refresh the timestamp: the window runs from first acceptance.
+    assert cache.check_and_add(_key(0), 105.0)
+    assert not cache.check_and_add(_key(0), 105.5)
+    assert cache.check_and_add(_key(0), 106.0)
+    assert not cache.check_and_add(_key(1), 106.0)
+    assert cache.stats() == {
+        "entries": 3,
+        "buckets": 2,
+        "hits": 3,
+        "misses": 3,
+        "evictions": 0,
+        "expirations": 0,
+    }
+
+
+def test_whole_buckets_expire_at_bucket_boundaries():
+    cache = DedupCache(window_seconds=5.0)
+    assert not cache.check_and_add(_key(0), 4.9)  # bucket [0, 5)
+    assert not cache.check_and_add(_key(1), 5.0)  # bucket [5, 10)
+
+    # At 9.9 the window still reaches back into bucket 0, and key 0 is within it.
+    assert cache.check_and_add(_key(0), 9.9)
+    assert cache.stats()["buckets"] == 2
+
+    # At 10.0 the window starts at 5.0: bucket 0 is dropped whole.
+    assert not cache.check_and_add(_key(2), 10.0)
+    assert cache.stats()["expirations"] == 1
+    assert cache.check_and_add(_key(1), 10.0)
+    assert not cache.check_and_add(_key(0), 10.0)
+    assert len(cache) == 3
+
+    # Nothing accepted within the last window: everything expires.
+    assert not cache.check_and_add(_key(3), 30.0)
+    assert len(cache) == 1
+    assert cache.stats()["expirations"] == 4
+
+
+def test_max_entries_evicts_oldest_bucket_then_oldest_entry():
+    cache = DedupCache(window_seconds=5.0, max_entries=3)
+    cache.check_and_add(_key(0), 1.0)
+    cache.check_and_add(_key(1), 2.0)
+    cache.check_and_add(_key(2), 6.0)
+
+    # Full: the whole oldest bucket (keys 0 and 1) goes.
+    assert not cache.check_and_add(_key(3), 7.0)
+    assert len(cache) == 2
+    assert cache.evictions == 2
+    assert not cache.check_and_add(_key(0), 7.0)
+
+    # Full with a single bucket: only its oldest entry (key 2) goes.
+    assert not cache.check_and_add(_key(4), 8.0)
+    assert cache.evictions == 3
+    assert len(cache) == 3
+    assert cache.check_and_add(_key(3), 8.0)
+    assert not cache.check_and_add(_key(2), 8.0)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 7
@@ -0,0 +1,109 @@
+import asyncio
+import random
+
+from src.flow_control import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    LANE_LIVE,
+    LANE_RETRY,
+    AdaptiveConcurrency,
+    CircuitBreaker,
+    decorrelated_jitter,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_probes_and_doubles_cooldown_on_failed_probe():
+    clock = _Clock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=10.0, clock=clock)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+    assert 8.0 <= breaker.defer_seconds() <= 12.0 + 10.0  # cooldown +-20%, plus up to one cooldown
+
+    clock.now = 12.0  # past the cooldown even with +20% jitter
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure(probe=True)
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.stats()["reopens_in_s"] >= 16.0  # 20 s cooldown, -20% jitter
+
+    clock.now = 40.0
+    assert breaker.allow()
+    breaker.record_success(probe=True)
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.opened == 2
+    assert breaker.rejected == 2
+
+
+def test_breaker_ignores_late_outcomes_and_unsent_probes():
+    clock = _Clock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=10.0, clock=clock)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+
+    # A request sent before the breaker opened succeeds late: no probe, stays open.
+    breaker.record_success()
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.stats()["consecutive_failures"] == 0
+
+    clock.now = 12.0
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    # Late outcomes of other requests do not decide the probe.
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow()
+
+    # The probe was cancelled before it was sent: the next request may probe.
+    breaker.abandon(probe=True)
+    assert breaker.allow()
+    breaker.record_success(probe=True)
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_decorrelated_jitter_stays_between_base_and_cap():
+    rng = random.Random(7)
+    delay = 0.0
+    delays = []
+    for _ in range(50):
+        delay = decorrelated_jitter(delay, base=1.0, cap=60.0, rng=rng)
+        delays.append(delay)
+    assert all(1.0 <= d <= 60.0 for d in delays)
+    assert max(delays) > 30.0
+
+
+def test_retry_lane_uses_only_capacity_left_over_by_live_reports():
+    async def scenario():
+        limiter = AdaptiveConcurrency(4, reserved_live=1)
+        for _ in range(3):
+            await limiter.acquire(LANE_RETRY)
+        blocked_retry = asyncio.ensure_future(limiter.acquire(LANE_RETRY))
+        await asyncio.sleep(0)
+        assert not blocked_retry.done()  # last slot is reserved for live reports
+        await limiter.acquire(LANE_LIVE)
+        waiting_live = asyncio.ensure_future(limiter.acquire(LANE_LIVE))
+        await asyncio.sleep(0)
+
+        limiter.release(0.01, True, LANE_RETRY)
+        await asyncio.sleep(0)
+        assert waiting_live.done()  # woken ahead of the older retry waiter
+        assert not blocked_retry.done()
+        stats = limiter.stats()
+        assert (stats["in_flight_live"], stats["in_flight_retry"]) == (2, 2)
+        blocked_retry.cancel()
+
+    asyncio.run(scenario())
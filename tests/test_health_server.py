@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from src import health_server, liveness  # noqa: E402
+
+_UPLOAD_CLOSED = {"breaker": {"state": "closed"}}
+
+
+def _get(path: str):
+    async def run():
+        async with TestClient(TestServer(health_server.create_app())) as client:
+            response = await client.get(path)
+            body = await (response.text() if path == "/metrics" else response.json())
+            return response.status, response.headers["Content-Type"], body
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def _fresh_heartbeats(monkeypatch):
+    monkeypatch.setattr(liveness, "_HEARTBEATS", {})
+    monkeypatch.delenv("HNNP_DEBUG_TOKEN", raising=False)
+
+
+def test_health_reports_every_stats_section():
+    status, _content_type, body = _get("/health")
+    assert status == 200
+    assert body["status"] == "not_ready"  # sender not started
+    for key in ("scan", "sending", "retry", "upload", "tracing", "liveness"):
+        assert key in body
+
+
+def test_live_is_503_only_when_a_loop_stalls(monkeypatch):
+    monkeypatch.setenv("HNNP_STALL_SECONDS", "5")
+    status, _content_type, body = _get("/health/live")
+    assert (status, body["live"]) == (200, True)
+
+    beat = liveness.heartbeat("send")
+    beat.start()
+    beat._in_progress[0] -= 10
+    status, _content_type, body = _get("/health/live")
+    assert (status, body["live"]) == (503, False)
+    assert "send_stalled" in body["failing"]
+
+
+def test_ready_follows_sender_and_breaker_state(monkeypatch):
+    status, _content_type, body = _get("/health/ready")
+    assert status == 503
+    assert "sender_not_started" in body["failing"]
+
+    monkeypatch.setattr(health_server, "get_upload_control_stats", lambda: _UPLOAD_CLOSED)
+    status, _content_type, body = _get("/health/ready")
+    assert (status, body["ready"]) == (200, True)
+
+    upload_open = {"breaker": {"state": "open"}}
+    monkeypatch.setattr(health_server, "get_upload_control_stats", lambda: upload_open)
+    status, _content_type, body = _get("/health/ready")
+    assert (status, body["failing"]) == (503, ["circuit_open"])
+
+
+def test_metrics_serves_prometheus_text(monkeypatch):
+    monkeypatch.setattr(health_server, "get_upload_control_stats", lambda: _UPLOAD_CLOSED)
+    status, content_type, body = _get("/metrics")
+    assert status == 200
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert "# TYPE hnnp_receiver_" in body
+    assert "hnnp_receiver_event_loop_lag_seconds_bucket" in body
@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from src.http_client import (  # noqa: E402
+    PING_PATH,
+    ConnectionStats,
+    HttpSettings,
+    create_session,
+    keep_warm,
+    load_http_settings,
+    prewarm,
+)
+
+
+class _Cloud:
+    """Local server counting /health pings and concurrent /slow requests."""
+
+    def __init__(self) -> None:
+        self.pings = 0
+        self.health_status = 200
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(PING_PATH, self._health)
+        app.router.add_route("*", "/slow", self._slow)
+        app.router.add_get("/stall", self._stall)
+        return app
+
+    async def _health(self, _request: web.Request) -> web.Response:
+        self.pings += 1
+        return web.Response(status=self.health_status)
+
+    async def _slow(self, _request: web.Request) -> web.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.1)
+        self.in_flight -= 1
+        return web.Response()
+
+    async def _stall(self, _request: web.Request) -> web.Response:
+        await asyncio.sleep(2.0)
+        return web.Response()
+
+
+def _settings(**overrides) -> HttpSettings:
+    values = dict(
+        pool_size=2,
+        keepalive_seconds=30.0,
+        dns_ttl_seconds=300,
+        connect_timeout=1.0,
+        read_timeout=1.0,
+        prewarm_connections=0,
+        idle_ping_seconds=0.0,
+    )
+    values.update(overrides)
+    return HttpSettings(**values)
+
+
+def _serve(scenario, host: str = "127.0.0.1"):
+    """Run scenario(session, base_url, cloud, stats) against a local server."""
+
+    async def run(settings: HttpSettings):
+        cloud = _Cloud()
+        async with TestServer(cloud.app()) as server:
+            base_url = f"http://{host}:{server.port}"
+            stats = ConnectionStats()
+            async with create_session(settings, stats, base_url) as session:
+                return await scenario(session, base_url, cloud, stats)
+
+    return lambda settings: asyncio.run(run(settings))
+
+
+def test_settings_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("HNNP_HTTP_KEEPALIVE_SECONDS", "45")
+    monkeypatch.setenv("HNNP_DNS_TTL_SECONDS", "0")
+    monkeypatch.setenv("HNNP_HTTP_CONNECT_TIMEOUT_SECONDS", "0.01")  # below minimum
+    monkeypatch.setenv("HNNP_HTTP_READ_TIMEOUT_SECONDS", "oops")
+    monkeypatch.setenv("HNNP_HTTP_PREWARM", "4")
+    monkeypatch.delenv("HNNP_HTTP_IDLE_PING_SECONDS", raising=False)
+    settings = load_http_settings(0)
+    assert settings == HttpSettings(
+        pool_size=1,
+        keepalive_seconds=45.0,
+        dns_ttl_seconds=0,
+        connect_timeout=3.0,
+        read_timeout=10.0,
+        prewarm_connections=4,
+        idle_ping_seconds=25.0,
+    )
+
+
+def test_pool_never_opens_more_than_pool_size_connections():
+    async def scenario(session, base_url, cloud, stats):
+        assert (session.connector.limit, session.connector.limit_per_host) == (2, 2)
+
+        async def post():
+            async with session.post(f"{base_url}/slow", data=b"{}") as resp:
+                await resp.read()
+
+        await asyncio.gather(*(post() for _ in range(6)))
+        return cloud.max_in_flight, stats
+
+    max_in_flight, stats = _serve(scenario)(_settings(pool_size=2))
+    assert max_in_flight == 2
+    assert (stats.connections_created, stats.connections_reused) == (2, 4)
+
+
+def test_dns_answers_are_cached_for_the_ttl():
+    async def scenario(session, base_url, cloud, stats):
+        for _ in range(2):
+            # Connection: close forces a new connection, and so a new lookup.
+            async with session.get(f"{base_url}/slow", headers={"Connection": "close"}) as resp:
+                await resp.read()
+        return session.connector.use_dns_cache, stats
+
+    cached, stats = _serve(scenario, host="localhost")(_settings(dns_ttl_seconds=300))
+    assert cached
+    assert stats.connections_created == 2
+    assert (stats.dns_cache_misses, stats.dns_cache_hits) == (1, 1)
+
+    cached, stats = _serve(scenario, host="localhost")(_settings(dns_ttl_seconds=0))
+    assert not cached
+    assert (stats.dns_cache_misses, stats.dns_cache_hits) == (0, 0)
+
+
+def test_read_timeout_is_separate_from_connect_timeout():
+    async def scenario(session, base_url, cloud, stats):
+        timeout = session.timeout
+        assert (timeout.connect, timeout.sock_connect, timeout.sock_read) == (1.5, 1.5, 0.2)
+        assert timeout.total == pytest.approx(1.7)
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            async with session.get(f"{base_url}/stall") as resp:
+                await resp.read()
+        return time.monotonic() - started
+
+    elapsed = _serve(scenario)(_settings(connect_timeout=1.5, read_timeout=0.2))
+    assert elapsed < 1.0  # cut off by sock_read, not by the 1.7 s total
+
+
+def test_prewarmed_connections_are_reused_by_reports():
+    async def scenario(session, base_url, cloud, stats):
+        await prewarm(session, base_url, 3, stats)
+        assert (cloud.pings, stats.prewarmed, stats.connections_created) == (3, 3, 3)
+
+        async def post():
+            async with session.post(f"{base_url}/slow", data=b"{}") as resp:
+                await resp.read()
+
+        await asyncio.gather(*(post() for _ in range(3)))
+        return stats
+
+    stats = _serve(scenario)(_settings(pool_size=3))
+    assert (stats.connections_created, stats.connections_reused) == (3, 3)
+
+
+def test_keep_warm_pings_only_when_idle_and_allowed():
+    async def scenario(session, base_url, cloud, stats):
+        allowed = False
+
+        async def before_ping() -> bool:
+            return allowed
+
+        pinger = asyncio.create_task(keep_warm(session, base_url, 0.1, stats, before_ping))
+        try:
+            await asyncio.sleep(0.35)
+            assert (cloud.pings, stats.pings) == (0, 0)  # skipped, e.g. breaker open
+
+            allowed = True
+            await asyncio.sleep(0.35)
+            assert 1 <= cloud.pings == stats.pings <= 4
+            assert stats.ping_failures == 0
+
+            cloud.health_status = 503
+            pings = stats.pings
+            await asyncio.sleep(0.35)
+            assert stats.ping_failures == stats.pings - pings >= 1
+        finally:
+            pinger.cancel()
+            await asyncio.gather(pinger, return_exceptions=True)
+        return stats
+
+    stats = _serve(scenario)(_settings())
+    assert stats.connections_created == 1  # every ping reused the warm connection
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from src import liveness
+from src.liveness import Heartbeat, LoopLagMonitor, admission_wait, check_health, heartbeat
+from src.rate_shaper import RateShaper
+
+
+def test_only_work_in_progress_counts_as_a_stall(monkeypatch):
+    monkeypatch.setattr(liveness, "_HEARTBEATS", {})
+    monkeypatch.setenv("HNNP_STALL_SECONDS", "5")
+    beat = heartbeat("send")
+    assert heartbeat("send") is beat
+
+    beat.start(0)
+    beat.done(0)
+    beat.start(1)
+    beat._in_progress[1] -= 10  # worker 1 picked up its report 10 s ago
+    result = check_health(sender_ready=True, breaker_open=False)
+    assert not result["live"] and not result["ready"]
+    assert result["failing"] == ["send_stalled"]
+    assert result["loops"]["send"]["in_progress"] == 1
+
+    beat.done(1)
+    # Idle for any length of time is fine; an open breaker only affects readiness.
+    result = check_health(sender_ready=True, breaker_open=True)
+    assert result["live"] and not result["ready"]
+    assert result["failing"] == ["circuit_open"]
+
+
+def test_lag_monitor_measures_a_blocked_loop():
+    monitor = LoopLagMonitor(interval=0.01)
+
+    async def run() -> None:
+        task = asyncio.ensure_future(monitor.run())
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # a slow callback blocking the loop
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert monitor.stats()["max_ms"] >= 150
+    assert Heartbeat("scan").busy_seconds() == 0.0
+
+
+def test_waiting_out_a_retry_after_pause_is_not_a_stall(monkeypatch):
+    monkeypatch.setattr(liveness, "_HEARTBEATS", {})
+    monkeypatch.setenv("HNNP_STALL_SECONDS", "300")
+    beat = heartbeat("retry")
+    shaper = RateShaper()
+    shaper.on_throttled(600.0)  # Retry-After: 600, longer than the stall threshold
+
+    async def retry_item() -> None:
+        beat.start("item")
+        try:
+            with admission_wait():
+                await shaper.acquire(headroom=1)
+        finally:
+            beat.done("item")
+
+    async def run() -> None:
+        task = asyncio.ensure_future(retry_item())
+        await asyncio.sleep(0.01)
+        beat._in_progress["item"] -= 1000  # picked up 1000 s ago, still waiting
+        result = check_health(sender_ready=True, breaker_open=False)
+        assert result["live"], result["failing"]
+        assert result["loops"]["retry"]["waiting_for_admission"] == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert beat.busy_seconds() == 0.0
+
+    # Once admitted, the clock restarts: only time after admission can stall.
+    beat.start(0)
+    beat.pause(0)
+    beat._in_progress[0] -= 1000
+    beat.resume(0)
+    assert beat.busy_seconds() < 1.0
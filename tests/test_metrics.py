@@ -0,0 +1,50 @@
+import struct
+
+from src.ble_scanner import (
+    DROP_LENGTH,
+    DROP_TIME_SLOT,
+    DROP_VERSION,
+    DROP_ZERO_TOKEN,
+    SlotWindow,
+    _drop_reason,
+)
+from src.latency_stats import LatencyWindow
+from src.metrics import render_metrics
+
+
+def test_drop_reason_names_the_parser_rule():
+    window = SlotWindow.at(1_763_500_000, 1)
+    slot = window.current_slot
+    good = struct.pack(">BBI", 2, 0, slot) + bytes(range(1, 25))
+    assert _drop_reason(good[:-1], window) == DROP_LENGTH
+    assert _drop_reason(b"\x01" + good[1:], window) == DROP_VERSION
+    assert _drop_reason(struct.pack(">BBI", 2, 0, slot + 5) + good[6:], window) == DROP_TIME_SLOT
+    assert _drop_reason(good[:6] + bytes(24), window) == DROP_ZERO_TOKEN
+
+
+def test_render_metrics_exposes_counters_and_cumulative_histogram():
+    window = LatencyWindow(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 2.0):
+        window.record(seconds)
+    health = {
+        "queued_reports": 3,
+        "scan": {"adverts_received": 10, "payloads_parsed": 8, "parse_drops": {"version": 2}},
+        "sending": {"responses": {"2xx": 7, "network_error": 1}, "dropped": {"stale": 1}},
+        "retry": {"evictions": {"oldest": 2}},
+        "upload": {"breaker": {"state": "open"}},
+    }
+    lines = render_metrics(health, {"live": window.histogram()}).splitlines()
+
+    assert "# TYPE hnnp_receiver_adverts_received_total counter" in lines
+    assert 'hnnp_receiver_parse_drops_total{reason="version"} 2' in lines
+    assert 'hnnp_receiver_http_responses_total{class="network_error"} 1' in lines
+    assert 'hnnp_receiver_reports_dropped_total{reason="evicted_oldest"} 2' in lines
+    assert 'hnnp_receiver_breaker_state{state="open"} 1' in lines
+    assert 'hnnp_receiver_breaker_state{state="closed"} 0' in lines
+    assert "hnnp_receiver_retry_queue_size 3" in lines
+    assert 'hnnp_receiver_send_latency_seconds_bucket{lane="live",le="0.1"} 1' in lines
+    assert 'hnnp_receiver_send_latency_seconds_bucket{lane="live",le="1.0"} 2' in lines
+    assert 'hnnp_receiver_send_latency_seconds_bucket{lane="live",le="+Inf"} 3' in lines
+    assert 'hnnp_receiver_send_latency_seconds_count{lane="live"} 3' in lines
+    # Stats that are absent from the snapshot are left out rather than reported as 0.
+    assert not any(line.startswith("hnnp_receiver_connections_created_total") for line in lines)
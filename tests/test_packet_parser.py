@@ -0,0 +1,167 @@
+import random
+
+from src import ble_scanner
+from src.ble_scanner import (
+    BlePacketV2,
+    HciSocketPacketSource,
+    SlotWindow,
+    _parse_hnnp_payload,
+    _parse_hnnp_payloads,
+)
+from src.hci import (
+    decode_le_advertising_reports,
+    extract_hnnp_service_data,
+    hnnp_payloads_from_event,
+)
+
+
+NOW = 1_763_500_000
+WINDOW = SlotWindow.at(NOW, max_drift_slots=1)
+CURRENT_SLOT = NOW // 15
+
+
+def _payload(version=0x02, flags=0x00, time_slot=CURRENT_SLOT, body=None) -> bytes:
+    if body is None:
+        body = bytes(range(1, 25))
+    return bytes([version, flags]) + time_slot.to_bytes(4, "big") + body
+
+
+def test_parses_valid_v2_payload():
+    packet = _parse_hnnp_payload(_payload(flags=0x01), WINDOW)
+    assert packet == BlePacketV2(
+        version=2,
+        flags=1,
+        time_slot=CURRENT_SLOT,
+        token_prefix=bytes(range(1, 17)),
+        mac=bytes(range(17, 25)),
+    )
+
+
+def test_rejects_invalid_payloads():
+    assert _parse_hnnp_payload(_payload()[:29], WINDOW) is None
+    assert _parse_hnnp_payload(_payload(version=0x01), WINDOW) is None
+    assert _parse_hnnp_payload(_payload(time_slot=CURRENT_SLOT + 2), WINDOW) is None
+    assert _parse_hnnp_payload(_payload(time_slot=CURRENT_SLOT - 2), WINDOW) is None
+    assert _parse_hnnp_payload(_payload(body=bytes(24)), WINDOW) is None
+
+
+def test_accepts_drift_of_one_slot():
+    assert _parse_hnnp_payload(_payload(time_slot=CURRENT_SLOT - 1), WINDOW) is not None
+    assert _parse_hnnp_payload(_payload(time_slot=CURRENT_SLOT + 1), WINDOW) is not None
+
+
+def test_batch_decoder_matches_single_decoder():
+    rng = random.Random(7)
+    payloads = []
+    for _ in range(2000):
+        body = bytes(24) if rng.random() < 0.1 else rng.randbytes(24)
+        payload = _payload(
+            version=rng.choice([0x01, 0x02, 0x02, 0x03]),
+            flags=rng.randrange(256),
+            time_slot=CURRENT_SLOT + rng.choice([-2, -1, 0, 1, 2]),
+            body=body,
+        )
+        if rng.random() < 0.05:
+            payload = payload[: rng.randrange(40)]
+        payloads.append(payload)
+
+    expected = [_parse_hnnp_payload(p, WINDOW) for p in payloads]
+    assert _parse_hnnp_payloads(payloads, WINDOW) == expected
+
+    full_length = [p for p in payloads if len(p) == 30]
+    assert _parse_hnnp_payloads(full_length, WINDOW) == [
+        _parse_hnnp_payload(p, WINDOW) for p in full_length
+    ]
+
+
+# H4 frames (type byte 0x04 + HCI event) as read from an HCI socket / btmon capture.
+# Legacy LE Advertising Report carrying HNNP service data, RSSI -60 dBm.
+LEGACY_ADV_REPORT = bytes.fromhex(
+    "043e3202010001000000000000260303e0f02116e0f00200071f1df8"
+    "010101010101010101010101010101010707070707070707c4"
+)
+# The same advertisement as an LE Extended Advertising Report.
+EXTENDED_ADV_REPORT = bytes.fromhex(
+    "043e400d011300010000000000000100ff7fc4000000000000000000260303e0f02116e0f00200071f1df8"
+    "010101010101010101010101010101010707070707070707"
+)
+# A non-HNNP advertisement (flags + Apple manufacturer data), RSSI -77 dBm.
+OTHER_ADV_REPORT = bytes.fromhex("043e1a020100011122334455660e020106" "0aff4c0010050b1c2f7a01" "b3")
+HNNP_PAYLOAD = bytes.fromhex(
+    "0200071f1df8" "01010101010101010101010101010101" "0707070707070707"
+)
+
+
+def test_decodes_hnnp_payload_from_legacy_advertising_report():
+    assert hnnp_payloads_from_event(LEGACY_ADV_REPORT[1:]) == [(HNNP_PAYLOAD, -60)]
+
+
+def test_decodes_hnnp_payload_from_extended_advertising_report():
+    assert hnnp_payloads_from_event(EXTENDED_ADV_REPORT[1:]) == [(HNNP_PAYLOAD, -60)]
+
+
+def test_ignores_non_hnnp_advertising_report():
+    reports = decode_le_advertising_reports(OTHER_ADV_REPORT[1:])
+    assert len(reports) == 1
+    address, rssi, ad_data = reports[0]
+    assert address == bytes.fromhex("112233445566")
+    assert rssi == -77
+    assert extract_hnnp_service_data(ad_data) is None
+
+
+def test_decoded_payload_parses_like_bleak_service_data():
+    (payload, _rssi), = hnnp_payloads_from_event(LEGACY_ADV_REPORT[1:])
+    window = SlotWindow.at(0x071F1DF8 * 15, max_drift_slots=1)
+    packet = _parse_hnnp_payload(payload, window)
+    assert packet is not None
+    assert packet.time_slot == 0x071F1DF8
+    assert packet.token_prefix == bytes([1]) * 16
+    assert packet.mac == bytes([7]) * 8
+
+
+def test_malformed_advertising_events_decode_to_nothing():
+    for event in (
+        bytes.fromhex("3e000000"),  # zero parameter length
+        bytes.fromhex("3e010200"),  # subevent but no report count
+        bytes.fromhex("3e0202"),  # too short to carry a header
+        bytes.fromhex("3e0202ff"),  # report count but no reports
+        bytes.fromhex("3e0c0201000100000000000005"),  # data_len runs past the event
+        bytes.fromhex("3e050d0100010000"),  # truncated extended report header
+    ):
+        assert decode_le_advertising_reports(event) == []
+        assert hnnp_payloads_from_event(event) == []
+
+
+def test_truncated_and_corrupted_events_never_raise():
+    rng = random.Random(7)
+    for frame in (LEGACY_ADV_REPORT, EXTENDED_ADV_REPORT, OTHER_ADV_REPORT):
+        event = frame[1:]
+        for end in range(len(event)):
+            decode_le_advertising_reports(event[:end])
+        for _ in range(200):
+            corrupted = bytearray(event)
+            corrupted[rng.randrange(1, len(event))] = rng.randrange(256)
+            decode_le_advertising_reports(bytes(corrupted))
+
+    # A second report cut short does not lose the complete first one.
+    two_reports = bytearray(LEGACY_ADV_REPORT[1:])
+    two_reports[3] = 2
+    assert hnnp_payloads_from_event(bytes(two_reports)) == [(HNNP_PAYLOAD, -60)]
+
+
+def test_hci_source_skips_frames_it_cannot_decode(monkeypatch):
+    source = HciSocketPacketSource("hci0")
+    decode = ble_scanner.decode_le_advertising_reports
+
+    def flaky_decode(event):
+        if event[2] == 0xFF:
+            raise IndexError("corrupt frame")
+        return decode(event)
+
+    monkeypatch.setattr(ble_scanner, "decode_le_advertising_reports", flaky_decode)
+    before = ble_scanner.get_scan_stats()["hci_frames_malformed"]
+    batch = []
+    for frame in (bytes.fromhex("043eff"), bytes.fromhex("043e000000"), LEGACY_ADV_REPORT):
+        source._decode_frame(frame, 0.0, batch)
+    assert [advert.payload for advert in batch] == [HNNP_PAYLOAD]
+    assert ble_scanner.get_scan_stats()["hci_frames_malformed"] == before + 1
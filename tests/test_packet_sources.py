@@ -0,0 +1,263 @@
+import asyncio
+import struct
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import ble_scanner
+from src.ble_scanner import HNNP_SERVICE_UUID, RawAdvertisement, SlotWindow, _parse_hnnp_payload
+from src.packet_sources import _BTSNOOP_EPOCH_DELTA_US, CaptureReplaySource, MergedPacketSource, PacketSource
+from src.presence_report import scan_presence_reports
+from src.signer import ReportSigner
+
+
+def _advertising_event(payload: bytes, rssi: int = -60) -> bytes:
+    # H4 LE Advertising Report: complete UUID list + HNNP service data.
+    ad_data = bytes.fromhex("0303e0f0") + bytes([3 + len(payload), 0x16]) + bytes.fromhex("e0f0") + payload
+    report = bytes([0x00, 0x01]) + bytes(6) + bytes([len(ad_data)]) + ad_data + bytes([rssi & 0xFF])
+    params = bytes([0x02, 0x01]) + report
+    return bytes([0x04, 0x3E, len(params)]) + params
+
+
+def _write_btsnoop(path, records) -> None:
+    with open(path, "wb") as f:
+        f.write(b"btsnoop\x00" + struct.pack(">II", 1, 1002))
+        for ts, packet in records:
+            ts_us = int(ts * 1_000_000) + _BTSNOOP_EPOCH_DELTA_US
+            f.write(struct.pack(">IIIIq", len(packet), len(packet), 0x03, 0, ts_us) + packet)
+
+
+def test_accelerated_replay_keeps_every_advert_in_the_current_slot(tmp_path):
+    # A 2-minute capture recorded a year ago: 40 adverts, one every 3 s, each
+    # carrying the slot it was recorded in.
+    recorded = time.time() - 365 * 86400
+    records = []
+    for i in range(40):
+        ts = recorded + i * 3.0
+        payload = bytes([0x02, 0x00]) + (int(ts) // 15).to_bytes(4, "big") + (i + 1).to_bytes(24, "big")
+        records.append((ts, _advertising_event(payload)))
+    path = tmp_path / "capture.btsnoop"
+    _write_btsnoop(path, records)
+
+    async def replay():
+        source = CaptureReplaySource(str(path), speed=600.0)
+        return [advert async for batch in source.batches() for advert in batch]
+
+    adverts = asyncio.run(replay())
+    window = SlotWindow.at(int(time.time()), max_drift_slots=1)
+    assert len(adverts) == 40
+    assert all(_parse_hnnp_payload(advert.payload, window) is not None for advert in adverts)
+
+
+@pytest.mark.parametrize("aggregate_mode", ["off", "close"])
+def test_replayed_capture_is_signed_a_batch_at_a_time(tmp_path, monkeypatch, aggregate_mode):
+    # Three devices, each advertising twice.
+    recorded = time.time()
+    records = []
+    for i in range(6):
+        payload = bytes([0x02, 0x00]) + (int(recorded) // 15).to_bytes(4, "big") + bytes([i % 3 + 1]) * 16 + bytes(8)
+        records.append((recorded + i * 0.01, _advertising_event(payload)))
+    path = tmp_path / "capture.btsnoop"
+    _write_btsnoop(path, records)
+    monkeypatch.setenv("HNNP_PACKET_SOURCE", "replay")
+    monkeypatch.setenv("HNNP_REPLAY_PATH", str(path))
+    monkeypatch.setenv("HNNP_REPLAY_SPEED", "0")
+    monkeypatch.setenv("HNNP_AGGREGATE_MODE", aggregate_mode)
+    monkeypatch.delenv("HNNP_RSSI_ENTER_DBM", raising=False)
+
+    signer = ReportSigner("org_demo", "recv_lobby", "test_receiver_secret")
+    batch_sizes = []
+    sign_many = signer.sign_many
+
+    def counting_sign_many(items):
+        signatures = sign_many(items)
+        batch_sizes.append(len(signatures))
+        return signatures
+
+    monkeypatch.setattr(signer, "sign_many", counting_sign_many)
+
+    async def collect():
+        return [report async for report in scan_presence_reports(signer)]
+
+    reports = asyncio.run(collect())
+    assert batch_sizes == [3]
+    assert sorted(report.token_prefix[0] for report in reports) == [1, 2, 3]
+    for report in reports:
+        assert report.signature == signer.sign(report.time_slot, report.token_prefix, report.timestamp)
+        assert report.trace is not None and report.trace.signed > 0
+
+
+def test_continuous_scan_records_queue_depth_before_draining(monkeypatch):
+    class FakeScanner:
+        def __init__(self, detection_callback, **_kwargs):
+            self.callback = detection_callback
+
+        async def start(self):
+            # Three advertisements arrive before the consumer wakes up.
+            for i in range(3):
+                self.callback(None, SimpleNamespace(service_data={HNNP_SERVICE_UUID: bytes([i])}, rssi=-50))
+
+        async def stop(self):
+            pass
+
+    monkeypatch.setattr(ble_scanner, "BleakScanner", FakeScanner)
+
+    async def first_batch():
+        batches = ble_scanner._continuous_hnnp_batches("test")
+        try:
+            return await batches.__anext__()
+        finally:
+            await batches.aclose()
+
+    batch = asyncio.run(first_batch())
+    assert [advert.payload for advert in batch] == [b"\x00", b"\x01", b"\x02"]
+    # The head of the queue is being handled; two more were waiting behind it.
+    assert ble_scanner.get_scan_stats()["queue_depth"] == 2
+
+
+def test_continuous_scan_drops_newest_adverts_when_the_queue_is_full(monkeypatch):
+    monkeypatch.setenv("HNNP_SCAN_QUEUE_SIZE", "3")
+    monkeypatch.setitem(ble_scanner._SCAN_STATS, "queue_overflows", 0)
+    scanners = []
+
+    class FakeScanner:
+        def __init__(self, detection_callback, **_kwargs):
+            self.callback = detection_callback
+            scanners.append(self)
+
+        def push(self, *ids):
+            for i in ids:
+                self.callback(None, SimpleNamespace(service_data={HNNP_SERVICE_UUID: bytes([i])}, rssi=-50))
+
+        async def start(self):
+            # Five advertisements arrive before the consumer wakes up; two do not fit.
+            self.push(0, 1, 2, 3, 4)
+
+        async def stop(self):
+            pass
+
+    monkeypatch.setattr(ble_scanner, "BleakScanner", FakeScanner)
+
+    async def two_batches():
+        batches = ble_scanner._continuous_hnnp_batches("test")
+        try:
+            first = await batches.__anext__()
+            scanners[0].push(5, 6)
+            return first, await batches.__anext__()
+        finally:
+            await batches.aclose()
+
+    first, second = asyncio.run(two_batches())
+    # The oldest adverts are kept in arrival order; the overflow is counted, not queued.
+    assert [advert.payload for advert in first] == [b"\x00", b"\x01", b"\x02"]
+    assert [advert.payload for advert in second] == [b"\x05", b"\x06"]
+    assert ble_scanner.get_scan_stats()["queue_overflows"] == 2
+
+
+class _FakeBleak:
+    """BleakScanner stand-in recording its filter arguments; evt_rx is the fake HCI counter."""
+
+    calls = []
+    evt_rx = 0
+
+    def __init__(self, detection_callback, **kwargs):
+        self.callback = detection_callback
+        _FakeBleak.calls.append(kwargs)
+
+    async def start(self):
+        # Two HNNP adverts from one device, one phone that leaked through the filter.
+        for service_data in ({HNNP_SERVICE_UUID: b"a"}, {HNNP_SERVICE_UUID: b"a"}, {}):
+            _FakeBleak.evt_rx += 1
+            self.callback(None, SimpleNamespace(service_data=service_data, rssi=-50))
+        _FakeBleak.evt_rx += 3  # adverts BlueZ filtered out
+
+    async def stop(self):
+        pass
+
+    @staticmethod
+    async def discover(**kwargs):
+        _FakeBleak.calls.append(kwargs)
+        _FakeBleak.evt_rx += 10  # many adverts, reported as three devices
+        return [
+            SimpleNamespace(metadata={"service_data": {HNNP_SERVICE_UUID: bytes([i])}}, rssi=-50)
+            for i in range(2)
+        ] + [SimpleNamespace(metadata={"service_data": {}}, rssi=-50)]
+
+
+@pytest.fixture
+def fake_bleak(monkeypatch):
+    for key in ("adverts_delivered", "devices_polled", "adverts_non_hnnp"):
+        monkeypatch.setitem(ble_scanner._SCAN_STATS, key, 0)
+    monkeypatch.setattr(ble_scanner, "_HCI_BASELINES", {})
+    monkeypatch.setattr(ble_scanner, "adapter_index", lambda adapter: 0)
+    monkeypatch.setattr(ble_scanner, "read_hci_dev_stats", lambda dev_id: {"evt_rx": _FakeBleak.evt_rx})
+    monkeypatch.setattr(_FakeBleak, "calls", [])
+    monkeypatch.setattr(_FakeBleak, "evt_rx", 100)
+    monkeypatch.setattr(ble_scanner, "BleakScanner", _FakeBleak)
+    return _FakeBleak
+
+
+def _first_batch(batches):
+    async def run():
+        try:
+            return await batches.__anext__()
+        finally:
+            await batches.aclose()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("duplicate_data", ["0", "1"])
+def test_both_scan_modes_push_the_hnnp_filter_down_to_bluez(monkeypatch, fake_bleak, duplicate_data):
+    monkeypatch.setenv("HNNP_BLUEZ_DUPLICATE_DATA", duplicate_data)
+    _first_batch(ble_scanner._continuous_hnnp_batches("hci1"))
+    _first_batch(ble_scanner._polled_hnnp_batches("hci1"))
+    expected_filter = {
+        "UUIDs": [HNNP_SERVICE_UUID],
+        "DuplicateData": duplicate_data == "1",
+        "Transport": "le",
+    }
+    assert len(fake_bleak.calls) == 2
+    for kwargs in fake_bleak.calls:
+        assert kwargs["service_uuids"] == [HNNP_SERVICE_UUID]
+        assert kwargs["adapter"] == "hci1"
+        assert kwargs["bluez"] == {"filters": expected_filter}
+
+
+def test_continuous_scan_counts_every_advertisement_callback(fake_bleak):
+    batch = _first_batch(ble_scanner._continuous_hnnp_batches("hci0"))
+    assert [advert.payload for advert in batch] == [b"a", b"a"]
+    stats = ble_scanner.get_scan_stats()
+    assert (stats["adverts_delivered"], stats["adverts_non_hnnp"], stats["devices_polled"]) == (3, 1, 0)
+    assert (stats["hci_events_rx"], stats["filtered_before_python"]) == (6, 3)
+
+
+def test_poll_scan_counts_devices_separately_from_adverts(fake_bleak):
+    batch = _first_batch(ble_scanner._polled_hnnp_batches("hci0"))
+    assert [advert.payload for advert in batch] == [b"\x00", b"\x01"]
+    stats = ble_scanner.get_scan_stats()
+    assert (stats["adverts_delivered"], stats["adverts_non_hnnp"], stats["devices_polled"]) == (0, 1, 3)
+    # Devices are not advertisements, so the filtering estimate is withheld.
+    assert (stats["hci_events_rx"], stats["filtered_before_python"]) == (10, None)
+
+
+class _EndlessSource(PacketSource):
+    name = "endless"
+
+    async def batches(self):
+        while True:
+            yield [RawAdvertisement(b"x", -60, 0.0)]
+
+
+def test_merged_source_shuts_down_pumps_blocked_on_a_full_queue():
+    source = MergedPacketSource({"hci0": _EndlessSource(), "hci1": _EndlessSource()}, queue_size=1)
+
+    async def run():
+        batches = source.batches()
+        await batches.__anext__()
+        await asyncio.sleep(0.01)  # both pumps now wait for room in the queue
+        await asyncio.wait_for(batches.aclose(), timeout=1.0)
+        return [task for task in asyncio.all_tasks() if getattr(task.get_coro(), "__qualname__", "").endswith("._pump")]
+
+    assert asyncio.run(run()) == []
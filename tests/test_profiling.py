@@ -0,0 +1,50 @@
+import signal
+import time
+import tracemalloc
+
+import pytest
+
+from src.profiling import AllocationTracer, ArtifactStore, SamplingProfiler
+
+
+def _spin(seconds: float) -> int:
+    total = 0
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        total += sum(range(100))
+    return total
+
+
+@pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="needs setitimer")
+def test_profiler_samples_cpu_and_restores_the_signal_handler():
+    previous = signal.getsignal(signal.SIGPROF)
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    _spin(0.2)
+    profiler.stop()
+
+    assert signal.getsignal(signal.SIGPROF) == previous
+    assert signal.getitimer(signal.ITIMER_PROF) == (0.0, 0.0)
+    lines = profiler.collapsed().decode().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("_spin (test_profiling.py" in line for line in lines)
+    assert profiler.summary()["samples"] > 20
+
+
+def test_tracemalloc_diff_reports_growth_and_stops_tracing():
+    allocations = AllocationTracer(frames=5)
+    allocations.start()
+    retained = [bytearray(1024) for _ in range(2000)]
+    diff = allocations.diff(limit=5).decode()
+    allocations.stop()
+
+    assert not tracemalloc.is_tracing()
+    assert "test_profiling.py" in diff.splitlines()[1]
+    assert len(retained) == 2000
+
+
+def test_artifact_store_keeps_the_most_recent():
+    store = ArtifactStore(max_artifacts=2)
+    names = [store.add("tasks", "txt", b"x" * i).name for i in range(3)]
+    assert store.get(names[0]) is None
+    assert [item["name"] for item in store.list()] == names[1:]
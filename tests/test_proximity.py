@@ -0,0 +1,77 @@
+from src.ble_scanner import BlePacketV2, Sighting
+from src.proximity import DROP_BELOW_ENTER, DROP_BELOW_EXIT, RssiGate, load_rssi_gate
+
+
+SLOT = 117_566_666
+
+
+def _sighting(rssi, token: int = 1, time_slot: int = SLOT) -> Sighting:
+    packet = BlePacketV2(
+        version=2,
+        flags=0,
+        time_slot=time_slot,
+        token_prefix=token.to_bytes(16, "big"),
+        mac=bytes(8),
+    )
+    return Sighting(packet, rssi, float(time_slot * 15))
+
+
+def _admitted(gate: RssiGate, rssi_values, **kwargs):
+    return [gate.admit(_sighting(rssi, **kwargs)) for rssi in rssi_values]
+
+
+def test_hysteresis_stops_a_signal_oscillating_around_the_threshold_from_flapping():
+    signal = [-72, -70, -73, -69, -74, -71, -73, -76, -72, -70]
+
+    gate = RssiGate(enter_dbm=-70, exit_dbm=-75)
+    assert _admitted(gate, signal) == [False, True, True, True, True, True, True, False, False, True]
+    assert gate.drops == {DROP_BELOW_ENTER: 2, DROP_BELOW_EXIT: 1}
+    assert gate.admitted == 7
+
+    # Without hysteresis the same signal flips in and out on every dip.
+    flapping = RssiGate(enter_dbm=-70, exit_dbm=-70)
+    assert _admitted(flapping, signal) == [False, True, False, True, False, False, False, False, False, True]
+    assert flapping.drops == {DROP_BELOW_ENTER: 5, DROP_BELOW_EXIT: 2}
+
+
+def test_smoothing_averages_the_last_samples_per_token():
+    gate = RssiGate(enter_dbm=-70, exit_dbm=-75, smoothing_window=3)
+    # A single strong sample does not admit a far-away device: mean(-90, -90, -50) = -76.7.
+    assert _admitted(gate, [-90, -90, -50]) == [False, False, False]
+    # Means over the last three: -76.7, -66.7 (enter), -66.7, -76.7 (exit).
+    assert _admitted(gate, [-90, -60, -60, -110]) == [False, True, True, False]
+    # Tokens are smoothed independently.
+    assert _admitted(gate, [-60], token=2) == [True]
+
+
+def test_state_is_per_slot_and_old_slots_are_dropped():
+    gate = RssiGate(enter_dbm=-70, exit_dbm=-75)
+    assert _admitted(gate, [-65, -74]) == [True, True]
+    # The same token in the next slot starts outside again.
+    assert _admitted(gate, [-74], time_slot=SLOT + 1) == [False]
+
+    for time_slot in range(SLOT + 2, SLOT + 6):
+        gate.admit(_sighting(-60, time_slot=time_slot))
+    # Slots more than 3 behind the newest are forgotten: SLOT and SLOT + 1 are gone.
+    assert gate.stats()["tracked_tokens"] == 4
+    assert _admitted(gate, [-74]) == [False]
+
+
+def test_unmeasured_sightings_pass_and_counters_add_up():
+    gate = RssiGate(enter_dbm=-70, exit_dbm=-75)
+    assert _admitted(gate, [None, -80, -60, None, -90]) == [True, False, True, True, False]
+    stats = gate.stats()
+    assert stats["unmeasured"] == 2
+    assert stats["admitted"] == 1
+    assert stats["drops"] == {DROP_BELOW_ENTER: 1, DROP_BELOW_EXIT: 1}
+
+
+def test_load_rssi_gate_from_environment(monkeypatch):
+    monkeypatch.delenv("HNNP_RSSI_ENTER_DBM", raising=False)
+    assert load_rssi_gate() is None
+
+    monkeypatch.setenv("HNNP_RSSI_ENTER_DBM", "-75")
+    monkeypatch.setenv("HNNP_RSSI_EXIT_DBM", "-60")  # above enter: ignored
+    monkeypatch.setenv("HNNP_RSSI_SMOOTHING_WINDOW", "x")
+    gate = load_rssi_gate()
+    assert (gate.enter_dbm, gate.exit_dbm, gate.smoothing_window) == (-75, -80, 1)
@@ -0,0 +1,23 @@
+from src.rate_shaper import MAX_RETRY_AFTER_SECONDS, RateShaper, parse_retry_after
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    assert parse_retry_after("60") == 60.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("999999") == MAX_RETRY_AFTER_SECONDS
+    # Wed, 21 Oct 2015 07:28:30 GMT is 30 s after 07:28:00.
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412480.0) == 30.0
+
+
+def test_shaper_halves_once_per_episode_and_recovers_additively():
+    shaper = RateShaper(max_rate=40.0, min_rate=5.0)
+    shaper.on_throttled(2.0)
+    shaper.on_throttled(2.0)  # same episode: arrives during the Retry-After pause
+    assert shaper.rate == 20.0
+    assert shaper.throttled == 2
+    assert shaper.stats()["paused_for_s"] > 1.0
+
+    for _ in range(20):
+        shaper.on_success()
+    assert 20.0 < shaper.rate < 22.0
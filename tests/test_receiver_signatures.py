@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+
+import pytest
+
+from src.ble_scanner import BlePacketV2
+from src.presence_report import _cached_signer, build_presence_report, sign_presence_reports
+from src.signer import ReportSigner
+from src.tracing import ReportTrace
+
+
+# (org_id, receiver_id, receiver_secret, time_slot, token_prefix, timestamp, signature)
+# Signatures computed independently with Node's crypto.createHmac, as in backend/src/services/crypto.ts.
+VECTORS = [
+    (
+        "org_demo",
+        "recv_lobby",
+        "test_receiver_secret",
+        117566666,
+        "00112233445566778899aabbccddeeff",
+        1763500000,
+        "1072fcf88c0390cd7480e33fd37508edfee251ca9fdae2b1bac5772f30378795",
+    ),
+    (
+        "acme-org-01",
+        "receiver-12",
+        "s3cr3t-ü-key",
+        0,
+        "ffffffffffffffffffffffffffffffff",
+        0,
+        "22a82402e994372091f6c95c497e31248b287b0f69e785a18d9bb7e233a10a20",
+    ),
+    (
+        "o",
+        "r",
+        "k" * 100,
+        0xFFFFFFFF,
+        "0102030405060708090a0b0c0d0e0f10",
+        0xFFFFFFFF,
+        "3580755723fe544b86ef17085afbcaea6b165161a002f494b6806924be4e1890",
+    ),
+]
+
+
+def _spec_signature(org_id, receiver_id, secret, time_slot, token_prefix, timestamp) -> bytes:
+    msg = (
+        org_id.encode("utf-8")
+        + receiver_id.encode("utf-8")
+        + time_slot.to_bytes(4, "big")
+        + token_prefix
+        + timestamp.to_bytes(4, "big")
+    )
+    return hmac.new(secret.encode("utf-8"), msg, hashlib.sha256).digest()
+
+
+def _packet(time_slot, token_prefix) -> BlePacketV2:
+    return BlePacketV2(
+        version=2, flags=0, time_slot=time_slot, token_prefix=token_prefix, mac=bytes(8)
+    )
+
+
+@pytest.mark.parametrize("org_id,receiver_id,secret,time_slot,prefix_hex,timestamp,expected", VECTORS)
+def test_signer_matches_vectors(org_id, receiver_id, secret, time_slot, prefix_hex, timestamp, expected):
+    token_prefix = bytes.fromhex(prefix_hex)
+    signer = ReportSigner(org_id, receiver_id, secret)
+
+    assert signer.sign(time_slot, token_prefix, timestamp).hex() == expected
+    # The pre-keyed state must not be consumed by signing.
+    assert signer.sign(time_slot, token_prefix, timestamp).hex() == expected
+    assert _spec_signature(org_id, receiver_id, secret, time_slot, token_prefix, timestamp).hex() == expected
+
+    report = build_presence_report(
+        _packet(time_slot, memoryview(token_prefix)), org_id, receiver_id, secret, timestamp
+    )
+    assert report.signature.hex() == expected
+    assert report.to_json()["signature"] == expected
+
+
+@pytest.mark.parametrize("org_id,receiver_id,secret,time_slot,prefix_hex,timestamp,expected", VECTORS)
+def test_batch_signing_matches_vectors(org_id, receiver_id, secret, time_slot, prefix_hex, timestamp, expected):
+    signer = ReportSigner(org_id, receiver_id, secret)
+    token_prefix = bytes.fromhex(prefix_hex)
+    # The vector sits between other reports of the same batch.
+    items = [(1, bytes(16), 2), (time_slot, token_prefix, timestamp), (3, bytes([7]) * 16, 4)]
+
+    signatures = signer.sign_many(items)
+    assert signatures[1].hex() == expected
+    assert signatures == [signer.sign(*item) for item in items]
+
+    traces = [None, ReportTrace(1.0, 2.0), None]
+    reports = sign_presence_reports(
+        [(_packet(slot, prefix), ts) for slot, prefix, ts in items], signer, traces
+    )
+    assert [report.signature for report in reports] == signatures
+    assert reports[1].to_json()["signature"] == expected
+    assert (reports[1].org_id, reports[1].receiver_id, reports[1].timestamp) == (org_id, receiver_id, timestamp)
+    assert reports[1].trace is traces[1] and traces[1].signed > 0
+    assert reports[0].trace is None
+
+
+def test_build_presence_report_keys_one_signer_per_receiver():
+    _cached_signer.cache_clear()
+    reports = [
+        build_presence_report(_packet(117566666, bytes(16)), "org_demo", "recv_lobby", "secret", ts)
+        for ts in range(3)
+    ]
+    assert _cached_signer.cache_info().misses == 1
+    signer = ReportSigner("org_demo", "recv_lobby", "secret")
+    assert [r.signature for r in reports] == [signer.sign(117566666, bytes(16), ts) for ts in range(3)]
+
+
+def test_signer_rejects_unencodable_fields():
+    signer = ReportSigner("org_demo", "recv_lobby", "test_receiver_secret")
+    with pytest.raises(ValueError):
+        signer.sign(-1, bytes(16), 0)
+    with pytest.raises(ValueError):
+        signer.sign(0, bytes(16), 1 << 32)
+    with pytest.raises(ValueError):
+        signer.sign(0, bytes(15), 0)
+    with pytest.raises(ValueError):
+        signer.sign_many([(0, bytes(16), 0), (0, bytes(15), 0)])
@@ -0,0 +1,192 @@
+import asyncio
+import sqlite3
+
+from src.presence_report import PresenceReport, ReportColumns
+from src.queue_store import SqliteQueueStore
+from src.retry_queue import EVICT_EXPIRING, EVICT_OLDEST, QueuedReport, RetryQueue
+from src.sender import _flush_journal, _recover_queue
+
+
+NOW = 1_763_500_000
+MAX_SKEW = 120
+
+
+def _queued(store: ReportColumns, timestamp: int, next_retry_at: float) -> QueuedReport:
+    report = PresenceReport(
+        org_id=store.org_id,
+        receiver_id=store.receiver_id,
+        timestamp=timestamp,
+        time_slot=timestamp // 15,
+        version=2,
+        flags=0,
+        token_prefix=timestamp.to_bytes(16, "big"),
+        mac=bytes(8),
+        signature=bytes(32),
+    )
+    return QueuedReport(
+        store=store,
+        row=store.append(report),
+        first_seen=timestamp,
+        attempts=1,
+        next_retry_at=next_retry_at,
+    )
+
+
+def test_pop_due_returns_only_due_items_in_order():
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW)
+    for delay in (30, 10, 20):
+        queue.push(_queued(store, NOW, NOW + delay))
+
+    assert queue.pop_due(NOW + 5) == []
+    due = queue.pop_due(NOW + 25)
+    assert [item.next_retry_at for item in due] == [NOW + 10, NOW + 20]
+    assert len(queue) == 3  # checked-out items still count
+
+    # A rescheduled item is only due again at its new time.
+    due[0].next_retry_at = NOW + 40
+    queue.reschedule(due[0])
+    queue.discard(due[1])
+    assert len(queue) == 2
+    assert queue.next_due_at() == NOW + 30
+    assert [item.next_retry_at for item in queue.pop_due(NOW + 100)] == [NOW + 30, NOW + 40]
+
+
+def test_full_queue_evicts_reports_expiring_before_retry_first():
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_size=3, max_skew_seconds=MAX_SKEW)
+    oldest = _queued(store, NOW - 60, NOW + 1)
+    doomed = _queued(store, NOW - 30, NOW + 100)  # expires at NOW + 90, before its retry
+    newest = _queued(store, NOW, NOW + 1)
+    for item in (oldest, doomed, newest):
+        assert queue.push(item) is None
+
+    assert queue.push(_queued(store, NOW, NOW + 2)) is doomed
+    assert queue.push(_queued(store, NOW, NOW + 3)) is oldest
+    assert queue.evictions == {EVICT_EXPIRING: 1, EVICT_OLDEST: 1}
+    assert len(queue) == 3
+    assert len(store) == 3
+
+
+def test_rescheduled_item_is_no_longer_evicted_as_expiring():
+    store = ReportColumns("org", "recv")
+    evicted = []
+    queue = RetryQueue(
+        max_size=2,
+        max_skew_seconds=MAX_SKEW,
+        on_evict=lambda item, reason: evicted.append((item.report.timestamp, reason)),
+    )
+    rescheduled = _queued(store, NOW - 100, NOW + 30)  # expires at NOW + 20, before its retry
+    oldest = _queued(store, NOW - 110, NOW + 5)  # expires at NOW + 10, retried before that
+    queue.push(rescheduled)
+    queue.push(oldest)
+    assert queue.pop_due(NOW + 30) == [oldest, rescheduled]
+    queue.reschedule(oldest)
+    rescheduled.next_retry_at = NOW + 15  # now retried before it expires
+    queue.reschedule(rescheduled)
+
+    assert queue.push(_queued(store, NOW, NOW + 1)) is oldest
+    assert evicted == [(NOW - 110, EVICT_OLDEST)]
+    assert queue.evictions == {EVICT_EXPIRING: 0, EVICT_OLDEST: 1}
+
+
+def test_in_flight_items_are_not_evicted():
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_size=1, max_skew_seconds=MAX_SKEW)
+    queue.push(_queued(store, NOW, NOW))
+    (item,) = queue.pop_due(NOW)
+
+    assert queue.push(_queued(store, NOW, NOW + 1)) is None
+    assert len(queue) == 2
+    queue.discard(item)
+    assert len(store) == 1
+
+
+def test_journal_recovers_unacked_reports_and_compacts_expired(tmp_path):
+    path = str(tmp_path / "queue.db")
+    journal = SqliteQueueStore(path)
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW, journal=journal)
+    sent = _queued(store, NOW, NOW)
+    expired = _queued(store, NOW - 2 * MAX_SKEW, NOW + 1)
+    kept = _queued(store, NOW - 10, NOW + 1)
+    for item in (sent, expired, kept):
+        queue.push(item)
+    expected = kept.report
+    queue.discard(queue.pop_due(NOW)[0])
+    journal.close()
+
+    journal = SqliteQueueStore(path)
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW, journal=journal)
+    _recover_queue(queue, journal, store, NOW)
+
+    assert queue.pop_due(NOW) == []  # recovered reports get a jittered first retry
+    (recovered,) = queue.pop_due(NOW + 3)
+    assert recovered.report == expected
+    assert journal.expired_on_recovery == 1
+    fresh = _queued(store, NOW, NOW + 1)
+    queue.push(fresh)
+    assert fresh.seq > recovered.seq
+    journal.close()
+
+
+def test_recovery_applies_max_size_and_spreads_retries(tmp_path):
+    path = str(tmp_path / "queue.db")
+    journal = SqliteQueueStore(path)
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW, journal=journal)
+    for i in range(50):
+        queue.push(_queued(store, NOW - i, NOW + 1))
+    journal.flush(journal.take_pending())
+    journal.close()
+
+    journal = SqliteQueueStore(path)
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_size=20, max_skew_seconds=MAX_SKEW, journal=journal)
+    _recover_queue(queue, journal, store, NOW)
+
+    assert len(queue) == 20
+    assert queue.evictions[EVICT_OLDEST] == 30
+    due = queue.pop_due(NOW + 3, limit=8)
+    assert len(due) == 8
+    due += queue.pop_due(NOW + 3)
+    retry_times = [item.next_retry_at for item in due]
+    assert NOW + 1 <= min(retry_times) and max(retry_times) <= NOW + 3
+    assert len(set(retry_times)) == 20
+    # The 20 newest reports were kept.
+    assert sorted(item.timestamp for item in due) == list(range(NOW - 19, NOW + 1))
+    journal.close()
+
+
+def test_failed_journal_commit_is_retried_with_the_next_one(tmp_path, monkeypatch):
+    path = str(tmp_path / "queue.db")
+    journal = SqliteQueueStore(path)
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW, journal=journal)
+    for i in range(3):
+        queue.push(_queued(store, NOW - i, NOW + 1))
+    queue.discard(queue.pop_due(NOW + 1, limit=1)[0])
+
+    flush = journal.flush
+    failures = [sqlite3.OperationalError("disk I/O error")]
+
+    def flaky_flush(pending=None):
+        if failures:
+            raise failures.pop()
+        return flush(pending)
+
+    monkeypatch.setattr(journal, "flush", flaky_flush)
+    assert not asyncio.run(_flush_journal(journal))
+    assert journal.pending == 4  # 3 adds and 1 ack kept for the next commit
+    queue.push(_queued(store, NOW - 3, NOW + 1))
+    assert asyncio.run(_flush_journal(journal))
+    assert journal.pending == 0 and journal.written == 5
+    journal.close()
+
+    journal = SqliteQueueStore(path)
+    store = ReportColumns("org", "recv")
+    queue = RetryQueue(max_skew_seconds=MAX_SKEW, journal=journal)
+    _recover_queue(queue, journal, store, NOW)
+    assert sorted(item.timestamp for item in queue.pop_due(NOW + 3)) == [NOW - 3, NOW - 2, NOW - 1]
+    journal.close()
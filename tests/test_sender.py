@@ -0,0 +1,319 @@
+import asyncio
+import copy
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from src import liveness, sender  # noqa: E402
+from src.ble_scanner import BlePacketV2  # noqa: E402
+from src.presence_report import sign_presence_report  # noqa: E402
+from src.signer import ReportSigner  # noqa: E402
+
+_SIGNER = ReportSigner("org_test", "recv_test", "test_receiver_secret")
+_FRESH_STATS = copy.deepcopy(sender._SEND_STATS)
+
+
+def _report(device: int):
+    packet = BlePacketV2(
+        version=2,
+        flags=0,
+        time_slot=int(time.time()) // 15,
+        token_prefix=bytes([device]) * 16,
+        mac=bytes(8),
+    )
+    return sign_presence_report(packet, _SIGNER)
+
+
+class _Cloud:
+    """
+    Stub Cloud. Records (path, devices, status) for every presence request, in
+    arrival order; respond(path, devices) returns (status, headers). While
+    `gate` is cleared, requests wait before being answered.
+    """
+
+    def __init__(self, respond=None) -> None:
+        self.respond = respond or (lambda path, devices: (200, {}))
+        self.requests = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        reports = body["reports"] if request.path.endswith("/batch") else [body]
+        devices = [bytes.fromhex(report["token_prefix"])[0] for report in reports]
+        self.requests.append((request.path, devices, None))
+        index = len(self.requests) - 1
+        await self.gate.wait()
+        status, headers = self.respond(request.path, devices)
+        self.requests[index] = (request.path, devices, status)
+        return web.json_response({}, status=status, headers=headers)
+
+    def delivered(self):
+        return sorted(d for _path, devices, status in self.requests if status == 200 for d in devices)
+
+    def paths(self):
+        return [path for path, _devices, _status in self.requests]
+
+
+async def _until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _run(monkeypatch, cloud: _Cloud, scan, scenario) -> None:
+    """
+    Run run_sender() against cloud with scan_presence_reports() replaced by
+    scan (an async generator function), until the async scenario() returns.
+    """
+    monkeypatch.setattr(sender, "scan_presence_reports", scan)
+
+    async def main() -> None:
+        app = web.Application()
+        app.router.add_post("/v2/presence", cloud.handle)
+        app.router.add_post("/v2/presence/batch", cloud.handle)
+        async with TestServer(app) as server:
+            monkeypatch.setenv("HNNP_API_BASE_URL", str(server.make_url("/")).rstrip("/"))
+            task = asyncio.ensure_future(sender.run_sender())
+            try:
+                await asyncio.wait_for(scenario(), 10.0)
+                assert not task.done(), task
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def _feed(*reports):
+    async def scan(_signer):
+        for report in reports:
+            yield report
+
+    return scan
+
+
+def _two_waves(first, second, go: asyncio.Event):
+    # Feed `first`, then `second` once go is set.
+    async def scan(_signer):
+        for report in first:
+            yield report
+        await go.wait()
+        for report in second:
+            yield report
+
+    return scan
+
+
+@pytest.fixture(autouse=True)
+def _sender_env(monkeypatch, tmp_path):
+    for name, value in {
+        "HNNP_CONFIG_PATH": str(tmp_path / "missing.env"),
+        "HNNP_ORG_ID": _SIGNER.org_id,
+        "HNNP_RECEIVER_ID": _SIGNER.receiver_id,
+        "HNNP_RECEIVER_SECRET": "test_receiver_secret",
+        "HNNP_HTTP_PREWARM": "0",
+        "HNNP_HTTP_IDLE_PING_SECONDS": "0",
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("HNNP_QUEUE_PATH", raising=False)
+    monkeypatch.delenv("HNNP_UPLOAD_MODE", raising=False)
+    monkeypatch.setattr(sender, "_SEND_STATS", copy.deepcopy(_FRESH_STATS))
+    monkeypatch.setattr(liveness, "_HEARTBEATS", {})
+    # Retries become due after 50 ms instead of 1-3 s.
+    monkeypatch.setattr(sender, "decorrelated_jitter", lambda previous, *args, **kwargs: 0.05)
+
+
+def test_send_queue_overflow_is_parked_for_retry_not_dropped(monkeypatch):
+    monkeypatch.setenv("HNNP_SEND_WORKERS", "1")
+    monkeypatch.setenv("HNNP_SEND_QUEUE_SIZE", "2")
+    cloud = _Cloud()
+    cloud.gate.clear()
+
+    async def scenario():
+        stats = sender._SEND_STATS
+        await _until(lambda: stats["reports_signed"] == 10)
+        # The scanner never waits for Cloud: what the send queue cannot hold is
+        # parked in the retry queue.
+        assert stats["send_queue_overflows"] == 8
+        assert len(sender.QUEUE) == 8
+        cloud.gate.set()
+        await _until(lambda: len(cloud.delivered()) == 10)
+        assert cloud.delivered() == list(range(10))
+        await _until(lambda: len(sender.QUEUE) == 0)
+        assert stats["dropped"] == {"stale": 0, "max_attempts": 0, "rejected": 0}
+        assert sender.QUEUE.evictions == {"expiring": 0, "oldest": 0}
+
+    _run(monkeypatch, cloud, _feed(*(_report(i) for i in range(10))), scenario)
+
+
+def test_batches_flush_when_full(monkeypatch):
+    monkeypatch.setenv("HNNP_UPLOAD_MODE", "batch")
+    monkeypatch.setenv("HNNP_BATCH_MAX_REPORTS", "3")
+    monkeypatch.setenv("HNNP_BATCH_MAX_DELAY_MS", "60000")
+    cloud = _Cloud()
+
+    async def scenario():
+        await _until(lambda: len(cloud.delivered()) == 6)
+        assert [(path, devices) for path, devices, _status in cloud.requests] == [
+            ("/v2/presence/batch", [0, 1, 2]),
+            ("/v2/presence/batch", [3, 4, 5]),
+        ]
+        assert sender._SEND_STATS["batches_sent"] == 2
+
+    _run(monkeypatch, cloud, _feed(*(_report(i) for i in range(6))), scenario)
+
+
+def test_partial_batch_flushes_at_the_deadline(monkeypatch):
+    monkeypatch.setenv("HNNP_UPLOAD_MODE", "batch")
+    monkeypatch.setenv("HNNP_BATCH_MAX_REPORTS", "100")
+    monkeypatch.setenv("HNNP_BATCH_MAX_DELAY_MS", "200")
+    cloud = _Cloud()
+    fed_at = []
+
+    async def scan(_signer):
+        for i in range(2):
+            yield _report(i)
+        fed_at.append(time.monotonic())
+
+    async def scenario():
+        await _until(lambda: len(cloud.delivered()) == 2)
+        assert time.monotonic() - fed_at[0] >= 0.15
+        assert [(path, devices) for path, devices, _status in cloud.requests] == [
+            ("/v2/presence/batch", [0, 1])
+        ]
+
+    _run(monkeypatch, cloud, scan, scenario)
+
+
+@pytest.mark.parametrize("status", [404, 405])
+def test_missing_batch_endpoint_falls_back_to_single_posts_for_good(monkeypatch, status):
+    monkeypatch.setenv("HNNP_UPLOAD_MODE", "batch")
+    monkeypatch.setenv("HNNP_BATCH_MAX_DELAY_MS", "20")
+    cloud = _Cloud(lambda path, devices: (status if path.endswith("/batch") else 200, {}))
+    go = asyncio.Event()
+    first = [_report(i) for i in range(3)]
+    second = [_report(i) for i in range(3, 5)]
+
+    async def scenario():
+        await _until(lambda: len(cloud.delivered()) == 3)
+        assert sender._SEND_STATS["upload_mode"] == "single"
+        go.set()
+        await _until(lambda: len(cloud.delivered()) == 5)
+        assert cloud.paths().count("/v2/presence/batch") == 1
+        assert cloud.paths().count("/v2/presence") == 5
+        assert sender._SEND_STATS["dropped"]["rejected"] == 0
+
+    _run(monkeypatch, cloud, _two_waves(first, second, go), scenario)
+
+
+def test_oversized_batch_is_resent_as_single_posts(monkeypatch):
+    monkeypatch.setenv("HNNP_UPLOAD_MODE", "batch")
+    monkeypatch.setenv("HNNP_BATCH_MAX_REPORTS", "4")
+    monkeypatch.setenv("HNNP_BATCH_MAX_DELAY_MS", "20")
+    cloud = _Cloud(lambda path, devices: (413 if len(devices) > 2 else 200, {}))
+    go = asyncio.Event()
+    first = [_report(i) for i in range(4)]
+    second = [_report(i) for i in range(4, 6)]
+
+    async def scenario():
+        await _until(lambda: len(cloud.delivered()) == 4)
+        assert cloud.paths() == ["/v2/presence/batch"] + ["/v2/presence"] * 4
+        go.set()
+        await _until(lambda: len(cloud.delivered()) == 6)
+        # 413 is about this batch only: the next one is batched again.
+        assert cloud.requests[-1] == ("/v2/presence/batch", [4, 5], 200)
+        assert sender._SEND_STATS["upload_mode"] == "batch"
+        assert sender._SEND_STATS["batches_sent"] == 1
+        assert sender._SEND_STATS["dropped"]["rejected"] == 0
+
+    _run(monkeypatch, cloud, _two_waves(first, second, go), scenario)
+
+
+def _replies(*replies):
+    # Answer requests with the given (status, headers) in turn, then 200.
+    pending = list(replies)
+    return lambda path, devices: pending.pop(0) if pending else (200, {})
+
+
+def test_throttled_live_report_is_deferred_past_retry_after(monkeypatch):
+    monkeypatch.setenv("HNNP_BREAKER_FAILURES", "1")
+    cloud = _Cloud(_replies((429, {"Retry-After": "1"})))
+
+    async def scenario():
+        await _until(lambda: sender._SHAPER is not None and sender._SHAPER.deferred == 1)
+        throttled_at = time.monotonic()
+        stats = sender._SEND_STATS
+        assert len(sender.QUEUE) == 1
+        assert stats["responses"]["429"] == 1
+        # Throttling is not a Cloud failure: a single failure would have opened it.
+        assert sender._BREAKER.state == "closed"
+        assert sender._BREAKER.stats()["consecutive_failures"] == 0
+        await _until(lambda: cloud.delivered() == [0])
+        assert time.monotonic() - throttled_at >= 0.8
+        assert stats["dropped"] == {"stale": 0, "max_attempts": 0, "rejected": 0}
+        assert [status for _path, _devices, status in cloud.requests] == [429, 200]
+
+    _run(monkeypatch, cloud, _feed(_report(0)), scenario)
+
+
+def test_throttled_retry_is_rescheduled_without_using_an_attempt(monkeypatch):
+    # One attempt allowed: if the 429 counted, the report would be dropped.
+    monkeypatch.setenv("HNNP_MAX_RETRY_ATTEMPTS", "1")
+    cloud = _Cloud(_replies((500, {}), (429, {"Retry-After": "1"})))
+
+    async def scenario():
+        await _until(lambda: cloud.delivered() == [0])
+        stats = sender._SEND_STATS
+        assert [status for _path, _devices, status in cloud.requests] == [500, 429, 200]
+        assert stats["responses"]["429"] == 1
+        assert sender._SHAPER.deferred == 1
+        assert stats["dropped"] == {"stale": 0, "max_attempts": 0, "rejected": 0}
+        assert sender._BREAKER.state == "closed"
+        await _until(lambda: len(sender.QUEUE) == 0)
+
+    _run(monkeypatch, cloud, _feed(_report(0)), scenario)
+
+
+def test_live_reports_are_sent_before_the_retry_backlog(monkeypatch):
+    # One request at a time, no slot reserved: only the lane priority decides.
+    monkeypatch.setenv("HNNP_MAX_IN_FLIGHT", "1")
+    monkeypatch.setenv("HNNP_LIVE_RESERVED_SLOTS", "0")
+    monkeypatch.setenv("HNNP_SEND_WORKERS", "2")
+    monkeypatch.setenv("HNNP_SEND_QUEUE_SIZE", "1")
+    cloud = _Cloud()
+    cloud.gate.clear()
+    go = asyncio.Event()
+
+    async def scan(_signer):
+        # Report 0 is sent live; 1-5 overflow the send queue into the retry backlog.
+        for i in range(6):
+            yield _report(i)
+        await go.wait()
+        # Then two live reports, taken by the idle worker and the send queue.
+        yield _report(6)
+        await asyncio.sleep(0.05)
+        yield _report(7)
+
+    async def scenario():
+        limiter = lambda: sender._LIMITER.stats()  # noqa: E731
+        # The retry loop checks out 4 x max in flight = 4 of them at a time.
+        await _until(lambda: len(cloud.requests) == 1 and limiter()["waiting_retry"] == 4)
+        go.set()
+        await _until(lambda: sender._SEND_STATS["reports_signed"] == 8)
+        assert limiter()["waiting_live"] == 1
+        cloud.gate.set()
+        await _until(lambda: len(cloud.delivered()) == 8)
+        order = [devices[0] for _path, devices, _status in cloud.requests]
+        # Both live reports go ahead of every retry that was waiting before them.
+        assert order[0] == 0 and sorted(order[1:3]) == [6, 7]
+        assert sorted(order[3:]) == [1, 2, 3, 4, 5]
+        assert sender._SEND_STATS["send_queue_overflows"] == 5
+
+    _run(monkeypatch, cloud, scan, scenario)
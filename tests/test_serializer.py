@@ -0,0 +1,53 @@
+import gzip
+import json
+import zlib
+
+from src.presence_report import PresenceReport
+from src.serializer import (
+    COMPRESSION_DEFLATE,
+    COMPRESSION_GZIP,
+    ENCODER_JSON,
+    ENCODER_TEMPLATE,
+    ReportSerializer,
+)
+
+
+def _report(org_id: str = "org_1", timestamp: int = 1_763_500_000) -> PresenceReport:
+    return PresenceReport(
+        org_id=org_id,
+        receiver_id="recv-é\"1",
+        timestamp=timestamp,
+        time_slot=timestamp // 15,
+        version=2,
+        flags=1,
+        token_prefix=bytes(range(16)),
+        mac=bytes(range(8)),
+        signature=bytes(range(32)),
+    )
+
+
+def test_encoders_produce_the_same_document_as_to_json():
+    for org_id in ("org_1", 'quote"and\\slash', "ünicode"):
+        report = _report(org_id)
+        for encoder in (ENCODER_TEMPLATE, ENCODER_JSON):
+            body, headers = ReportSerializer(encoder=encoder).report(report)
+            assert json.loads(body) == report.to_json()
+            assert headers == {"Content-Type": "application/json"}
+
+
+def test_batch_compression_round_trips_above_threshold_only():
+    reports = [_report(timestamp=1_763_500_000 + i) for i in range(20)]
+    expected = {"reports": [report.to_json() for report in reports]}
+
+    serializer = ReportSerializer(compression=COMPRESSION_GZIP, compress_min_bytes=1024)
+    body, headers = serializer.batch(reports)
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body)) == expected
+    small, headers = serializer.batch(reports[:1])
+    assert "Content-Encoding" not in headers
+    assert json.loads(small) == {"reports": expected["reports"][:1]}
+    assert serializer.stats()["compressed_payloads"] == 1
+
+    body, headers = ReportSerializer(compression=COMPRESSION_DEFLATE).batch(reports)
+    assert headers["Content-Encoding"] == "deflate"
+    assert json.loads(zlib.decompress(body)) == expected
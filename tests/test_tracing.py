@@ -0,0 +1,38 @@
+import logging
+import random
+
+from src.ble_scanner import BlePacketV2
+from src.presence_report import sign_presence_report
+from src.signer import ReportSigner
+from src.tracing import STAGES, PipelineTracer, ReportTrace
+
+
+def test_trace_rides_on_the_report_without_changing_it():
+    packet = BlePacketV2(version=2, flags=0, time_slot=117_566_666, token_prefix=bytes(16), mac=bytes(8))
+    signer = ReportSigner("org_1", "recv_1", "secret")
+    trace = ReportTrace(received=1.0, parsed=1.5)
+
+    traced = sign_presence_report(packet, signer, 1_763_500_000, trace=trace)
+    plain = sign_presence_report(packet, signer, 1_763_500_000)
+
+    assert traced.trace is trace and trace.signed > trace.parsed
+    assert traced == plain and traced.to_json() == plain.to_json()
+
+
+def test_tracer_records_every_stage_and_samples_the_log(caplog):
+    tracer = PipelineTracer(sample_rate=0.5, slow_seconds=0.9, rng=random.Random(7))
+    with caplog.at_level(logging.INFO, logger="hnnp.receiver.trace"):
+        for i in range(200):
+            trace = ReportTrace(received=0.0, parsed=0.001, signed=0.002, dequeued=0.01, sent=0.02)
+            tracer.finish(trace, acked=0.1 if i else 1.0)
+
+    stats = tracer.stats()
+    assert stats["completed"] == 200
+    assert set(stats["stages"]) == set(STAGES)
+    assert stats["stages"]["scan"]["p50_ms"] == 1.0
+    assert stats["stages"]["http"]["p99_ms"] == 80.0
+    assert stats["stages"]["total"]["max_ms"] == 1000.0
+    # The slow trace is always logged; roughly half of the rest are sampled.
+    assert 60 < stats["logged"] == len(caplog.records) < 140
+    assert "total=1000.0ms" in caplog.records[0].getMessage()
+    assert tracer.histograms()["total"]["count"] == 200